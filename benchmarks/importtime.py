@@ -0,0 +1,50 @@
+"""
+Import-time report (python -X importtime) of the WSGI application under each
+settings profile, with the slowest imports by cumulative time.
+
+    python benchmarks/importtime.py --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PROFILES = ('doctors.settings', 'doctors.settings_api')
+
+# load the application and its URL configuration, like a worker does
+CODE = "import doctors.wsgi; from django.urls import get_resolver; get_resolver().url_patterns"
+
+def import_times(settings_module):
+    """Return ``(module, self_us, cumulative_us)`` for every module imported by the application."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    env.setdefault('DJANGO_SECRET_KEY', 'importtime')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times.append((module.strip(), int(self_us), int(cumulative_us)))
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    for settings_module in PROFILES:
+        times = import_times(settings_module)
+        total = sum(self_us for _, self_us, _ in times) / 1000
+        print(f"{settings_module}: {len(times)} modules, {total:.1f} ms")
+        for module, _, cumulative_us in sorted(times, key=lambda row: -row[2])[:args.top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+if __name__ == '__main__':
+    main()
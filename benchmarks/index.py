@@ -0,0 +1,69 @@
+"""
+Doctor index benchmark: the time to resolve the DoctorFilter parameters from
+the in-memory index and from SQLite, to build the index and to patch it after
+a few doctors changed.
+
+Run from the project root against a migrated database with data loaded, e.g.
+after ``make seed-synthetic count=102100``:
+
+    python benchmarks/index.py --runs 20
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from decimal import Decimal
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+FILTERS = (
+    {'category': 1, 'district': 1},
+    {'district': 1, 'language': 'cantonese'},
+    {'language': 'en'},
+    {'min_consultation_fee': Decimal(200), 'max_consultation_fee': Decimal(400)},
+    {'min_consultation_fee': Decimal(225), 'max_consultation_fee': Decimal(1010), 'category': 3},
+)
+
+def timed(function, runs):
+    """Return the median time of ``function`` in milliseconds and its last result."""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--changes', type=int, default=10, help="doctors changed before the patch")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doctors.settings')
+    os.environ.setdefault('DJANGO_SECRET_KEY', 'benchmark')
+    import django
+    django.setup()
+    from doctors_api.index import build_index, patch_index
+    from doctors_api.models import Doctor
+    from doctors_api.views import DoctorFilter
+
+    build_ms, index = timed(lambda: build_index(0), 1)
+    print(f"build        {build_ms:9.1f} ms  {len(index)} doctors")
+    changed = set(Doctor.objects.filter(is_active=True).values_list('pk', flat=True)[:args.changes])
+    patch_ms, _ = timed(lambda: patch_index(index, 1, changed), args.runs)
+    print(f"patch        {patch_ms:9.1f} ms  {len(changed)} doctors")
+
+    print(f"{'filters':80} {'matches':>8} {'index ms':>9} {'sqlite ms':>9}")
+    for filters in FILTERS:
+        index_ms, rows = timed(lambda: index.rows(**filters), args.runs)
+        params = {name: str(value) for name, value in filters.items()}
+        queryset = DoctorFilter(params, queryset=Doctor.objects.filter(is_active=True)).qs
+        sqlite_ms, _ = timed(lambda: list(queryset.values_list('id', 'updated_at')), args.runs)
+        print(f"{str(params):80} {len(rows):8} {index_ms:9.2f} {sqlite_ms:9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Startup benchmark: time-to-first-byte after a worker boots and the latency of
+the first requests, for a cold worker (plain gunicorn) and a warmed one
+(gunicorn.conf.py).
+
+Run from the project root against a migrated database with data loaded:
+
+    python benchmarks/startup.py --runs 5
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# the first requests after a deploy, each language loads its own catalog
+PATHS = (
+    ('/doctor/', 'en'),
+    ('/doctor/', 'zh-hant'),
+    ('/category/', 'zh-hans'),
+    ('/district/', 'en'),
+)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def get(url, language):
+    request = urllib.request.Request(url, headers={'Accept-Language': language})
+    started = time.perf_counter()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        response.read(1)
+        first_byte = time.perf_counter() - started
+        response.read()
+    return first_byte
+
+def wait_until_listening(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError("gunicorn did not start")
+
+def run(warm):
+    port = free_port()
+    command = [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1']
+    env = dict(os.environ, DJANGO_WARM_UP=str(warm))
+    if warm:
+        command[3:3] = ['-c', 'gunicorn.conf.py']
+    process = subprocess.Popen(
+        command + ['doctors.wsgi:application'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        started = time.perf_counter()
+        wait_until_listening(port)
+        base = f'http://127.0.0.1:{port}'
+        # the master listens before the worker is ready, the first byte includes its boot
+        first = get(base + PATHS[0][0], PATHS[0][1])
+        ttfb = time.perf_counter() - started
+        firsts = [first] + [get(base + path, language) for path, language in PATHS[1:]]
+        steady = [get(base + path, language) for _ in range(20) for path, language in PATHS]
+        return ttfb, max(firsts), statistics.median(steady)
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'':6} {'boot to first byte':>20} {'slowest first request':>22} {'steady p50':>12}")
+    for warm in (False, True):
+        results = [run(warm) for _ in range(args.runs)]
+        ttfb, first, steady = (statistics.median(column) * 1000 for column in zip(*results))
+        print(f"{'warm' if warm else 'cold':6} {ttfb:>17.1f} ms {first:>19.1f} ms {steady:>9.1f} ms")
+
+if __name__ == '__main__':
+    main()
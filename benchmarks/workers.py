@@ -0,0 +1,155 @@
+"""
+Worker model benchmark: throughput, latency and memory of gunicorn.conf.py
+with each worker class, with and without preloading the application.
+
+Every mode serves the doctor list to ``--clients`` concurrent keep-alive
+clients for ``--seconds``; the memory is the RSS and PSS (RSS with the pages
+shared copy-on-write split between the processes) of the master and its
+workers afterwards. The uvicorn mode runs when uvicorn-worker is installed.
+
+Run from the project root against a migrated database with data loaded:
+
+    python benchmarks/workers.py --workers 4 --clients 16
+"""
+
+import argparse
+import http.client
+import importlib.util
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+from startup import ROOT, free_port, wait_until_listening
+
+# the doctors of one category in one district, about a page of them
+DEFAULT_PATH = '/doctor/?category=1&district=1'
+
+MODES = (
+    ('sync', True),
+    ('sync', False),
+    ('gthread', True),
+    ('gthread', False),
+    ('uvicorn', True),
+)
+
+def children(pid):
+    try:
+        return [int(child) for child in Path(f'/proc/{pid}/task/{pid}/children').read_text().split()]
+    except OSError:
+        return []
+
+def memory(pid):
+    """RSS and PSS of the process in kB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    for line in Path(f'/proc/{pid}/smaps_rollup').read_text().splitlines():
+        name, _, rest = line.partition(':')
+        if name in ('Rss', 'Pss'):
+            values[name] = int(rest.split()[0])
+    return values['Rss'], values['Pss']
+
+def client(port, path, deadline, latencies, errors):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path, headers={'Accept-Language': 'en'})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors.append(1)
+            connection.close()
+            continue
+        if response.status != 200:
+            errors.append(1)
+        else:
+            latencies.append(time.perf_counter() - started)
+        if response.will_close:
+            connection.close()
+    connection.close()
+
+def load(port, path, clients, seconds):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=client, args=(port, path, deadline, latencies, errors)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+def wait_until_serving(port, path, timeout=60):
+    # the master listens before its workers have booted and warmed up
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        latencies, _ = load(port, path, 1, 0.1)
+        if latencies:
+            return
+        time.sleep(0.1)
+    raise RuntimeError("gunicorn does not serve " + path)
+
+def run(worker_class, preload, args):
+    port = free_port()
+    env = dict(
+        os.environ,
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_WORKER_CLASS=worker_class,
+        GUNICORN_THREADS=str(args.threads),
+        GUNICORN_PRELOAD=str(preload),
+        DJANGO_THROTTLE='False',
+    )
+    env.setdefault('DJANGO_ALLOWED_HOSTS', '127.0.0.1')
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_listening(port)
+        wait_until_serving(port, args.path)
+        # every worker gets requests and loads its snapshots before the measurement
+        load(port, args.path, args.clients, 2)
+        latencies, errors = load(port, args.path, args.clients, args.seconds)
+        pids = [process.pid] + children(process.pid)
+        rss, pss = (sum(column) // 1024 for column in zip(*map(memory, pids)))
+    finally:
+        process.terminate()
+        process.wait()
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        'rps': len(latencies) / args.seconds,
+        'p50': quantiles[49] * 1000,
+        'p99': quantiles[98] * 1000,
+        'errors': errors,
+        'processes': len(pids),
+        'rss': rss,
+        'pss': pss,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--workers', type=int, help="default: gunicorn.conf.py's")
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'mode':18} {'req/s':>8} {'p50':>9} {'p99':>9} {'errors':>7} {'processes':>10} {'RSS':>8} {'PSS':>8}")
+    for worker_class, preload in MODES:
+        if worker_class == 'uvicorn' and importlib.util.find_spec('uvicorn_worker') is None:
+            print(f"{worker_class:18} skipped, pip install uvicorn-worker")
+            continue
+        result = run(worker_class, preload, args)
+        mode = f"{worker_class}{'' if preload else ' no preload'}"
+        print(
+            f"{mode:18} {result['rps']:>8.0f} {result['p50']:>6.1f} ms {result['p99']:>6.1f} ms {result['errors']:>7}"
+            f" {result['processes']:>10} {result['rss']:>5} MB {result['pss']:>5} MB"
+        )
+
+if __name__ == '__main__':
+    main()
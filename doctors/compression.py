@@ -0,0 +1,116 @@
+from functools import partial
+import gzip
+import re
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# per request compression favours speed, precompression of small bodies
+# built in the background (reference lists) size. Shared list responses are
+# compressed while concurrent requests wait for them, at moderate levels.
+ENCODERS = {'gzip': partial(gzip.compress, compresslevel=6, mtime=0)}
+PRECOMPRESSORS = {'gzip': partial(gzip.compress, compresslevel=9, mtime=0)}
+SHARED_PRECOMPRESSORS = {'gzip': partial(gzip.compress, compresslevel=6, mtime=0)}
+if brotli is not None:
+    ENCODERS['br'] = partial(brotli.compress, quality=4)
+    PRECOMPRESSORS['br'] = partial(brotli.compress, quality=11)
+    SHARED_PRECOMPRESSORS['br'] = partial(brotli.compress, quality=5)
+    # preferred when the client weighs both the same
+    PREFERENCE = ('br', 'gzip')
+else:
+    PREFERENCE = ('gzip',)
+
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|javascript|xml)|application/[\w.+-]+\+(json|xml))')
+
+ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([\d.]+))?\s*')
+
+def negotiate(accept_encoding):
+    """Return the supported encoding the client weighs highest, or None."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        match = ACCEPT_ENCODING.fullmatch(part)
+        if not match:
+            continue
+        try:
+            weights[match[1].lower()] = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+    best = None
+    for encoding in PREFERENCE:
+        weight = weights.get(encoding, weights.get('*', 0))
+        if weight > 0 and (best is None or weight > best[1]):
+            best = (encoding, weight)
+    return best[0] if best else None
+
+class Precompressed:
+    """
+    A response body together with its compressed variants (gzip, and brotli
+    when the optional ``brotli`` package is installed), computed once for a
+    body served many times; the middleware then only picks the variant.
+    ``compressors`` maps the encodings to their functions, by default the
+    highest levels.
+    """
+    __slots__ = ('content', 'encoded')
+
+    def __init__(self, content, compressors=PRECOMPRESSORS):
+        self.content = content
+        self.encoded = {}
+        if len(content) >= settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            self.encoded = {encoding: compress(content) for encoding, compress in compressors.items()}
+
+    def response(self, content_type):
+        response = HttpResponse(self.content, content_type=content_type)
+        response.precompressed = self
+        return response
+
+class CompressionMiddleware:
+    """
+    Compresses responses of at least ``RESPONSE_COMPRESSION_MIN_BYTES`` with
+    the encoding negotiated from ``Accept-Encoding``, using the precompressed
+    variant when the view provided one.
+    """
+
+    def __init__(self, get_response):
+        if not settings.RESPONSE_COMPRESSION:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header('Content-Encoding')
+            or not COMPRESSIBLE_TYPES.match(response.get('Content-Type', ''))
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+            return response
+        encoding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        compressed = None
+        precompressed = getattr(response, 'precompressed', None)
+        if precompressed is not None and precompressed.content == response.content:
+            compressed = precompressed.encoded.get(encoding)
+        if compressed is None:
+            compressed = ENCODERS[encoding](response.content)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        # the representation changed, a strong ETag no longer matches it
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
@@ -0,0 +1,107 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+import random
+import time
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'db_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# replication delay in seconds, per database vendor. Vendors without a query
+# (e.g. SQLite file copies) have no replication stream to measure.
+LAG_QUERIES = {
+    'postgresql': "SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)",
+}
+
+_pinned = ContextVar('db_pinned', default=False)
+_health = {}
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+def replica_lag(alias):
+    connection = connections[alias]
+    sql = LAG_QUERIES.get(connection.vendor)
+    if sql is None:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        return float(cursor.fetchone()[0] or 0)
+
+def is_healthy(alias):
+    """Whether the replica is reachable and close enough to the primary, checked at most once per interval."""
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked is not None and now - checked[0] < settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        return checked[1]
+
+    try:
+        lag = replica_lag(alias)
+        healthy = lag <= settings.DATABASE_REPLICA_MAX_LAG
+        if not healthy:
+            logger.warning("Replica %s is %.1fs behind, reading from the primary", alias, lag)
+    except DatabaseError:
+        logger.exception("Replica %s is unavailable", alias)
+        healthy = False
+    _health[alias] = (now, healthy)
+    return healthy
+
+class PrimaryReplicaRouter:
+    """
+    Routes one primary (``default``) and N read replicas. Writes always go to
+    the primary. Reads are spread over the replicas that are not lagging
+    behind by more than ``DATABASE_REPLICA_MAX_LAG`` seconds, unless they are
+    pinned to the primary by ``use_primary`` or ``ReplicaPinningMiddleware``.
+    """
+    def db_for_read(self, model, **hints):
+        if _pinned.get():
+            return 'default'
+        replicas = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+        return random.choice(replicas) if replicas else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+class ReplicaPinningMiddleware:
+    """
+    Pins unsafe requests to the primary and, for ``DATABASE_REPLICA_PIN_SECONDS``
+    afterwards, any request from the client that made them (read-your-writes).
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        write = request.method not in SAFE_METHODS
+        token = _pinned.set(write or self.recently_wrote(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _pinned.reset(token)
+
+        if write and response.status_code < 400:
+            pin_seconds = settings.DATABASE_REPLICA_PIN_SECONDS
+            response.set_cookie(PIN_COOKIE, str(time.time() + pin_seconds), max_age=pin_seconds, httponly=True)
+        return response
+
+    def recently_wrote(self, request):
+        try:
+            return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
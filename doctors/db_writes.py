@@ -0,0 +1,87 @@
+from contextlib import contextmanager
+import fcntl
+import logging
+import os
+import random
+import threading
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+BUSY_MESSAGES = ('database is locked', 'database is busy', 'database table is locked')
+
+# lock file path -> (pid, thread lock, open lock file)
+_lock_files = {}
+_lock_files_lock = threading.Lock()
+
+def is_busy(error):
+    """Whether the error only means that another connection holds the database."""
+    return isinstance(error, OperationalError) and any(message in str(error) for message in BUSY_MESSAGES)
+
+def lock_path(using):
+    connection = connections[using]
+    if not settings.DATABASE_WRITE_LOCK or connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return None
+    return f"{connection.settings_dict['NAME']}.write-lock"
+
+def process_lock(path):
+    # flock locks belong to the open file, so every process opens its own and
+    # its threads take turns on a thread lock
+    with _lock_files_lock:
+        entry = _lock_files.get(path)
+        if entry is None or entry[0] != os.getpid():
+            entry = _lock_files[path] = (os.getpid(), threading.Lock(), open(path, 'a'))
+        return entry[1], entry[2]
+
+@contextmanager
+def write_lock(using=DEFAULT_DB_ALIAS):
+    """
+    Hold the write lock of the database; a no-op unless it is an SQLite file.
+    The writers of every process queue on an exclusive ``flock`` of
+    ``<database>.write-lock``, so they take turns in the kernel instead of
+    polling the database lock.
+    """
+    path = lock_path(using)
+    if path is None:
+        yield
+        return
+    thread_lock, lock_file = process_lock(path)
+    with thread_lock:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_write(func, using=DEFAULT_DB_ALIAS):
+    """
+    Call ``func`` in a transaction holding the write lock and return its result.
+    While the database is busy the transaction is rolled back and ``func``
+    called again, up to ``DATABASE_WRITE_RETRIES`` times, after a random
+    delay of up to ``DATABASE_WRITE_BACKOFF`` seconds, doubled every time.
+
+    SQLite has one writer at a time. The ``default`` connection runs in WAL
+    mode, so that readers never wait for the writer nor the writer for them,
+    and begins every transaction with ``BEGIN IMMEDIATE`` (see ``DATABASES``):
+    a transaction that reads before it writes would otherwise fail with
+    "database is locked", without waiting, when it upgrades to a write while
+    another one commits.
+    """
+    if connections[using].in_atomic_block:
+        # part of an enclosing transaction, which already holds the database
+        with transaction.atomic(using=using):
+            return func()
+
+    retries = settings.DATABASE_WRITE_RETRIES
+    for attempt in range(retries + 1):
+        try:
+            with write_lock(using), transaction.atomic(using=using):
+                return func()
+        except OperationalError as error:
+            if attempt == retries or not is_busy(error):
+                raise
+            delay = random.uniform(0, settings.DATABASE_WRITE_BACKOFF * 2 ** attempt)
+            logger.warning("Database busy, retrying the write in %.3fs (attempt %d of %d)", delay, attempt + 1, retries)
+            time.sleep(delay)
@@ -0,0 +1,219 @@
+from contextlib import ExitStack
+from contextvars import ContextVar
+from logging.handlers import QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+import atexit
+import copy
+import fcntl
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import threading
+import time
+import uuid
+from django.db import connections
+
+request_id = ContextVar('request_id', default=None)
+
+# extra attributes copied into the JSON records when present
+EXTRA_FIELDS = ('request_id', 'method', 'path', 'status', 'duration_ms', 'queries')
+
+# accepted X-Request-ID values, anything else is replaced by a fresh id
+REQUEST_ID = re.compile(r'^[\w.:-]{1,64}$')
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class RequestContextFilter(logging.Filter):
+    """Adds the id of the current request to records logged while handling it."""
+
+    def filter(self, record):
+        if getattr(record, 'request_id', None) is None:
+            # django.request logs the response after the middleware returned
+            request = getattr(record, 'request', None)
+            record.request_id = getattr(request, 'request_id', None) or request_id.get()
+        return True
+
+class SamplingFilter(logging.Filter):
+    """Keeps a ``rate`` fraction of the INFO and lower records; warnings and errors always pass."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread that formats them and passes them to
+    ``handlers``, so request threads only put records on an in-memory queue.
+
+    The queue and the thread are created on the first record of every
+    process, so that forked gunicorn workers do not inherit the master's.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(None)
+        # index the list, dictConfig resolves "cfg://handlers.<name>" in __getitem__
+        self.handlers = [handlers[i] for i in range(len(handlers))]
+        for handler in self.handlers:
+            if not isinstance(handler, logging.Handler):
+                # dictConfig configures handlers in name order
+                raise ValueError("Configure %r before the queue handler" % (handler,))
+        self.listener = None
+        self.pid = None
+        self.start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def start(self):
+        with self.start_lock:
+            if self.pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+
+    def stop(self):
+        """Write out the queued records and stop this process's listener."""
+        with self.start_lock:
+            if self.listener is not None and self.pid == os.getpid():
+                self.listener.stop()
+            self.listener = None
+            self.pid = None
+
+    def prepare(self, record):
+        # merge the arguments and render the traceback here, the listener
+        # thread gets a plain record without references to live objects
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+class ProcessLockMixin:
+    """
+    Serializes writes and rollovers of the processes sharing the log file with
+    an exclusive ``flock`` on ``<file>.lock``, so the gunicorn workers can
+    share one (rotating) log file, and reopens the file when another process
+    rotated it.
+    """
+
+    def process_lock(self):
+        # flock locks belong to the open file, so every process opens its own
+        if getattr(self, 'lock_pid', None) != os.getpid():
+            self.lock_file = open(self.baseFilename + '.lock', 'a')
+            self.lock_pid = os.getpid()
+        return self.lock_file
+
+    def reopen_if_rotated(self):
+        if self.stream is None:
+            return
+        try:
+            rotated = os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            rotated = True
+        if rotated:
+            self.stream.close()
+            self.stream = self._open()
+            self.reopened()
+
+    def reopened(self):
+        pass
+
+    def emit(self, record):
+        try:
+            lock_file = self.process_lock()
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self.reopen_if_rotated()
+                super().emit(record)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except Exception:
+            # an exception would stop the listener thread
+            self.handleError(record)
+
+class LockedRotatingFileHandler(ProcessLockMixin, RotatingFileHandler):
+    """Size based rotation, safe for several processes writing the same file."""
+
+class LockedTimedRotatingFileHandler(ProcessLockMixin, TimedRotatingFileHandler):
+    """Time based rotation, safe for several processes writing the same file."""
+
+    def reopened(self):
+        # another process rolled over, the next rollover is due after the new file's
+        self.rolloverAt = self.computeRollover(int(os.stat(self.baseFilename).st_mtime))
+
+class RequestLogMiddleware:
+    """
+    Tags everything logged during a request with its id (``X-Request-ID``) and
+    logs one ``doctors.request`` record with the status, duration and number
+    of database queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.logger = logging.getLogger('doctors.request')
+
+    def __call__(self, request):
+        header = request.headers.get('X-Request-ID', '')
+        current = header if REQUEST_ID.match(header) else uuid.uuid4().hex
+        request.request_id = current
+        token = request_id.set(current)
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count))
+                response = self.get_response(request)
+            response['X-Request-ID'] = current
+            self.logger.info(
+                "%s %s %s", request.method, request.path, response.status_code,
+                extra={
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+                    'queries': queries,
+                },
+            )
+            return response
+        finally:
+            request_id.reset(token)
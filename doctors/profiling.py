@@ -0,0 +1,174 @@
+from collections import Counter
+from pathlib import Path
+import cProfile
+import logging
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = 'doctors.profiling'
+
+# seconds between two stack samples
+SAMPLE_INTERVAL = 0.001
+
+MODES = ('sample', 'cprofile')
+
+# the token and the mode, removed before the view sees the query parameters
+QUERY_PARAMS = frozenset(['profile', 'profile_mode'])
+
+# file extension and content type of the profiles
+FORMATS = {
+    'sample': ('collapsed', 'text/plain; charset=utf-8'),
+    'cprofile': ('prof', 'application/octet-stream'),
+}
+
+def make_token(issued_by):
+    """A profiling token, valid for ``PROFILING_TOKEN_MAX_AGE`` seconds."""
+    return signing.dumps({'by': issued_by}, salt=TOKEN_SALT, compress=True)
+
+def check_token(token):
+    """Return who issued the token, or None when it is invalid or expired."""
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)['by']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+class StackSampler:
+    """Samples the stack of one thread every ``interval`` seconds, counting the distinct stacks."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiling-sampler', daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()).encode()
+
+def profile(mode, get_response, request):
+    """Run the request under the profiler, return the response and the profile."""
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+        # the format of Profile.dump_stats()
+        profiler.create_stats()
+        return response, marshal.dumps(profiler.stats)
+    with StackSampler(threading.get_ident()) as sampler:
+        response = get_response(request)
+    return response, sampler.collapsed()
+
+class ProfilingMiddleware:
+    """
+    On-demand profiling of single requests. A request carrying a valid
+    profiling token (``X-Profile`` header or ``profile`` query parameter, see
+    ``manage.py profile_token``) runs under a profiler and gets the profile
+    back instead of its response:
+
+    - ``sample`` (default): a thread samples the request's stack every
+      millisecond and returns the collapsed stacks ("frame;frame;frame count"),
+      the input of flamegraph.pl, inferno and speedscope.
+    - ``cprofile``: deterministic cProfile, returned as a pstats file for
+      ``python -m pstats``, snakeviz or flameprof.
+
+    ``PROFILING_SAMPLE_RATE`` additionally profiles that fraction of all
+    requests into ``PROFILING_DIR``, which keeps the newest ``PROFILING_KEEP``
+    profiles. The middleware is not installed at all unless ``PROFILING`` is on.
+    """
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.directory = Path(settings.PROFILING_DIR)
+
+    def __call__(self, request):
+        token = request.headers.get('X-Profile') or request.GET.get('profile')
+        mode = request.headers.get('X-Profile-Mode') or request.GET.get('profile_mode')
+        if not QUERY_PARAMS.isdisjoint(request.GET):
+            # not parameters of the view, e.g. they would bypass the doctor index
+            request.GET = request.GET.copy()
+            for name in QUERY_PARAMS:
+                request.GET.pop(name, None)
+
+        if token:
+            issued_by = check_token(token)
+            if issued_by is None:
+                logger.warning("Invalid or expired profiling token for %s", request.path)
+            else:
+                return self.profile_request(request, issued_by, mode if mode in MODES else settings.PROFILING_MODE)
+
+        if settings.PROFILING_SAMPLE_RATE and random.random() < settings.PROFILING_SAMPLE_RATE:
+            return self.sample_request(request)
+        return self.get_response(request)
+
+    def profile_request(self, request, issued_by, mode):
+        """Run the request under the profiler and respond with the profile."""
+        started = time.perf_counter()
+        response, data = profile(mode, self.get_response, request)
+        duration = time.perf_counter() - started
+        logger.info("Profiled %s %s for %s (%s, %.1f ms)", request.method, request.path, issued_by, mode, duration * 1000)
+
+        extension, content_type = FORMATS[mode]
+        profile_response = HttpResponse(data, content_type=content_type)
+        profile_response['Content-Disposition'] = f'attachment; filename="profile.{extension}"'
+        profile_response['X-Profile-Status'] = str(response.status_code)
+        profile_response['X-Profile-Duration-Ms'] = f'{duration * 1000:.1f}'
+        return profile_response
+
+    def sample_request(self, request):
+        """Profile the request into the profile store and respond as usual."""
+        mode = settings.PROFILING_MODE
+        started = time.perf_counter()
+        response, data = profile(mode, self.get_response, request)
+        duration = time.perf_counter() - started
+        try:
+            self.save(request, mode, data, duration)
+        except OSError:
+            logger.exception("Could not save the profile of %s", request.path)
+        return response
+
+    def save(self, request, mode, data, duration):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        slug = request.path.strip('/').replace('/', '_') or 'root'
+        name = f"{time.strftime('%Y%m%dT%H%M%S')}-{duration * 1000:.0f}ms-{slug}-{os.getpid()}-{time.monotonic_ns()}"
+        path = self.directory / f"{name}.{FORMATS[mode][0]}"
+        path.write_bytes(data)
+        # the names start with the time, keep the newest ones
+        extensions = {f'.{extension}' for extension, _ in FORMATS.values()}
+        profiles = sorted(path for path in self.directory.iterdir() if path.suffix in extensions)
+        for old in profiles[:max(0, len(profiles) - settings.PROFILING_KEEP)]:
+            old.unlink(missing_ok=True)
@@ -22,6 +22,40 @@ env = environ.Env(
     DJANGO_DEBUG=(bool, False),
     DJANGO_SECRET_KEY=(str, ""),
     DJANGO_ALLOWED_HOSTS=(list, []),
+    DJANGO_DOCTOR_INDEX=(bool, False),
+    DJANGO_SNAPSHOT_MAX_AGE=(float, 60),
+    DJANGO_ROW_CACHE=(bool, False),
+    DJANGO_ROW_CACHE_LOCAL_BYTES=(int, 16 * 1024 * 1024),
+    DJANGO_LIST_COALESCE_TTL=(float, 0),
+    DJANGO_LIST_COALESCE_GRACE=(float, 30),
+    DJANGO_SQLITE_TIMEOUT=(float, 5),
+    DJANGO_DATABASE_WRITE_LOCK=(bool, True),
+    DJANGO_DATABASE_WRITE_RETRIES=(int, 3),
+    DJANGO_DATABASE_WRITE_BACKOFF=(float, 0.05),
+    DJANGO_DATABASE_REPLICAS=(list, []),
+    DJANGO_DATABASE_REPLICA_MAX_LAG=(float, 5),
+    DJANGO_DATABASE_REPLICA_PIN_SECONDS=(int, 5),
+    DJANGO_WARM_UP=(bool, False),
+    DJANGO_LOG_FORMAT=(str, "json"),
+    DJANGO_LOG_FILE=(str, "general.log"),
+    DJANGO_LOG_CONSOLE_LEVEL=(str, "WARNING"),
+    DJANGO_LOG_ROTATE=(str, ""),
+    DJANGO_LOG_MAX_BYTES=(int, 10 * 1024 * 1024),
+    DJANGO_LOG_ROTATE_WHEN=(str, "midnight"),
+    DJANGO_LOG_BACKUP_COUNT=(int, 5),
+    DJANGO_LOG_SAMPLE_RATE=(float, 1.0),
+    DJANGO_BATCH_GET_MAX_IDS=(int, 100),
+    DJANGO_RESPONSE_COMPRESSION=(bool, True),
+    DJANGO_RESPONSE_COMPRESSION_MIN_BYTES=(int, 1024),
+    DJANGO_THROTTLE=(bool, True),
+    DJANGO_THROTTLE_RATES=(dict, {'read': '600/min', 'list': '60/min', 'search': '120/min', 'write': '30/min'}),
+    DJANGO_THROTTLE_API_KEYS=(dict, {}),
+    DJANGO_PROFILING=(bool, False),
+    DJANGO_PROFILING_MODE=(str, "sample"),
+    DJANGO_PROFILING_SAMPLE_RATE=(float, 0),
+    DJANGO_PROFILING_DIR=(str, "container_data/profiles"),
+    DJANGO_PROFILING_KEEP=(int, 50),
+    DJANGO_PROFILING_TOKEN_MAX_AGE=(int, 60 * 60),
 )
 
 # Take environment variables from .env file
@@ -54,10 +88,16 @@ INSTALLED_APPS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # switched off at runtime with DJANGO_THROTTLE=False
+    'DEFAULT_THROTTLE_CLASSES': ['doctors_api.throttling.TokenBucketThrottle'],
+    'DEFAULT_SCHEMA_CLASS': 'doctors_api.schema.AutoSchema',
 }
 
 MIDDLEWARE = [
+    'doctors.log.RequestLogMiddleware',
+    'doctors.compression.CompressionMiddleware',
+    'doctors.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',
@@ -96,9 +136,67 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'container_data/db.sqlite3',
+        # WAL: readers and the writer do not block each other. IMMEDIATE: transactions
+        # take the write lock when they begin, waiting up to the timeout (seconds) for it
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': env("DJANGO_SQLITE_TIMEOUT"),
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL',
+        },
     }
 }
 
+# Write transactions of all workers queue on a file lock next to the database
+# (doctors.db_writes), and are retried with backoff while it is still busy
+DATABASE_WRITE_LOCK = env("DJANGO_DATABASE_WRITE_LOCK")
+DATABASE_WRITE_RETRIES = env("DJANGO_DATABASE_WRITE_RETRIES")
+DATABASE_WRITE_BACKOFF = env("DJANGO_DATABASE_WRITE_BACKOFF")
+
+# Read replicas as database URLs, e.g. "sqlite:////app/container_data/replica1.sqlite3,postgres://..."
+# Reads go to the replicas that lag at most DATABASE_REPLICA_MAX_LAG seconds behind,
+# writes and a client's reads for DATABASE_REPLICA_PIN_SECONDS after a write go to the primary.
+DATABASE_REPLICAS = []
+for number, url in enumerate(env("DJANGO_DATABASE_REPLICAS"), start=1):
+    DATABASES[f'replica{number}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_REPLICA_MAX_LAG = env("DJANGO_DATABASE_REPLICA_MAX_LAG")
+DATABASE_REPLICA_PIN_SECONDS = env("DJANGO_DATABASE_REPLICA_PIN_SECONDS")
+DATABASE_REPLICA_CHECK_INTERVAL = 1
+
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['doctors.db_routers.PrimaryReplicaRouter']
+    MIDDLEWARE.insert(3, 'doctors.db_routers.ReplicaPinningMiddleware')
+
+# gzip (and brotli, when installed) compression of responses of at least
+# RESPONSE_COMPRESSION_MIN_BYTES, disable it when a proxy compresses already
+RESPONSE_COMPRESSION = env("DJANGO_RESPONSE_COMPRESSION")
+RESPONSE_COMPRESSION_MIN_BYTES = env("DJANGO_RESPONSE_COMPRESSION_MIN_BYTES")
+
+# Requests with a profiling token (manage.py profile_token) respond with their
+# profile, "sample" (collapsed stacks) or "cprofile" (pstats); a fraction of
+# all requests can be profiled into PROFILING_DIR. Off: no middleware at all
+PROFILING = env("DJANGO_PROFILING")
+PROFILING_MODE = env("DJANGO_PROFILING_MODE")
+PROFILING_SAMPLE_RATE = env("DJANGO_PROFILING_SAMPLE_RATE")
+PROFILING_DIR = BASE_DIR / env("DJANGO_PROFILING_DIR")
+PROFILING_KEEP = env("DJANGO_PROFILING_KEEP")
+PROFILING_TOKEN_MAX_AGE = env("DJANGO_PROFILING_TOKEN_MAX_AGE")
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (e.g. redis://) in production so that every worker
+# sees the same directory version. 'doctor_rows' holds the rendered doctor
+# rows, a file (filecache://) or redis backend shares them across workers.
+
+CACHES = {
+    'default': env.cache('DJANGO_CACHE_URL', default='locmemcache://'),
+    'doctor_rows': env.cache('DJANGO_ROW_CACHE_URL', default='locmemcache://doctor-rows?MAX_ENTRIES=10000'),
+    # rate limit buckets, shared by the workers only with a shared backend
+    'throttle': env.cache('DJANGO_THROTTLE_CACHE_URL', default='locmemcache://throttle?MAX_ENTRIES=100000'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -147,25 +245,92 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Serve doctor-list filters from a per-worker in-memory snapshot
+DOCTOR_INDEX_ENABLED = env("DJANGO_DOCTOR_INDEX")
+
+# Seconds the per-worker snapshots and the fee statistics are served when the
+# default cache is per process, so the other workers' writes cannot reach them
+DOCTOR_SNAPSHOT_MAX_AGE = env("DJANGO_SNAPSHOT_MAX_AGE")
+
+# Build doctor-list responses from cached, pre-rendered rows
+DOCTOR_ROW_CACHE_ENABLED = env("DJANGO_ROW_CACHE")
+DOCTOR_ROW_CACHE_LOCAL_BYTES = env("DJANGO_ROW_CACHE_LOCAL_BYTES")
+
+# Seconds identical doctor-list requests share one computed response (0 disables),
+# expired responses are still served for the grace period while one worker refreshes them
+DOCTOR_LIST_COALESCE_TTL = env("DJANGO_LIST_COALESCE_TTL")
+DOCTOR_LIST_COALESCE_GRACE = env("DJANGO_LIST_COALESCE_GRACE")
+
+# Most doctors a single batch_get request may ask for
+DOCTOR_BATCH_GET_MAX_IDS = env("DJANGO_BATCH_GET_MAX_IDS")
+
+# Token bucket rates per client and scope ("read", "list", "search", "write"),
+# and the API keys (X-API-Key) with their own buckets, scaled by their factor
+THROTTLE_ENABLED = env("DJANGO_THROTTLE")
+THROTTLE_RATES = env("DJANGO_THROTTLE_RATES")
+THROTTLE_API_KEYS = env("DJANGO_THROTTLE_API_KEYS")
+
+TEST_RUNNER = 'doctors.test_runner.TestRunner'
+
+# Load translations, URL resolvers and serializer fields when the app is ready
+# instead of on the first requests (enabled by gunicorn.conf.py)
+DOCTOR_WARM_UP = env("DJANGO_WARM_UP")
+
 # Locale settings
 LOCALE_PATHS = (
     BASE_DIR / "doctors" / "locale",
 )
 
+# Log records are queued by the request threads and written by one thread
+# per process, as JSON (DJANGO_LOG_FORMAT=json) or text (verbose). The log
+# file is shared by the workers and rotated by size or time (DJANGO_LOG_ROTATE).
+LOG_FORMAT = "json" if env("DJANGO_LOG_FORMAT") == "json" else "verbose"
+LOG_FILE = env("DJANGO_LOG_FILE")
+
+if env("DJANGO_LOG_ROTATE") == "time":
+    LOG_FILE_HANDLER = {
+        "class": "doctors.log.LockedTimedRotatingFileHandler",
+        "when": env("DJANGO_LOG_ROTATE_WHEN"),
+        "backupCount": env("DJANGO_LOG_BACKUP_COUNT"),
+    }
+else:
+    LOG_FILE_HANDLER = {
+        "class": "doctors.log.LockedRotatingFileHandler",
+        "maxBytes": env("DJANGO_LOG_MAX_BYTES") if env("DJANGO_LOG_ROTATE") == "size" else 0,
+        "backupCount": env("DJANGO_LOG_BACKUP_COUNT"),
+    }
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "request_context": {"()": "doctors.log.RequestContextFilter"},
+        "sampling": {"()": "doctors.log.SamplingFilter", "rate": env("DJANGO_LOG_SAMPLE_RATE")},
+    },
     "handlers": {
-        "console": {"class": "logging.StreamHandler"},
+        "console": {
+            "class": "logging.StreamHandler",
+            # the file gets every record, the console only what needs attention
+            "level": env("DJANGO_LOG_CONSOLE_LEVEL"),
+            "formatter": LOG_FORMAT,
+        },
         "file": {
-            "class": "logging.FileHandler",
-            "filename": "general.log",
-            "formatter": "verbose",
+            **LOG_FILE_HANDLER,
+            "filename": LOG_FILE or os.devnull,
+            # opened on the first record, not in every process that loads the settings
+            "delay": True,
+            "formatter": LOG_FORMAT,
+        },
+        # configured after the handlers it feeds, dictConfig goes by name
+        "queue": {
+            "()": "doctors.log.QueueHandler",
+            "handlers": ["cfg://handlers.console"] + (["cfg://handlers.file"] if LOG_FILE else []),
+            "filters": ["request_context", "sampling"],
         },
     },
     "loggers": {
         "": {
-            "handlers": ["console", "file"],
+            "handlers": ["queue"],
             "level": os.environ.get("DJANGO_LOG_LEVEL", "INFO"),
         }
     },
@@ -173,6 +338,7 @@ LOGGING = {
         "verbose": {
             "format": "{asctime} ({levelname})- {name}- {message}",
             "style": "{",
-        }
+        },
+        "json": {"()": "doctors.log.JSONFormatter"},
     },
-}
\ No newline at end of file
+}
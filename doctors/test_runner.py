@@ -0,0 +1,27 @@
+import logging
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests without rate limits: every test client shares one IP
+    address. The throttling tests opt back in with
+    ``override_settings(THROTTLE_ENABLED=True)``.
+
+    The tests trigger warnings and errors on purpose, so nothing is logged to
+    the console; the log file still gets every record.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.unthrottled = override_settings(THROTTLE_ENABLED=False)
+        self.unthrottled.enable()
+        for handler in logging.getLogger().handlers:
+            for target in getattr(handler, 'handlers', ()):
+                if target.name == 'console':
+                    target.setLevel(logging.CRITICAL + 1)
+
+    def teardown_test_environment(self, **kwargs):
+        self.unthrottled.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,6 @@
+from django.urls import path, include
+
+# the API-only settings profile (doctors.settings_api) has no admin
+urlpatterns = [
+    path('', include('doctors_api.urls')),
+]
@@ -1,8 +1,141 @@
-from django.contrib import admin
-from .models import Doctor, Category, District
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _, ngettext
+from .models import Doctor, Category, District, SpokenLanguage, DoctorLanguage
+from .signals import bump_directory_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+def estimated_rows(model, using):
+    """The row count of the model's table according to the planner statistics, or None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+    elif connection.vendor == 'sqlite':
+        # written by ANALYZE, every stat starts with the number of rows in the index
+        sql = "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s"
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # e.g. sqlite_stat1 does not exist before the first ANALYZE
+        return None
+    return row[0] if row and row[0] and row[0] > 0 else None
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts exactly up to ``exact_count_limit`` rows instead of a ``COUNT(*)``
+    over the whole table on every page. Larger unfiltered lists are sized from
+    the planner statistics, larger filtered ones are cut at the limit.
+    """
+    exact_count_limit = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        count = queryset.order_by()[:self.exact_count_limit + 1].count()
+        if count <= self.exact_count_limit or queryset.query.has_filters():
+            return count
+        return max(count, estimated_rows(queryset.model, queryset.db) or 0)
+
+class SpokenLanguageFilter(admin.SimpleListFilter):
+    """Doctors speaking the language, not only as their primary one."""
+    title = _('language')
+    parameter_name = 'language'
+
+    def lookups(self, request, model_admin):
+        return DoctorLanguage
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(
+            Exists(SpokenLanguage.objects.filter(doctor=OuterRef('pk'), language=self.value()))
+        )
+
+class SpokenLanguageInline(admin.TabularInline):
+    """The languages the doctor speaks, the primary one is added on save."""
+    model = SpokenLanguage
+    extra = 0
+
+@admin.register(Doctor)
+class DoctorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'category', 'district', 'language', 'consultation_fee', 'is_active', 'updated_at']
+    list_select_related = ['category', 'district']
+    list_filter = ['is_active', SpokenLanguageFilter, 'category', 'district']
+    raw_id_fields = ['category', 'district']
+    readonly_fields = ['created_at', 'updated_at']
+    # walks doctor_name_idx, which ends with the primary key
+    ordering = ['name', 'pk']
+    paginator = EstimatedCountPaginator
+    # the "x of y" total would be another COUNT(*) over the table
+    show_full_result_count = False
+    actions = ['deactivate', 'restore']
+    inlines = [SpokenLanguageInline]
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not SpokenLanguage:
+            return super().save_formset(request, form, formset, change)
+        # the post_save signal already added the primary language, which
+        # stays even when its row was deleted; saving the rows one by one
+        # would break unique_doctor_language
+        doctor = form.instance
+        formset.save(commit=False)
+        deleted = formset.deleted_forms
+        languages = {doctor.language} | {
+            row.cleaned_data['language'] for row in formset.forms
+            if row.cleaned_data and row not in deleted
+        }
+        doctor.spoken_languages.exclude(language__in=languages).delete()
+        SpokenLanguage.objects.bulk_create(
+            [SpokenLanguage(doctor=doctor, language=language) for language in languages],
+            ignore_conflicts=True,
+        )
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # it would hard delete the doctors, and collect their related rows first
+        actions.pop('delete_selected', None)
+        return actions
+
+    def set_active(self, request, queryset, active):
+        """Soft delete or restore the doctors with one UPDATE."""
+        with transaction.atomic(using=queryset.db):
+            pks = list(queryset.filter(is_active=not active).values_list('pk', flat=True))
+            updated = queryset.filter(pk__in=pks).update(is_active=active, updated_at=timezone.now())
+        if updated:
+            # update() sends no post_save, let the per-worker snapshots patch these doctors
+            transaction.on_commit(lambda: bump_directory_version(pks))
+        return updated
+
+    @admin.action(description=_("Deactivate selected doctors"), permissions=['change'])
+    def deactivate(self, request, queryset):
+        updated = self.set_active(request, queryset, False)
+        self.message_user(request, ngettext(
+            "%(count)d doctor was deactivated.", "%(count)d doctors were deactivated.", updated
+        ) % {'count': updated}, messages.SUCCESS)
+
+    @admin.action(description=_("Restore selected doctors"), permissions=['change'])
+    def restore(self, request, queryset):
+        try:
+            updated = self.set_active(request, queryset, True)
+        except IntegrityError:
+            self.message_user(request, _(
+                "No doctors were restored: some of them are listed again by an active doctor with the same name and address."
+            ), messages.ERROR)
+            return
+        self.message_user(request, ngettext(
+            "%(count)d doctor was restored.", "%(count)d doctors were restored.", updated
+        ) % {'count': updated}, messages.SUCCESS)
 
-# Register your models here.
-admin.site.register(Doctor)
 admin.site.register(Category)
 admin.site.register(District)
-
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class DoctorsApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'doctors_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from django.conf import settings
+        if settings.DOCTOR_WARM_UP:
+            from .warmup import prepare
+            prepare()
@@ -0,0 +1,156 @@
+from bisect import bisect_left, insort
+import re
+import threading
+import time
+import unicodedata
+from doctors.db_routers import use_primary
+from .models import Doctor
+from .index import PATCH_LIMIT
+from .signals import directory_changes, directory_version, is_current, is_expired
+import logging
+
+logger = logging.getLogger(__name__)
+
+# removed so that "Dr." matches "dr" and "O'Brien" matches "obrien"
+ELIDED = re.compile(r"['\u2019.]")
+SEPARATORS = re.compile(r'[\W_]+')
+# ideographs, kana and hangul: names are written without spaces, so every
+# character may start what the user types
+CJK = re.compile('[\u1100-\u11ff\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+def normalize_name(text):
+    """Casefold, strip accents and punctuation and collapse whitespace, for prefix matching."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = SEPARATORS.sub(' ', ELIDED.sub('', unicodedata.normalize('NFKC', text).casefold()))
+    return text.strip()
+
+def name_keys(name):
+    """
+    The suffixes of the normalized name a query may be a prefix of: the
+    whole name and its words, and with CJK text every character onwards.
+    "Dr. John Smith" gives "dr john smith", "john smith" and "smith".
+    """
+    text = normalize_name(name)
+    starts = {0}
+    for position, char in enumerate(text):
+        if char == ' ':
+            starts.add(position + 1)
+        elif CJK.match(char):
+            starts.add(position)
+    return sorted({text[start:] for start in starts if start < len(text)})
+
+class AutocompleteIndex:
+    """
+    Sorted ``(key, id)`` entries of the active doctors' names. A prefix query
+    is a binary search followed by a scan of the matching range, which stops
+    as soon as ``limit`` doctors were found.
+
+    A published index is never modified: ``patched`` returns a new one, so
+    readers need no lock.
+    """
+    __slots__ = ('version', 'loaded_at', 'entries', 'names')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.names = {}
+        self.entries = []
+        for pk, name in rows:
+            self.names[pk] = name
+            self.entries.extend((key, pk) for key in name_keys(name))
+        self.entries.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` ``(id, name)`` pairs whose name has a word starting with ``query``."""
+        prefix = normalize_name(query)
+        if not prefix:
+            return []
+        entries = self.entries
+        found = {}
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(found) < limit:
+            key, pk = entries[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(pk, self.names[pk])
+            position += 1
+        return list(found.items())
+
+    def patched(self, version, changed, rows):
+        """
+        A new index at ``version`` in which the ``changed`` doctor ids hold
+        their current ``(id, name)`` ``rows``, for those still active. This
+        one is left untouched.
+        """
+        index = object.__new__(AutocompleteIndex)
+        index.version = version
+        index.loaded_at = self.loaded_at
+        index.names = dict(self.names)
+        index.entries = list(self.entries)
+        names = dict(rows)
+        for pk in changed:
+            index.update(pk, names.get(pk))
+        return index
+
+    def update(self, pk, name):
+        """Replace the entries of one doctor, ``name=None`` removes them. Only for unpublished copies."""
+        old = self.names.pop(pk, None)
+        if old is not None:
+            for key in name_keys(old):
+                position = bisect_left(self.entries, (key, pk))
+                if position < len(self.entries) and self.entries[position] == (key, pk):
+                    del self.entries[position]
+        if name is not None:
+            self.names[pk] = name
+            for key in name_keys(name):
+                insort(self.entries, (key, pk))
+
+def build_autocomplete(version):
+    # from the primary, a lagging replica would be labelled with the new version
+    with use_primary():
+        index = AutocompleteIndex(version, Doctor.objects.filter(is_active=True).values_list('id', 'name').iterator())
+    logger.debug("Built autocomplete index v%s with %d names", version, len(index))
+    return index
+
+def patch_autocomplete(snapshot, version, changed):
+    """Return ``snapshot`` patched with the current names of the ``changed`` doctors."""
+    with use_primary():
+        rows = list(Doctor.objects.filter(pk__in=changed, is_active=True).order_by().values_list('id', 'name'))
+    index = snapshot.patched(version, changed, rows)
+    logger.debug("Patched autocomplete index v%s to v%s with %d doctors", snapshot.version, version, len(changed))
+    return index
+
+_lock = threading.Lock()
+_snapshot = None
+
+def get_autocomplete():
+    """
+    Return this worker's index. When the directory version moved it is
+    patched with the doctors changed in between, like the doctor index, or
+    rebuilt when they are not all recorded or too many, or when the index
+    expired.
+    """
+    global _snapshot
+    version = directory_version()
+    snapshot = _snapshot
+    if is_current(snapshot, version):
+        return snapshot
+    with _lock:
+        snapshot = _snapshot
+        if not is_current(snapshot, version):
+            changed = None
+            if snapshot is not None and not is_expired(snapshot):
+                changed = directory_changes(snapshot.version, version)
+            if changed is None or len(changed) > PATCH_LIMIT:
+                _snapshot = build_autocomplete(version)
+            else:
+                _snapshot = patch_autocomplete(snapshot, version, changed)
+        return _snapshot
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
@@ -0,0 +1,104 @@
+from collections import OrderedDict
+import threading
+from django.conf import settings
+from django.core.cache import caches
+from .signals import reference_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+def updated_stamp(updated_at):
+    # microseconds since the epoch, cheap to store and compare
+    return int(updated_at.timestamp() * 1_000_000)
+
+class LRUCache:
+    """Process-local LRU cache of byte strings, bounded by their total size."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get_many(self, keys):
+        found = {}
+        with self.lock:
+            for key in keys:
+                value = self.entries.get(key)
+                if value is not None:
+                    self.entries.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def set_many(self, mapping):
+        with self.lock:
+            for key, value in mapping.items():
+                if len(value) > self.max_bytes:
+                    continue
+                previous = self.entries.pop(key, None)
+                if previous is not None:
+                    self.size -= len(previous)
+                self.entries[key] = value
+                self.size += len(value)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+class RowCache:
+    """
+    Rendered JSON fragments of single doctor rows, keyed by
+    (doctor id, updated_at, language, reference version).
+
+    A size-bounded process LRU sits in front of the shared ``doctor_rows``
+    cache, so hot rows are served from memory and the other workers only pay
+    for a cache round trip instead of running the serializer. Saving a doctor
+    changes its ``updated_at`` and renaming a category or district bumps the
+    reference version, so stale fragments are never hit and age out of both
+    tiers on their own.
+    """
+
+    def __init__(self, alias, max_bytes, timeout=None):
+        self.shared = caches[alias]
+        self.local = LRUCache(max_bytes)
+        self.timeout = timeout
+
+    def join(self, rows, language, render_missing):
+        """
+        Return the JSON array of the given ``(id, updated_stamp)`` rows.
+        ``render_missing`` receives the ids without a cached fragment and
+        returns a mapping of id to rendered bytes.
+        """
+        generation = reference_version()
+        keys = {pk: f'doctor:{pk}:{stamp}:{language}:{generation}' for pk, stamp in rows}
+
+        found = self.local.get_many(keys.values())
+        if len(found) < len(keys):
+            shared = self.shared.get_many([key for key in keys.values() if key not in found])
+            self.local.set_many(shared)
+            found.update(shared)
+
+        missing = [pk for pk, key in keys.items() if key not in found]
+        if missing:
+            fresh = {keys[pk]: fragment for pk, fragment in render_missing(missing).items()}
+            self.shared.set_many(fresh, timeout=self.timeout)
+            self.local.set_many(fresh)
+            found.update(fresh)
+            logger.debug("Rendered %d of %d doctor rows", len(missing), len(keys))
+
+        return b'[' + b','.join(found[key] for key in keys.values() if key in found) + b']'
+
+_row_cache = None
+
+def get_row_cache():
+    global _row_cache
+    if _row_cache is None:
+        _row_cache = RowCache('doctor_rows', settings.DOCTOR_ROW_CACHE_LOCAL_BYTES)
+    return _row_cache
@@ -0,0 +1,103 @@
+from hashlib import sha1
+from urllib.parse import urlencode
+import threading
+import time
+from django.core.cache import cache
+from .signals import DIRECTORY_VERSION_KEY, REFERENCE_VERSION_KEY
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Share one computation between identical concurrent requests.
+
+    Inside a worker, threads asking for a key that is already being computed
+    wait for that computation. Across workers, results are kept in the shared
+    cache for ``ttl`` seconds plus a ``grace`` period: once a result expires
+    one worker takes a short lock and recomputes it while the others keep
+    serving the stale copy, so an expiry never turns into a stampede.
+    """
+
+    def __init__(self, lock_timeout=10, poll_interval=0.01, max_wait=1.0):
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, compute, ttl, grace=0):
+        entry = cache.get(key)
+        if entry is not None and entry[0] > time.time():
+            return entry[1]
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self.compute_shared(key, entry, compute, ttl, grace)
+            return call.value
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+    def compute_shared(self, key, entry, compute, ttl, grace):
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, 1, timeout=self.lock_timeout):
+            if entry is not None:
+                # another worker is refreshing it
+                return entry[1]
+            deadline = time.monotonic() + self.max_wait
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                entry = cache.get(key)
+                if entry is not None:
+                    return entry[1]
+            logger.debug("Gave up waiting for %s, computing it again", key)
+            return compute()
+
+        try:
+            value = compute()
+            cache.set(key, (time.time() + ttl, value), timeout=ttl + grace)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+def request_key(prefix, request, language):
+    """
+    Cache key of a GET request: the query parameters in a canonical order, the
+    language and the directory versions, so any write starts a new key.
+    """
+    params = sorted(
+        (name, value.strip())
+        for name, values in request.query_params.lists()
+        for value in values
+        if value.strip()
+    )
+    versions = cache.get_many([DIRECTORY_VERSION_KEY, REFERENCE_VERSION_KEY])
+    digest = sha1(urlencode(params).encode()).hexdigest()
+    return (
+        f'{prefix}:{versions.get(DIRECTORY_VERSION_KEY, 0)}:'
+        f'{versions.get(REFERENCE_VERSION_KEY, 0)}:{language}:{digest}'
+    )
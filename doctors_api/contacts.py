@@ -0,0 +1,40 @@
+import re
+
+# separators between the values of the free-text contact_details field
+SEPARATORS = re.compile(r'[,;\n]')
+# leading labels such as "Phone:" or "Email -"
+LABEL = re.compile(r'^[^\W\d_][\w .]*?\s*[:\-]\s*(?=\S)')
+EMAIL = re.compile(r'[^\s:<>@]+@[^\s:<>@]+\.[^\s:<>@]+')
+DIGITS = re.compile(r'\d')
+
+MIN_PHONE_DIGITS = 6
+
+def normalize_contact(text):
+    """
+    Return the ``(type, value)`` of a single contact, with the value in the
+    form stored in DoctorContact: lowercase emails, phone numbers reduced to
+    their digits (keeping a leading ``+``) and everything else casefolded.
+    Returns None for blank input.
+    """
+    text = LABEL.sub('', text.strip(), count=1).strip()
+    if not text:
+        return None
+
+    email = EMAIL.search(text)
+    if email:
+        return ('email', email.group().lower())
+
+    digits = ''.join(DIGITS.findall(text))
+    if len(digits) >= MIN_PHONE_DIGITS:
+        return ('phone', ('+' if text.startswith('+') else '') + digits)
+
+    return ('other', ' '.join(text.casefold().split()))
+
+def parse_contact_details(text):
+    """Split a free-text contact_details value into unique ``(type, value)`` pairs."""
+    contacts = []
+    for part in SEPARATORS.split(text or ''):
+        contact = normalize_contact(part)
+        if contact and contact not in contacts:
+            contacts.append(contact)
+    return contacts
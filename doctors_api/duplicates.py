@@ -0,0 +1,35 @@
+import hashlib
+import unicodedata
+
+# what POST /doctor/bulk_create/ does with doctors that are already listed
+POLICIES = ('reject', 'skip', 'merge')
+
+def normalize_text(text):
+    """NFKC, casefold and collapse whitespace, so that re-typed copies compare equal."""
+    return ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+def content_hash(name, address, district_id):
+    """
+    Identity of a listing: the doctor's name and address in a district,
+    ignoring case and spacing. No two active doctors share it.
+    """
+    key = '\x1f'.join([normalize_text(name), normalize_text(address), str(district_id)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def find_duplicates(hashes, existing):
+    """
+    Map the position of every duplicate in ``hashes`` to what it duplicates:
+    ``('doctor', id)`` when the hash is one of ``existing``, the
+    ``{hash: id}`` of the active doctors, otherwise ``('item', position)``
+    of the first submission with the same hash.
+    """
+    duplicates = {}
+    first = {}
+    for position, value in enumerate(hashes):
+        if value in existing:
+            duplicates[position] = ('doctor', existing[value])
+        elif value in first:
+            duplicates[position] = ('item', first[value])
+        else:
+            first[value] = position
+    return duplicates
@@ -0,0 +1,307 @@
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import compress
+from math import ceil, floor
+import re
+import threading
+import time
+from doctors.db_routers import use_primary
+from .models import Doctor, SpokenLanguage, parse_language_codes
+from .signals import directory_changes, directory_version, is_current, is_expired
+from .cache import updated_stamp
+import logging
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ('id', 'name', 'category_id', 'district_id', 'consultation_fee_cents', 'updated_at')
+
+# fee ranges OR the bitsets of the 50.00 wide buckets they cover, and check
+# the fees one by one only in the buckets their bounds fall in
+FEE_BUCKET_CENTS = 5000
+
+# more changed doctors than this rebuild the snapshot instead of patching it
+PATCH_LIMIT = 100
+
+# the set bits of every byte value
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+NONZERO_BYTES = re.compile(rb'[^\x00]+')
+# the digits of bin() as the bytes 0 and 1, for itertools.compress
+BINARY_DIGITS = bytes.maketrans(b'01', b'\x00\x01')
+
+def bitset(positions, size):
+    # set the bits in a byte buffer first, OR-ing into a big int is quadratic
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+def set_bits(mask):
+    """The positions of the set bits of ``mask`` in ascending order."""
+    if mask.bit_count() * 32 < mask.bit_length():
+        # few matches: only visit the non-zero bytes
+        data = mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+        positions = []
+        for run in NONZERO_BYTES.finditer(data):
+            base = run.start() * 8
+            for value in run.group():
+                positions.extend([base + bit for bit in BYTE_BITS[value]])
+                base += 8
+        return positions
+    # bin() lists the bits most significant first, every step runs in C
+    flags = bin(mask)[:1:-1].encode().translate(BINARY_DIGITS)
+    return list(compress(range(len(flags)), flags))
+
+class DoctorIndex:
+    """
+    Columnar in-memory snapshot of the active doctors.
+
+    Rows are stored in name order, so position ``i`` of every column refers to
+    the same doctor and walking positions in ascending order gives the
+    ``Doctor.Meta.ordering`` result without sorting. Equality filters and fee
+    buckets are answered with per-value bitsets (plain ints, bit ``i`` set for
+    row ``i``), which also covers the multi-valued spoken languages; only the
+    set bits of the result are visited.
+
+    A snapshot is never modified once it is published: ``patched`` returns a
+    new one, so readers need no lock.
+    """
+    __slots__ = (
+        'version',
+        'loaded_at',
+        'ids',
+        'names',
+        'fees',
+        'updated',
+        'all_rows',
+        'by_category',
+        'by_district',
+        'by_language',
+        'by_fee',
+        'fee_buckets',
+    )
+
+    def __init__(self, version, rows, languages=()):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.ids = array('q')
+        self.names = []
+        self.fees = array('q')
+        self.updated = array('q')
+        by_category = defaultdict(list)
+        by_district = defaultdict(list)
+        by_language = defaultdict(list)
+        by_fee = defaultdict(list)
+
+        positions = {}
+        for position, (pk, name, category_id, district_id, fee_cents, updated_at) in enumerate(rows):
+            positions[pk] = position
+            self.ids.append(pk)
+            self.names.append(name)
+            self.fees.append(fee_cents)
+            self.updated.append(updated_stamp(updated_at))
+            by_category[category_id].append(position)
+            by_district[district_id].append(position)
+            by_fee[fee_cents // FEE_BUCKET_CENTS].append(position)
+
+        for pk, language in languages:
+            position = positions.get(pk)
+            if position is not None:
+                by_language[language].append(position)
+
+        size = len(self.ids)
+        self.by_category = {value: bitset(rows, size) for value, rows in by_category.items()}
+        self.by_district = {value: bitset(rows, size) for value, rows in by_district.items()}
+        self.by_language = {value: bitset(rows, size) for value, rows in by_language.items()}
+        self.by_fee = {value: bitset(rows, size) for value, rows in by_fee.items()}
+        self.fee_buckets = sorted(self.by_fee)
+        self.all_rows = (1 << size) - 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(
+        self,
+        category=None,
+        district=None,
+        language=None,
+        min_consultation_fee=None,
+        max_consultation_fee=None,
+    ):
+        """Return the matching row positions in name order. Arguments mirror ``DoctorFilter``."""
+        mask = self.all_rows
+        if category is not None:
+            mask &= self.by_category.get(int(category), 0)
+        if district is not None:
+            mask &= self.by_district.get(int(district), 0)
+        codes = parse_language_codes(language)
+        if codes:
+            spoken = 0
+            for code in codes:
+                spoken |= self.by_language.get(code, 0)
+            mask &= spoken
+        if mask and (min_consultation_fee is not None or max_consultation_fee is not None):
+            low = ceil(min_consultation_fee * 100) if min_consultation_fee is not None else None
+            high = floor(max_consultation_fee * 100) if max_consultation_fee is not None else None
+            mask = self.fee_range(mask, low, high)
+        return set_bits(mask)
+
+    def fee_range(self, mask, low, high):
+        """The rows of ``mask`` with a fee between ``low`` and ``high`` cents, either bound may be None."""
+        buckets = self.fee_buckets
+        low_bucket = low // FEE_BUCKET_CENTS if low is not None else None
+        high_bucket = high // FEE_BUCKET_CENTS if high is not None else None
+        first = bisect_left(buckets, low_bucket) if low is not None else 0
+        last = bisect_right(buckets, high_bucket) if high is not None else len(buckets)
+        inside = edges = 0
+        for bucket in buckets[first:last]:
+            if bucket == low_bucket or bucket == high_bucket:
+                edges |= self.by_fee[bucket]
+            else:
+                inside |= self.by_fee[bucket]
+        fees = self.fees
+        matching = [
+            i for i in set_bits(mask & edges)
+            if (low is None or fees[i] >= low) and (high is None or fees[i] <= high)
+        ]
+        return mask & inside | bitset(matching, len(self))
+
+    def filter(self, **filters):
+        """Return the matching doctor ids in name order."""
+        ids = self.ids
+        return [ids[i] for i in self.positions(**filters)]
+
+    def rows(self, **filters):
+        """Return ``(id, updated_stamp)`` pairs of the matching doctors in name order."""
+        ids, updated = self.ids, self.updated
+        return [(ids[i], updated[i]) for i in self.positions(**filters)]
+
+    def patched(self, version, changed, rows, languages=()):
+        """
+        A new snapshot at ``version`` in which the ``changed`` doctor ids hold
+        their current ``rows`` (the constructor's, for those still active) and
+        ``languages``. This one is left untouched.
+        """
+        index = object.__new__(DoctorIndex)
+        index.version = version
+        # patches only bring in the changes recorded in the cache
+        index.loaded_at = self.loaded_at
+        index.ids = array('q', self.ids)
+        index.names = list(self.names)
+        index.fees = array('q', self.fees)
+        index.updated = array('q', self.updated)
+        index.all_rows = self.all_rows
+        for name in ('by_category', 'by_district', 'by_language', 'by_fee'):
+            setattr(index, name, dict(getattr(self, name)))
+        index.fee_buckets = list(self.fee_buckets)
+
+        spoken = defaultdict(list)
+        for pk, language in languages:
+            spoken[pk].append(language)
+        for pk in changed:
+            index.remove(pk)
+        for row in rows:
+            index.insert(row, spoken[row[0]])
+        return index
+
+    def bitsets(self):
+        return (self.by_category, self.by_district, self.by_language, self.by_fee)
+
+    def remove(self, pk):
+        try:
+            position = self.ids.index(pk)
+        except ValueError:
+            return
+        for column in (self.ids, self.names, self.fees, self.updated):
+            del column[position]
+        low = (1 << position) - 1
+        for bitsets in self.bitsets():
+            for value, mask in bitsets.items():
+                # the bits above position move down
+                bitsets[value] = mask & low | mask >> position + 1 << position
+        self.all_rows >>= 1
+
+    def insert(self, row, languages):
+        pk, name, category_id, district_id, fee_cents, updated_at = row
+        # (name, id) order, like build_index
+        low, high = bisect_left(self.names, name), bisect_right(self.names, name)
+        position = bisect_left(self.ids, pk, low, high)
+        self.ids.insert(position, pk)
+        self.names.insert(position, name)
+        self.fees.insert(position, fee_cents)
+        self.updated.insert(position, updated_stamp(updated_at))
+        low = (1 << position) - 1
+        for bitsets in self.bitsets():
+            for value, mask in bitsets.items():
+                # a clear bit at position, the bits above it move up
+                bitsets[value] = mask & low | mask >> position << position + 1
+        bucket = fee_cents // FEE_BUCKET_CENTS
+        if bucket not in self.by_fee:
+            insort(self.fee_buckets, bucket)
+        bit = 1 << position
+        for bitsets, value in (
+            (self.by_category, category_id),
+            (self.by_district, district_id),
+            (self.by_fee, bucket),
+            *((self.by_language, language) for language in languages),
+        ):
+            bitsets[value] = bitsets.get(value, 0) | bit
+        self.all_rows = self.all_rows << 1 | 1
+
+def build_index(version):
+    # the snapshot is labelled with the version just read, rows from a lagging
+    # replica would stay stale in it until the next change
+    with use_primary():
+        rows = (
+            Doctor.objects.filter(is_active=True)
+            .order_by('name', 'id')
+            .values_list(*COLUMNS)
+            .iterator()
+        )
+        languages = (
+            SpokenLanguage.objects.filter(doctor__is_active=True)
+            .values_list('doctor_id', 'language')
+            .iterator()
+        )
+        index = DoctorIndex(version, rows, languages)
+    logger.debug("Built doctor index v%s with %d rows", version, len(index))
+    return index
+
+def patch_index(snapshot, version, changed):
+    """Return ``snapshot`` patched with the current rows of the ``changed`` doctors."""
+    with use_primary():
+        rows = list(Doctor.objects.filter(pk__in=changed, is_active=True).order_by().values_list(*COLUMNS))
+        languages = list(SpokenLanguage.objects.filter(doctor__in=changed).order_by().values_list('doctor_id', 'language'))
+    index = snapshot.patched(version, changed, rows, languages)
+    logger.debug("Patched doctor index v%s to v%s with %d doctors", snapshot.version, version, len(changed))
+    return index
+
+_lock = threading.Lock()
+_snapshot = None
+
+def get_index():
+    """
+    Return this worker's snapshot. When the directory version moved it is
+    patched with the doctors changed in between, or rebuilt when they are not
+    all recorded or too many, or when the snapshot expired.
+    """
+    global _snapshot
+    version = directory_version()
+    snapshot = _snapshot
+    if is_current(snapshot, version):
+        return snapshot
+    with _lock:
+        snapshot = _snapshot
+        if not is_current(snapshot, version):
+            changed = None
+            if snapshot is not None and not is_expired(snapshot):
+                changed = directory_changes(snapshot.version, version)
+            if changed is None or len(changed) > PATCH_LIMIT:
+                _snapshot = build_index(version)
+            else:
+                _snapshot = patch_index(snapshot, version, changed)
+        return _snapshot
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
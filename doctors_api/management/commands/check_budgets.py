@@ -0,0 +1,136 @@
+from contextlib import ExitStack
+from pathlib import Path
+from urllib.parse import urlencode
+import json
+import logging
+import math
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve
+from doctors_api.models import Doctor
+from doctors_api.schema import SchemaGenerator
+from .seed_directory import INACTIVE_RATE
+
+DEFAULT_BUDGETS = Path(settings.BASE_DIR) / 'budgets.json'
+
+def example_requests(schema):
+    """The URLs of the example requests of the GET operations, the bare path of those without examples."""
+    requests = []
+    for path, operations in schema['paths'].items():
+        operation = operations.get('get')
+        if operation is None:
+            continue
+        parameters = operation['parameters']
+        names = list(dict.fromkeys(name for parameter in parameters for name in parameter.get('examples', {})))
+        for name in names or [None]:
+            url, query = path, {}
+            for parameter in parameters:
+                example = parameter.get('examples', {}).get(name)
+                if example is None:
+                    if parameter['in'] == 'path':
+                        raise CommandError(f"{path} has no example value for {parameter['name']!r}.")
+                    continue
+                value = example['value']
+                if isinstance(value, list):
+                    value = ','.join(map(str, value))
+                if parameter['in'] == 'path':
+                    url = url.replace('{%s}' % parameter['name'], str(value))
+                else:
+                    query[parameter['name']] = value
+            requests.append(f'{url}?{urlencode(query)}' if query else url)
+    return requests
+
+class Command(BaseCommand):
+    """
+    Replays the example requests of the OpenAPI schema (doctors_api.schema)
+    against the local database and checks each endpoint against its budgets in
+    budgets.json: the most queries per request, the 95th percentile latency
+    with at least ``rows`` active doctors, and the most bytes per response
+    (uncompressed, so per page for the paged doctor lists).
+
+        python manage.py seed_directory --synthetic 102100 --seed 1
+        python manage.py check_budgets
+    """
+    help = "Replays the OpenAPI schema's example requests and checks them against the performance budgets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--budgets', type=Path, default=DEFAULT_BUDGETS, help="Budgets file, default budgets.json.")
+        parser.add_argument('--samples', type=int, help="Timed requests per example, default the budgets file's.")
+
+    def handle(self, *args, **options):
+        try:
+            budgets = json.loads(options['budgets'].read_text())
+        except (OSError, ValueError) as error:
+            raise CommandError(f"Cannot read the budgets: {error}")
+        samples = options['samples'] or budgets['samples']
+        rows = Doctor.objects.filter(is_active=True).count()
+        if rows < budgets['rows']:
+            # some of the synthetic doctors are seeded inactive
+            missing = math.ceil((budgets['rows'] - rows) / (1 - INACTIVE_RATE))
+            raise CommandError(
+                f"The budgets hold at {budgets['rows']} active doctors, the database has {rows}: "
+                f"seed it with python manage.py seed_directory --synthetic {missing}"
+            )
+
+        endpoints = budgets['endpoints']
+        failures = []
+        replayed = set()
+        client = Client()
+        # rate limits would answer 429, and every request would be logged
+        disabled = logging.root.manager.disable
+        logging.disable(logging.INFO)
+        try:
+            with override_settings(THROTTLE_ENABLED=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                for url in example_requests(SchemaGenerator().get_schema(public=True)):
+                    endpoint = resolve(url.partition('?')[0]).url_name
+                    replayed.add(endpoint)
+                    budget = endpoints.get(endpoint)
+                    if budget is None:
+                        failures.append(f"{endpoint} has no budget")
+                        continue
+                    failures += self.check_endpoint(client, url, endpoint, budget, samples)
+        finally:
+            logging.disable(disabled)
+
+        failures += [f"{endpoint} is not in the schema" for endpoint in sorted(set(endpoints) - replayed)]
+        if failures:
+            raise CommandError(f"{len(failures)} budget checks failed:\n" + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(f"All {len(replayed)} endpoints within budget at {rows} doctors."))
+
+    def check_endpoint(self, client, url, endpoint, budget, samples):
+        # the first request loads the per-worker snapshots and fills the caches
+        client.get(url)
+        with ExitStack() as stack:
+            queries = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+            response = client.get(url)
+        # counted before the next request resets the query log
+        query_count = sum(len(context) for context in queries)
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        measured = {
+            'max_queries': query_count,
+            'max_p95_ms': statistics.quantiles(timings, n=20)[18] if len(timings) > 1 else timings[0],
+            'max_bytes': len(response.content),
+        }
+        failures = []
+        if response.status_code != 200:
+            failures.append(f"{endpoint} {url} answered {response.status_code}")
+        for name, value in measured.items():
+            if value > budget[name]:
+                failures.append(f"{endpoint} {url} {name}: {value:g} > {budget[name]}")
+        self.stdout.write(
+            f"{endpoint:20} {measured['max_queries']:>3}/{budget['max_queries']:<3} queries "
+            f"{measured['max_p95_ms']:>7.1f}/{budget['max_p95_ms']:<5} ms p95 "
+            f"{measured['max_bytes']:>8}/{budget['max_bytes']:<8} bytes  {url}",
+            self.style.ERROR if failures else None,
+        )
+        return failures
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from doctors.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = (
+        "Prints a signed token that makes a request respond with its profile, "
+        "sent as the X-Profile header or the profile query parameter. Needs DJANGO_PROFILING=True."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('issued_by', help="Who the token is for, logged with every profiled request.")
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING:
+            self.stderr.write("Profiling is disabled, set DJANGO_PROFILING=True to accept the token.")
+        self.stdout.write(make_token(options['issued_by']))
+        if options['verbosity'] > 1:
+            self.stderr.write(f"Valid for {settings.PROFILING_TOKEN_MAX_AGE} seconds.")
@@ -0,0 +1,250 @@
+from decimal import Decimal
+from pathlib import Path
+import gzip
+import json
+import random
+import re
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers import python
+from django.core.serializers.base import DeserializationError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Max
+from doctors_api.models import Category, District, Doctor, DoctorContact, SpokenLanguage
+from doctors_api.signals import bump_directory_version, bump_reference_version
+
+# one JSON object per line, anything else is a JSON array (Django fixture)
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+# skipped between the objects of a JSON array
+SEPARATORS = re.compile(r'[\s,]*')
+
+# columns overwritten when a fixture object's primary key already exists
+DOCTOR_UPDATE_FIELDS = [
+    field.name for field in Doctor._meta.concrete_fields
+    if not field.primary_key and not field.generated and field.name != 'created_at'
+]
+
+FIRST_NAMES = (
+    'Alice', 'Bonnie', 'Carmen', 'Daniel', 'David', 'Eric', 'Grace', 'Henry', 'Ivy', 'Jason',
+    'Joyce', 'Kelvin', 'Ka Ming', 'Mandy', 'Michael', 'Peter', 'Queenie', 'Raymond', 'Siu Wai',
+    'Stephanie', 'Tommy', 'Vivian', 'Wing Yan', 'Winnie',
+)
+LAST_NAMES = (
+    'Au', 'Chan', 'Cheng', 'Cheung', 'Chow', 'Fung', 'Ho', 'Kwok', 'Lai', 'Lam', 'Lau', 'Lee',
+    'Leung', 'Li', 'Lo', 'Ma', 'Mak', 'Ng', 'Siu', 'Tam', 'Tang', 'Tsang', 'Wong', 'Yeung', 'Yip',
+)
+CHINESE_SURNAMES = ('陳', '黃', '李', '張', '劉', '林', '梁', '吳', '何', '王')
+CHINESE_GIVEN_NAMES = ('大文', '嘉欣', '志明', '美玲', '家豪', '詠詩', '偉強', '淑儀', '子軒', '曉彤')
+STREETS = (
+    "Queen's Road Central", 'Nathan Road', 'Hennessy Road', 'Des Voeux Road', 'King\'s Road',
+    'Castle Peak Road', 'Sha Tin Centre Street', 'Canton Road', 'Argyle Street', 'Tai Po Road',
+)
+# primary language weights, and the chance of speaking each other language too
+LANGUAGE_WEIGHTS = {'en': 5, 'cantonese': 4, 'mandarin': 2}
+EXTRA_LANGUAGE_RATE = 0.3
+INACTIVE_RATE = 0.02
+
+def iter_json_array(file, chunk_size=1 << 20):
+    """Yield the elements of a JSON array of objects, reading ``chunk_size`` characters at a time."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("Expected a JSON array")
+    position = 1
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            obj, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # the next object continues in the next chunk
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield obj
+
+def iter_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+def read_fixture(path):
+    """Yield the objects of a fixture file, which may be gzipped (``.json.gz``)."""
+    path = Path(path)
+    compressed = path.suffix == '.gz'
+    opener = gzip.open if compressed else open
+    with opener(path, 'rt', encoding='utf-8') as file:
+        if (path.with_suffix('') if compressed else path).suffix in NDJSON_SUFFIXES:
+            yield from iter_ndjson(file)
+        else:
+            yield from iter_json_array(file)
+
+def synthetic_doctors(count, first_id, category_ids, districts, rng):
+    """Yield ``count`` random ``(doctor, languages)`` pairs with consecutive ids."""
+    languages = list(LANGUAGE_WEIGHTS)
+    weights = list(LANGUAGE_WEIGHTS.values())
+    for pk in range(first_id, first_id + count):
+        if rng.random() < 0.25:
+            name = rng.choice(CHINESE_SURNAMES) + rng.choice(CHINESE_GIVEN_NAMES)
+        else:
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+        contact_details = f"+852 {rng.randrange(2000, 10000)} {rng.randrange(10000):04}"
+        if rng.random() < 0.3:
+            contact_details += f", doctor{pk}@example.com"
+        district_id, district_name = rng.choice(districts)
+        language = rng.choices(languages, weights)[0]
+        doctor = Doctor(
+            id=pk,
+            name=name,
+            # the unit keeps the listings unique, see Doctor.content_hash
+            address=f"Unit {pk}, {rng.randrange(1, 500)} {rng.choice(STREETS)}, {district_name}",
+            contact_details=contact_details,
+            category_id=rng.choice(category_ids),
+            district_id=district_id,
+            language=language,
+            consultation_fee=Decimal(rng.randrange(200, 5001, 50)),
+            is_active=rng.random() >= INACTIVE_RATE,
+        )
+        yield doctor, [other for other in languages if other != language and rng.random() < EXTRA_LANGUAGE_RATE]
+
+class Command(BaseCommand):
+    """
+    Seeds the directory with bulk inserts instead of ``loaddata``'s one save per
+    object: fixtures are streamed, inserted (or updated, by primary key) in
+    batches inside one transaction, and the foreign keys are checked once at the
+    end. Synthetic doctors can be added at any scale for performance testing.
+
+        python manage.py seed_directory doctors_api/fixtures/categories.json \\
+            doctors_api/fixtures/districts.json doctors_api/fixtures/doctors.json
+        python manage.py seed_directory --synthetic 500000 --seed 1
+    """
+    help = (
+        "Bulk loads categories, districts and doctors from JSON or NDJSON fixtures, "
+        "and optionally generates synthetic doctors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'fixtures', nargs='*',
+            help="Django fixture files: JSON arrays, or NDJSON (.ndjson, .jsonl) with one object per line. "
+                 "May be gzipped (.gz). Objects whose primary key exists are updated.",
+        )
+        parser.add_argument('--synthetic', type=int, default=0, metavar='COUNT', help="Number of random doctors to add.")
+        parser.add_argument('--seed', type=int, help="Random seed of the synthetic doctors, for reproducible data sets.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Objects per INSERT batch (default 1000).")
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database to seed.")
+
+    def handle(self, *args, **options):
+        if not options['fixtures'] and not options['synthetic']:
+            raise CommandError("Give fixture files and/or --synthetic COUNT.")
+        if options['synthetic'] < 0 or options['batch_size'] < 1:
+            raise CommandError("--synthetic and --batch-size must be positive.")
+
+        self.using = options['database']
+        self.batch_size = options['batch_size']
+        self.verbosity = options['verbosity']
+        self.pending = {Category: [], District: [], Doctor: []}
+        self.counts = dict.fromkeys(self.pending, 0)
+        started = time.perf_counter()
+        connection = connections[self.using]
+
+        with transaction.atomic(using=self.using):
+            with connection.constraint_checks_disabled():
+                try:
+                    for path in options['fixtures']:
+                        self.load_fixture(path)
+                    if options['synthetic']:
+                        self.generate(options['synthetic'], random.Random(options['seed']))
+                    for model in self.pending:
+                        self.flush(model)
+                except IntegrityError as e:
+                    # e.g. two active doctors with the same name and address in a district
+                    raise CommandError(f"Could not seed the directory: {e}")
+
+            # the foreign keys were not checked while inserting
+            models = [Doctor, SpokenLanguage, DoctorContact]
+            try:
+                connection.check_constraints(table_names=[model._meta.db_table for model in models])
+            except IntegrityError as e:
+                raise CommandError(f"Could not seed the directory: {e}")
+            # explicit primary keys leave the sequences behind (PostgreSQL)
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), [Category, District, *models]):
+                    cursor.execute(sql)
+
+            transaction.on_commit(bump_directory_version, using=self.using)
+            if self.counts[Category] or self.counts[District]:
+                transaction.on_commit(bump_reference_version, using=self.using)
+
+        if self.verbosity:
+            self.stdout.write(
+                f"Seeded {self.counts[Category]} categories, {self.counts[District]} districts "
+                f"and {self.counts[Doctor]} doctors in {time.perf_counter() - started:.1f} s"
+            )
+
+    def load_fixture(self, path):
+        try:
+            for deserialized in python.Deserializer(read_fixture(path), using=self.using, ignorenonexistent=True):
+                obj = deserialized.object
+                if type(obj) not in self.pending:
+                    raise CommandError(f"{path}: cannot seed {obj._meta.label} objects")
+                self.add(obj)
+        except (OSError, ValueError, DeserializationError) as e:
+            raise CommandError(f"{path}: {e}")
+
+    def generate(self, count, rng):
+        # the fixtures' categories and districts are in the pending batches
+        for model in (Category, District):
+            self.flush(model)
+        category_ids = list(Category.objects.using(self.using).values_list('id', flat=True))
+        districts = list(District.objects.using(self.using).values_list('id', 'name'))
+        if not category_ids or not districts:
+            raise CommandError("Synthetic doctors need categories and districts, load their fixtures first.")
+
+        self.flush(Doctor)
+        first_id = (Doctor.objects.using(self.using).aggregate(Max('id'))['id__max'] or 0) + 1
+        for doctor, languages in synthetic_doctors(count, first_id, category_ids, districts, rng):
+            self.add(doctor, languages)
+
+    def add(self, obj, languages=()):
+        pending = self.pending[type(obj)]
+        pending.append((obj, languages))
+        if len(pending) >= self.batch_size:
+            self.flush(type(obj))
+
+    def flush(self, model):
+        batch = self.pending[model]
+        if not batch:
+            return
+        objects = [obj for obj, _ in batch]
+        if model is Doctor:
+            self.save_doctors(batch)
+        else:
+            model.objects.using(self.using).bulk_create(
+                objects, update_conflicts=True, unique_fields=['id'], update_fields=['name'],
+            )
+        self.counts[model] += len(batch)
+        self.pending[model] = []
+        if self.verbosity >= 2:
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {self.counts[model]}")
+
+    def save_doctors(self, batch):
+        """Insert or update the doctors, with the rows the post_save signals would have added."""
+        doctors = [doctor for doctor, _ in batch]
+        Doctor.objects.using(self.using).bulk_create(
+            doctors, update_conflicts=True, unique_fields=['id'], update_fields=DOCTOR_UPDATE_FIELDS,
+        )
+        languages = SpokenLanguage.objects.using(self.using)
+        languages.filter(doctor__in=[doctor.pk for doctor in doctors]).delete()
+        languages.bulk_create(
+            SpokenLanguage(doctor_id=doctor.pk, language=language)
+            for doctor, extra in batch
+            for language in dict.fromkeys([doctor.language, *extra])
+        )
+        DoctorContact.objects.db_manager(self.using).replace_for(doctors)
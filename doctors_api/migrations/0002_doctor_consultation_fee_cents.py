@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:38
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='consultation_fee_cents',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('consultation_fee'), '*', models.Value(100))), models.BigIntegerField()), output_field=models.BigIntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['consultation_fee_cents', 'is_active'], name='doctor_fee_cents_idx'),
+        ),
+    ]
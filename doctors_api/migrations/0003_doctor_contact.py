@@ -0,0 +1,77 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:39
+
+import re
+import django.db.models.deletion
+from django.db import migrations, models
+
+# doctors_api.contacts as of this migration, which must keep backfilling the
+# same values whatever the module becomes
+SEPARATORS = re.compile(r'[,;\n]')
+LABEL = re.compile(r'^[^\W\d_][\w .]*?\s*[:\-]\s*(?=\S)')
+EMAIL = re.compile(r'[^\s:<>@]+@[^\s:<>@]+\.[^\s:<>@]+')
+DIGITS = re.compile(r'\d')
+
+MIN_PHONE_DIGITS = 6
+
+
+def normalize_contact(text):
+    text = LABEL.sub('', text.strip(), count=1).strip()
+    if not text:
+        return None
+
+    email = EMAIL.search(text)
+    if email:
+        return ('email', email.group().lower())
+
+    digits = ''.join(DIGITS.findall(text))
+    if len(digits) >= MIN_PHONE_DIGITS:
+        return ('phone', ('+' if text.startswith('+') else '') + digits)
+
+    return ('other', ' '.join(text.casefold().split()))
+
+
+def parse_contact_details(text):
+    contacts = []
+    for part in SEPARATORS.split(text or ''):
+        contact = normalize_contact(part)
+        if contact and contact not in contacts:
+            contacts.append(contact)
+    return contacts
+
+
+def backfill_contacts(apps, schema_editor):
+    Doctor = apps.get_model('doctors_api', 'Doctor')
+    DoctorContact = apps.get_model('doctors_api', 'DoctorContact')
+    db_alias = schema_editor.connection.alias
+    contacts = (
+        DoctorContact(doctor_id=pk, type=type, value=value)
+        for pk, contact_details in Doctor.objects.using(db_alias).values_list('pk', 'contact_details').iterator()
+        for type, value in parse_contact_details(contact_details)
+    )
+    DoctorContact.objects.using(db_alias).bulk_create(contacts, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0002_doctor_consultation_fee_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorContact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('phone', 'Phone'), ('email', 'Email'), ('other', 'Other')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to='doctors_api.doctor')),
+            ],
+            options={
+                'verbose_name': 'Doctor Contact',
+                'verbose_name_plural': 'Doctor Contacts',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['value', 'doctor'], name='doctor_contact_value_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_contacts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.7 on 2026-10-19 01:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# doctors registered once per language only differ in the language column
+DUPLICATE_FIELDS = ('name', 'address', 'contact_details', 'category_id', 'district_id', 'consultation_fee')
+
+
+def backfill_languages(apps, schema_editor):
+    Doctor = apps.get_model('doctors_api', 'Doctor')
+    SpokenLanguage = apps.get_model('doctors_api', 'SpokenLanguage')
+    db_alias = schema_editor.connection.alias
+
+    keepers = {}
+    languages = []
+    duplicates = []
+    for doctor in Doctor.objects.using(db_alias).order_by('pk').values('pk', 'language', 'is_active', *DUPLICATE_FIELDS).iterator():
+        languages.append(SpokenLanguage(doctor_id=doctor['pk'], language=doctor['language']))
+        if not doctor['is_active']:
+            continue
+        # the oldest active row takes over the languages of its duplicates
+        keeper = keepers.setdefault(tuple(doctor[field] for field in DUPLICATE_FIELDS), doctor['pk'])
+        if keeper != doctor['pk']:
+            duplicates.append((doctor['pk'], keeper))
+            languages.append(SpokenLanguage(doctor_id=keeper, language=doctor['language']))
+
+    SpokenLanguage.objects.using(db_alias).bulk_create(languages, batch_size=1000, ignore_conflicts=True)
+    if duplicates:
+        # left active, 0006_doctor_content_hash soft deletes them and can restore them
+        logger.warning(
+            "%d doctors duplicate another one in all but their language: %s",
+            len(duplicates), ', '.join(f'{pk} (of {keeper})' for pk, keeper in duplicates),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0003_doctor_contact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpokenLanguage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(choices=[('en', 'English'), ('mandarin', 'Mandarin'), ('cantonese', 'Cantonese')], max_length=10)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spoken_languages', to='doctors_api.doctor')),
+            ],
+            options={
+                'verbose_name': 'Spoken Language',
+                'verbose_name_plural': 'Spoken Languages',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['language', 'doctor'], name='spoken_language_idx')],
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'language'), name='unique_doctor_language')],
+            },
+        ),
+        migrations.RunPython(backfill_languages, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0004_spoken_language'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['name'], name='doctor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['name'], name='doctor_inactive_name_idx'),
+        ),
+    ]
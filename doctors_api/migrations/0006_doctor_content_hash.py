@@ -0,0 +1,91 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:31
+
+import hashlib
+import unicodedata
+import django.db.models.deletion
+from django.db import migrations, models
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# doctors_api.duplicates as of this migration: the hashes it writes must
+# match the ones Doctor.update_content_hash computes at this point
+def normalize_text(text):
+    return ' '.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+
+def content_hash(name, address, district_id):
+    key = '\x1f'.join([normalize_text(name), normalize_text(address), str(district_id)])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def backfill_content_hashes(apps, schema_editor):
+    """Hash every doctor, soft deleting and recording the later copies of the same active listing."""
+    Doctor = apps.get_model('doctors_api', 'Doctor')
+    DeactivatedDuplicate = apps.get_model('doctors_api', 'DeactivatedDuplicate')
+    db_alias = schema_editor.connection.alias
+    listed = {}
+    duplicates = []
+    batch = []
+    rows = Doctor.objects.using(db_alias).order_by('pk').values_list('pk', 'name', 'address', 'district_id', 'is_active')
+    for pk, name, address, district_id, is_active in rows.iterator():
+        value = content_hash(name, address, district_id)
+        if is_active:
+            keeper = listed.setdefault(value, pk)
+            if keeper != pk:
+                is_active = False
+                duplicates.append(DeactivatedDuplicate(doctor_id=pk, duplicate_of_id=keeper))
+        batch.append(Doctor(pk=pk, content_hash=value, is_active=is_active))
+        if len(batch) >= 1000:
+            Doctor.objects.using(db_alias).bulk_update(batch, ['content_hash', 'is_active'])
+            batch = []
+    Doctor.objects.using(db_alias).bulk_update(batch, ['content_hash', 'is_active'])
+    DeactivatedDuplicate.objects.using(db_alias).bulk_create(duplicates, batch_size=1000)
+    if duplicates:
+        logger.warning(
+            "Soft deleted %d duplicate doctors: %s",
+            len(duplicates), ', '.join(f'{row.doctor_id} (of {row.duplicate_of_id})' for row in duplicates),
+        )
+
+
+def restore_duplicates(apps, schema_editor):
+    """Reactivate the doctors the backfill soft deleted."""
+    Doctor = apps.get_model('doctors_api', 'Doctor')
+    DeactivatedDuplicate = apps.get_model('doctors_api', 'DeactivatedDuplicate')
+    db_alias = schema_editor.connection.alias
+    deactivated = DeactivatedDuplicate.objects.using(db_alias).values('doctor_id')
+    Doctor.objects.using(db_alias).filter(pk__in=deactivated).update(is_active=True)
+    DeactivatedDuplicate.objects.using(db_alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0005_doctor_name_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='DeactivatedDuplicate',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='doctors_api.doctor')),
+                ('duplicate_of', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='doctors_api.doctor')),
+            ],
+            options={
+                'verbose_name': 'Deactivated Duplicate',
+                'verbose_name_plural': 'Deactivated Duplicates',
+            },
+        ),
+        migrations.RunPython(backfill_content_hashes, restore_duplicates),
+        migrations.AddConstraint(
+            model_name='doctor',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('content_hash',), name='unique_active_doctor'),
+        ),
+    ]
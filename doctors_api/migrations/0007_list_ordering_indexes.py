@@ -0,0 +1,34 @@
+# Generated by Django 5.1.7 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctors_api', '0006_doctor_content_hash'),
+    ]
+
+    operations = [
+        # doctor_active_fee_idx covers the fee filters, which only list active doctors
+        migrations.RemoveIndex(
+            model_name='doctor',
+            name='doctor_fee_cents_idx',
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['name'], name='category_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='district',
+            index=models.Index(fields=['name'], name='district_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['consultation_fee_cents'], name='doctor_active_fee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['updated_at'], name='doctor_active_updated_idx'),
+        ),
+    ]
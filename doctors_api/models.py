@@ -1,5 +1,10 @@
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Cast, Round
 from django.utils.translation import gettext_lazy as _
+from .contacts import parse_contact_details
+from .duplicates import content_hash
 import logging
 
 DoctorLanguage = (
@@ -8,8 +13,18 @@ DoctorLanguage = (
     ('cantonese', _('Cantonese')),
 )
 
+ContactType = (
+    ('phone', _('Phone')),
+    ('email', _('Email')),
+    ('other', _('Other')),
+)
+
 logger = logging.getLogger(__name__)
 
+def parse_language_codes(value):
+    """Split a comma separated language filter such as "en,Cantonese" into codes."""
+    return [code.strip().lower() for code in (value or '').split(',') if code.strip()]
+
 class Category(models.Model):
     name = models.CharField(max_length=200)
 
@@ -17,6 +32,10 @@ class Category(models.Model):
         ordering = ['name']
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
+        indexes = [
+            # the outer loop of the doctor list sorted by category name
+            models.Index(fields=['name'], name='category_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -28,10 +47,25 @@ class District(models.Model):
         ordering = ['name']
         verbose_name = 'District'
         verbose_name_plural = 'Districts'
+        indexes = [
+            # the outer loop of the doctor list sorted by district name
+            models.Index(fields=['name'], name='district_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+# the fields content_hash is computed from
+CONTENT_HASH_FIELDS = frozenset(['name', 'address', 'district', 'district_id'])
+
+class DoctorQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # no save() is called, hash the doctors here
+        objs = list(objs)
+        for doctor in objs:
+            doctor.update_content_hash()
+        return super().bulk_create(objs, *args, **kwargs)
+
 # Create your models here.
 class Doctor(models.Model):
     name = models.CharField(max_length=50)
@@ -39,12 +73,29 @@ class Doctor(models.Model):
     contact_details = models.CharField(max_length=255) # phone, email, etc. multi-valued. should be reconstructed if needed for analysis.
     category = models.ForeignKey(Category, on_delete=models.PROTECT)
     district = models.ForeignKey(District, on_delete=models.PROTECT)
-    language = models.CharField(max_length=10, choices=DoctorLanguage) # should be reconstructed if needed for analysis.
+    language = models.CharField(max_length=10, choices=DoctorLanguage) # primary language, all spoken languages are in SpokenLanguage.
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    # integer shadow of consultation_fee computed by the database, used for indexed range lookups
+    consultation_fee_cents = models.GeneratedField(
+        expression=Cast(Round(F('consultation_fee') * 100), models.BigIntegerField()),
+        output_field=models.BigIntegerField(),
+        db_persist=True,
+    )
     is_active = models.BooleanField(default=True) # 1 for active, 0 for inactive
+    # duplicate detection, see duplicates.content_hash; unique among the active doctors
+    content_hash = models.CharField(max_length=64, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DoctorQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        doctor = super().from_db(db, field_names, values)
+        # the primary language as stored, see signals.add_primary_language
+        doctor.stored_language = doctor.__dict__.get('language')
+        return doctor
+
     def category_name(self):
         return self.category.name
 
@@ -57,13 +108,38 @@ class Doctor(models.Model):
     def __str__(self):
         return self.name
 
+    def update_content_hash(self):
+        self.content_hash = content_hash(self.name, self.address, self.district_id)
+
+    def clean(self):
+        # model forms leave out content_hash, so unique_active_doctor is not
+        # validated for them and a duplicate would fail at the INSERT
+        super().clean()
+        if self.district_id is None or not self.is_active:
+            return
+        self.update_content_hash()
+        duplicate = (
+            Doctor.objects.filter(is_active=True, content_hash=self.content_hash)
+            .exclude(pk=self.pk).values_list('pk', flat=True).first()
+        )
+        if duplicate is not None:
+            raise ValidationError(
+                _("Duplicate of doctor %(id)d, with the same name and address in this district.") % {'id': duplicate}
+            )
+
+    def save(self, *args, update_fields=None, **kwargs):
+        self.update_content_hash()
+        if update_fields is not None and not CONTENT_HASH_FIELDS.isdisjoint(update_fields):
+            update_fields = {*update_fields, 'content_hash'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+
     def delete(self, *args, **kwargs):
         self.is_active = False
-        self.save()
+        self.save(update_fields=['is_active', 'updated_at'])
 
     def restore(self, *args, **kwargs):
         self.is_active = True
-        self.save()
+        self.save(update_fields=['is_active', 'updated_at'])
 
     def queryset(self):
         return self.objects.filter(is_active=True)
@@ -72,3 +148,82 @@ class Doctor(models.Model):
         ordering = ['name']
         verbose_name = 'Doctor'
         verbose_name_plural = 'Doctors'
+        indexes = [
+            # list order, the active doctors are walked in it, the few
+            # soft-deleted ones have their own partial index
+            models.Index(fields=['name'], name='doctor_name_idx'),
+            models.Index(fields=['name'], condition=Q(is_active=False), name='doctor_inactive_name_idx'),
+            # the other list orderings, see ordering.ORDERINGS; the fee one
+            # also serves the fee range filters and statistics
+            models.Index(fields=['consultation_fee_cents'], condition=Q(is_active=True), name='doctor_active_fee_idx'),
+            models.Index(fields=['updated_at'], condition=Q(is_active=True), name='doctor_active_updated_idx'),
+        ]
+        constraints = [
+            # soft-deleted listings may be submitted again
+            models.UniqueConstraint(fields=['content_hash'], condition=Q(is_active=True), name='unique_active_doctor'),
+        ]
+
+class DoctorContactManager(models.Manager):
+    def create_for(self, doctors):
+        """Insert the parsed contact_details of newly created doctors in one query."""
+        return self.bulk_create(
+            DoctorContact(doctor_id=doctor.pk, type=type, value=value)
+            for doctor in doctors
+            for type, value in parse_contact_details(doctor.contact_details)
+        )
+
+    def replace_for(self, doctors):
+        """Rebuild the contacts of existing doctors from their contact_details."""
+        doctors = list(doctors)
+        self.filter(doctor__in=[doctor.pk for doctor in doctors]).delete()
+        return self.create_for(doctors)
+
+class DoctorContact(models.Model):
+    """Normalized, individually indexed value of Doctor.contact_details."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='contacts')
+    type = models.CharField(max_length=10, choices=ContactType)
+    value = models.CharField(max_length=255)
+
+    objects = DoctorContactManager()
+
+    def __str__(self):
+        return self.value
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Doctor Contact'
+        verbose_name_plural = 'Doctor Contacts'
+        indexes = [
+            models.Index(fields=['value', 'doctor'], name='doctor_contact_value_idx'),
+        ]
+
+class SpokenLanguage(models.Model):
+    """A language spoken by a doctor. Always includes the doctor's primary language."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='spoken_languages')
+    language = models.CharField(max_length=10, choices=DoctorLanguage)
+
+    def __str__(self):
+        return self.language
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Spoken Language'
+        verbose_name_plural = 'Spoken Languages'
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'language'], name='unique_doctor_language'),
+        ]
+        indexes = [
+            models.Index(fields=['language', 'doctor'], name='spoken_language_idx'),
+        ]
+
+class DeactivatedDuplicate(models.Model):
+    """
+    A doctor soft deleted by migration 0006 as a later copy of an active
+    listing, kept so that reversing the migration restores it.
+    """
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    duplicate_of = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        verbose_name = 'Deactivated Duplicate'
+        verbose_name_plural = 'Deactivated Duplicates'
@@ -0,0 +1,96 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timezone
+import binascii
+import json
+from django.db.models import FilteredRelation, Q
+
+# the doctor list orderings, "ordering=" value: the columns sorted on. Each
+# one is walked in an index and ends with unique columns, so that a page can
+# start right after the last row of the previous one (keyset pagination).
+# The names are sorted through unfiltered relations, which keep the joined
+# district or category id in the ORDER BY: the outer loop then walks
+# district_name_idx or category_name_idx and the doctors of each district
+# come out of the foreign key index in id order.
+ORDERINGS = {
+    'name': ['name', 'pk'],
+    'consultation_fee': ['consultation_fee_cents', 'pk'],
+    'updated_at': ['updated_at', 'pk'],
+    'district_name': ['sort_district__name', 'sort_district__id', 'pk'],
+    'category_name': ['sort_category__name', 'sort_category__id', 'pk'],
+}
+
+# the type of each column's value in a cursor
+CURSOR_TYPES = {
+    'name': str,
+    'pk': int,
+    'consultation_fee_cents': int,
+    'updated_at': datetime,
+    'sort_district__name': str,
+    'sort_district__id': int,
+    'sort_category__name': str,
+    'sort_category__id': int,
+}
+
+# SQLite integers are signed 64 bit, larger ones overflow in the query
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+
+# the relations the orderings above sort through
+SORT_RELATIONS = {'sort_district': 'district', 'sort_category': 'category'}
+
+def order_doctors(queryset, ordering):
+    """Sort the doctors by one of ORDERINGS, descending when it starts with "-"."""
+    descending = ordering.startswith('-')
+    columns = ORDERINGS[ordering.lstrip('-')]
+    relations = {column.split('__')[0] for column in columns} & SORT_RELATIONS.keys()
+    if relations:
+        queryset = queryset.annotate(**{alias: FilteredRelation(SORT_RELATIONS[alias]) for alias in relations})
+    return queryset.order_by(*(('-' if descending else '') + column for column in columns))
+
+def after_row(ordering, values):
+    """The doctors after the row with ``values`` of the ordering's columns, in its order."""
+    lookup = 'lt' if ordering.startswith('-') else 'gt'
+    columns = ORDERINGS[ordering.lstrip('-')]
+    after = Q(**{f'{columns[-1]}__{lookup}': values[-1]})
+    for column, value in reversed(list(zip(columns[:-1], values[:-1]))):
+        after = Q(**{f'{column}__{lookup}': value}) | Q(**{column: value}) & after
+    # the leading range on the first column is what the index seeks to
+    return Q(**{f'{columns[0]}__{lookup}e': values[0]}) & after
+
+def encode_cursor(ordering, row):
+    """The cursor of the page after ``row``, the values of the ordering's columns."""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in row]
+    text = json.dumps({'ordering': ordering, 'values': values}, separators=(',', ':'), ensure_ascii=False)
+    return urlsafe_b64encode(text.encode()).decode().rstrip('=')
+
+def cursor_value(column, value):
+    """The value of ``column`` in a cursor as the query takes it, raise ValueError when it has the wrong type."""
+    kind = CURSOR_TYPES[column]
+    if kind is int and type(value) is int and value in INTEGER_RANGE:
+        return value
+    if kind is str and isinstance(value, str):
+        return value
+    if kind is datetime and isinstance(value, str):
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            try:
+                return parsed.astimezone(timezone.utc)
+            except OverflowError:
+                pass
+    raise ValueError(value)
+
+def decode_cursor(cursor):
+    """
+    Return the ``(ordering, values)`` of a cursor, with the values converted
+    for the ordering's columns. Raise ValueError when it is malformed.
+    """
+    try:
+        data = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        ordering, values = data['ordering'], data['values']
+    except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, ValueError):
+        raise ValueError(cursor)
+    if not isinstance(ordering, str) or ordering.lstrip('-') not in ORDERINGS or not isinstance(values, list):
+        raise ValueError(cursor)
+    columns = ORDERINGS[ordering.lstrip('-')]
+    if len(values) != len(columns):
+        raise ValueError(cursor)
+    return ordering, [cursor_value(column, value) for column, value in zip(columns, values)]
@@ -0,0 +1,67 @@
+import threading
+import time
+from doctors.db_routers import use_primary
+from rest_framework.renderers import JSONRenderer
+from doctors.compression import Precompressed
+from .models import Category, District
+from .serializers import CategorySerializer, DistrictSerializer
+from .signals import is_current, reference_version
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ReferenceData:
+    """
+    Serialized categories and districts, in name order, as of one reference
+    version. ``bodies`` holds their rendered and precompressed JSON lists,
+    ``names`` their names by id.
+    """
+    __slots__ = ('version', 'loaded_at', 'categories', 'districts', 'bodies', 'names')
+
+    def __init__(self, version, categories, districts):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.categories = categories
+        self.districts = districts
+        renderer = JSONRenderer()
+        self.bodies = {
+            'categories': Precompressed(renderer.render(categories)),
+            'districts': Precompressed(renderer.render(districts)),
+        }
+        self.names = {
+            'categories': {item['id']: item['name'] for item in categories},
+            'districts': {item['id']: item['name'] for item in districts},
+        }
+
+def load_reference_data(version):
+    # from the primary, a lagging replica would be labelled with the new version
+    with use_primary():
+        data = ReferenceData(
+            version,
+            CategorySerializer(Category.objects.all(), many=True).data,
+            DistrictSerializer(District.objects.all(), many=True).data,
+        )
+    logger.debug(
+        "Loaded reference data v%s: %d categories, %d districts",
+        version, len(data.categories), len(data.districts)
+    )
+    return data
+
+_lock = threading.Lock()
+_snapshot = None
+
+def get_reference_data():
+    """Return this worker's reference data, reloading it when a category or district changed or it expired."""
+    global _snapshot
+    version = reference_version()
+    snapshot = _snapshot
+    if is_current(snapshot, version):
+        return snapshot
+    with _lock:
+        if not is_current(_snapshot, version):
+            _snapshot = load_reference_data(version)
+        return _snapshot
+
+def invalidate():
+    global _snapshot
+    _snapshot = None
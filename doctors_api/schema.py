@@ -0,0 +1,230 @@
+import re
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpRequest
+from django_filters import ChoiceFilter, NumberFilter
+from rest_framework.fields import ListField
+from rest_framework.request import Request
+from rest_framework.schemas import openapi
+from rest_framework.schemas.utils import get_pk_description
+
+TITLE = "Doctor List API"
+DESCRIPTION = "Doctors, their categories and districts, in English and Chinese."
+
+PATH_VARIABLES = re.compile(r'{(\w+)}')
+
+def filter_schema(filter):
+    if isinstance(filter, ChoiceFilter):
+        return {'type': 'string', 'enum': [value for value, _ in filter.extra['choices']]}
+    if isinstance(filter, NumberFilter):
+        return {'type': 'number'}
+    return {'type': 'string'}
+
+# request and response bodies of the actions that do not take or return
+# their serializer, functions of the reference to the serializer's schema
+
+def doctor_list_schema(doctor):
+    """A list of doctors, or with ``page_size`` / ``cursor`` a keyset page of them."""
+    return {'oneOf': [
+        {'type': 'array', 'items': doctor},
+        {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'format': 'uri', 'nullable': True},
+                'results': {'type': 'array', 'items': doctor},
+            },
+        },
+    ]}
+
+def fee_stats_schema(doctor):
+    fee = {'type': 'string', 'format': 'decimal', 'nullable': True}
+    return {
+        'type': 'object',
+        'properties': {
+            'count': {'type': 'integer'},
+            'min': fee,
+            'max': fee,
+            'percentiles': {'type': 'object', 'additionalProperties': fee},
+            'histogram': {'type': 'array', 'items': {
+                'type': 'object',
+                'properties': {'min': fee, 'max': fee, 'count': {'type': 'integer'}},
+            }},
+        },
+    }
+
+def autocomplete_schema(doctor):
+    return {'type': 'array', 'items': {
+        'type': 'object',
+        'properties': {'id': {'type': 'integer'}, 'name': {'type': 'string'}},
+    }}
+
+def batch_get_request_schema(doctor):
+    return {
+        'type': 'object',
+        'properties': {'ids': {'type': 'array', 'items': {'type': 'integer', 'minimum': 1}}},
+        'required': ['ids'],
+    }
+
+def batch_get_schema(doctor):
+    ids = {'type': 'array', 'items': {'type': 'integer'}}
+    return {
+        'type': 'object',
+        'properties': {'results': {'type': 'array', 'items': doctor}, 'missing': ids, 'inactive': ids},
+    }
+
+def bulk_create_request_schema(doctor):
+    return {'type': 'array', 'items': doctor}
+
+def bulk_create_schema(doctor):
+    """The created doctors, or with ``on_duplicate=skip|merge`` what happened to each submission."""
+    doctors = {'type': 'array', 'items': doctor}
+    return {'oneOf': [
+        doctors,
+        {
+            'type': 'object',
+            'properties': {
+                'created': doctors,
+                'merged': doctors,
+                'duplicates': {'type': 'array', 'items': {
+                    'type': 'object',
+                    'properties': {'index': {'type': 'integer'}, 'doctor': {'type': 'integer'}},
+                }},
+            },
+        },
+    ]}
+
+class SchemaGenerator(openapi.SchemaGenerator):
+    """
+    OpenAPI schema of the API, generated from the views (``GET /schema/``, or
+    ``make openapi`` for the ``openapi.json`` kept in the repository).
+    """
+    def __init__(self, title=None, description=None, **kwargs):
+        # generateschema passes None unless --title and --description are given
+        super().__init__(title=title or TITLE, description=description or DESCRIPTION, **kwargs)
+
+    def create_view(self, callback, method, request=None):
+        if request is None:
+            # the views read their query parameters while they are inspected
+            request = Request(HttpRequest())
+        return super().create_view(callback, method, request)
+
+class AutoSchema(openapi.AutoSchema):
+    """
+    On top of DRF's, documents the DoctorFilter parameters, the query
+    parameters a view validates with its own serializers, the responses of
+    the actions that do not return their serializer, and example requests,
+    which ``manage.py check_budgets`` replays against the performance budgets.
+
+    ``query_serializers`` maps actions, or ``(action, method)`` pairs, to the
+    serializers of their query parameters, and ``filtered_actions`` lists the
+    actions that apply the filters, beyond DRF's list and detail actions.
+    ``requests`` and ``responses`` map actions to the schema of their request
+    and response body, as functions of the reference to the view serializer's
+    schema. ``examples`` maps actions, or ``(action, method)`` pairs, to
+    named example requests, ``{"name": {"parameter": value}}``.
+    """
+
+    def __init__(self, query_serializers=None, filtered_actions=(), requests=None, responses=None, examples=None, **kwargs):
+        super().__init__(**kwargs)
+        self.query_serializers = query_serializers or {}
+        self.filtered_actions = filtered_actions
+        self.requests = requests or {}
+        self.responses = responses or {}
+        self.examples = examples or {}
+
+    @property
+    def action(self):
+        return getattr(self.view, 'action', None)
+
+    def get_operation(self, path, method):
+        operation = super().get_operation(path, method)
+        parameters = {}
+        for parameter in operation['parameters'] + self.get_query_parameters(path, method):
+            # a filter and a query serializer may both read the same parameter
+            parameters.setdefault(parameter['name'], parameter)
+        examples = self.examples.get((self.action, method), self.examples.get(self.action, {}))
+        for example, values in examples.items():
+            for name, value in values.items():
+                if name not in parameters:
+                    raise ImproperlyConfigured(f"Example {example!r} of {path} uses the undocumented parameter {name!r}.")
+                parameters[name].setdefault('examples', {})[example] = {'value': value}
+        operation['parameters'] = list(parameters.values())
+        return operation
+
+    def get_operation_id(self, path, method):
+        operation_id = super().get_operation_id(path, method)
+        mapping = getattr(getattr(self.view, self.action or '', None), 'mapping', {})
+        if len(mapping) > 1 and method != 'GET':
+            # an extra action answering several methods, e.g. postBatchGetDoctor
+            return method.lower() + operation_id[0].upper() + operation_id[1:]
+        return operation_id
+
+    def get_operation_id_base(self, path, method, action):
+        model = getattr(getattr(self.view, 'queryset', None), 'model', None)
+        if action == 'list' and self.operation_id_base is None and model is not None:
+            # DRF pluralizes the model name with inflection, the models know their plural
+            return str(model._meta.verbose_name_plural).replace(' ', '')
+        return super().get_operation_id_base(path, method, action)
+
+    def get_path_parameters(self, path, method):
+        # DRF's reads them with uritemplate, which the API does not need otherwise
+        model = getattr(getattr(self.view, 'queryset', None), 'model', None)
+        parameters = []
+        for variable in PATH_VARIABLES.findall(path):
+            primary_key = model is not None and variable in ('id', 'pk')
+            parameters.append({
+                'name': variable,
+                'in': 'path',
+                'required': True,
+                'description': get_pk_description(model, model._meta.pk) if primary_key else '',
+                'schema': {'type': 'integer' if primary_key else 'string'},
+            })
+        return parameters
+
+    def get_filter_parameters(self, path, method):
+        if not self.allows_filters(path, method):
+            return []
+        parameters = []
+        for filter_backend in self.view.filter_backends:
+            if hasattr(filter_backend, 'get_schema_operation_parameters'):
+                parameters += filter_backend().get_schema_operation_parameters(self.view)
+        filterset_class = getattr(self.view, 'filterset_class', None)
+        if filterset_class is not None:
+            # django-filter no longer describes its filters to DRF
+            parameters += [
+                {'name': name, 'required': False, 'in': 'query', 'description': '', 'schema': filter_schema(filter)}
+                for name, filter in filterset_class.base_filters.items()
+            ]
+        return parameters
+
+    def allows_filters(self, path, method):
+        return super().allows_filters(path, method) or self.action in self.filtered_actions
+
+    def get_query_parameters(self, path, method):
+        parameters = []
+        serializer_classes = self.query_serializers.get((self.action, method), self.query_serializers.get(self.action, ()))
+        for serializer_class in serializer_classes:
+            for field in serializer_class().fields.values():
+                schema = self.map_field(field)
+                parameter = {'name': field.field_name, 'required': field.required, 'in': 'query', 'description': '', 'schema': schema}
+                if isinstance(field, ListField):
+                    # comma separated, e.g. ?fields=id,name
+                    parameter.update(style='form', explode=False)
+                parameters.append(parameter)
+        return parameters
+
+    def get_request_body(self, path, method):
+        if method not in ('PUT', 'PATCH', 'POST') or self.action not in self.requests:
+            return super().get_request_body(path, method)
+        self.request_media_types = self.map_parsers(path, method)
+        schema = self.requests[self.action](self.get_reference(self.get_request_serializer(path, method)))
+        return {'content': {media_type: {'schema': schema} for media_type in self.request_media_types}}
+
+    def get_responses(self, path, method):
+        responses = super().get_responses(path, method)
+        if self.action not in self.responses:
+            return responses
+        schema = self.responses[self.action](self.get_reference(self.get_response_serializer(path, method)))
+        for response in responses.values():
+            for content in response['content'].values():
+                content['schema'] = schema
+        return responses
@@ -1,13 +1,140 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext as _
 from rest_framework import serializers
-from .models import Doctor, District, Category
+from rest_framework.settings import api_settings
+from .models import Doctor, DoctorContact, District, Category, SpokenLanguage, DoctorLanguage
+from .duplicates import POLICIES, content_hash, find_duplicates
+from .ordering import ORDERINGS, decode_cursor
+from .signals import bump_directory_version
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SpokenLanguagesField(serializers.ListField):
+    child = serializers.ChoiceField(choices=DoctorLanguage)
+
+    def get_attribute(self, instance):
+        # iterate .all() so that prefetch_related('spoken_languages') is used
+        return [spoken.language for spoken in instance.spoken_languages.all()]
+
+def duplicate_message(duplicate):
+    kind, target = duplicate
+    if kind == 'doctor':
+        return _("Duplicate of doctor %(id)d, with the same name and address in this district.") % {'id': target}
+    return _("Duplicate of item %(index)d, with the same name and address in this district.") % {'index': target}
+
+class DoctorListSerializer(serializers.ListSerializer):
+    """
+    Creates many doctors with one INSERT, plus one for their languages and
+    one for their contacts. Submissions with the content hash of an active
+    doctor, or of an earlier submission, are handled by the ``on_duplicate``
+    policy of the context: "reject" fails the whole request, "skip" leaves
+    them out and "merge" updates the doctor they duplicate.
+
+    After save(), ``merged`` holds the updated doctors and ``duplicates``
+    maps the position of every duplicate to the id of its doctor.
+    """
+    # the fields a merged submission overwrites, the name, address and district are the same
+    merge_fields = ['contact_details', 'category', 'language', 'consultation_fee']
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        hashes = [content_hash(item['name'], item['address'], item['district'].pk) for item in items]
+        # one query for the whole batch
+        existing = dict(
+            Doctor.objects.filter(is_active=True, content_hash__in=set(hashes)).order_by().values_list('content_hash', 'pk')
+        )
+        self.found_duplicates = find_duplicates(hashes, existing)
+        if self.found_duplicates and self.context.get('on_duplicate', 'reject') == 'reject':
+            raise serializers.ValidationError([
+                {api_settings.NON_FIELD_ERRORS_KEY: [duplicate_message(self.found_duplicates[position])]}
+                if position in self.found_duplicates else {}
+                for position in range(len(items))
+            ])
+        return items
+
+    @transaction.atomic
+    def create(self, validated_data):
+        policy = self.context.get('on_duplicate', 'reject')
+        items = [dict(item) for item in validated_data]
+        languages = [item.pop('languages', []) for item in items]
+        merged = {}
+        for position, (kind, target) in self.found_duplicates.items():
+            if policy != 'merge':
+                continue
+            if kind == 'item':
+                # later submissions of the same doctor win
+                items[target].update({name: items[position][name] for name in self.merge_fields})
+                languages[target] = languages[target] + languages[position]
+            else:
+                merged.setdefault(target, []).append(position)
+
+        new = [position for position in range(len(items)) if position not in self.found_duplicates]
+        created = Doctor.objects.bulk_create(Doctor(**items[position]) for position in new)
+        doctors = dict(zip(new, created))
+        self.merged = self.merge(merged, items, languages) if merged else []
+
+        SpokenLanguage.objects.bulk_create(
+            [
+                SpokenLanguage(doctor=doctor, language=language)
+                for position, doctor in doctors.items()
+                for language in dict.fromkeys([doctor.language, *languages[position]])
+            ],
+            ignore_conflicts=True,
+        )
+        DoctorContact.objects.create_for(created)
+        # bulk_create() sends no post_save, let the per-worker snapshots patch these doctors
+        pks = [doctor.pk for doctor in [*created, *self.merged]]
+        transaction.on_commit(lambda: bump_directory_version(pks))
+
+        self.duplicates = {
+            position: doctors[target].pk if kind == 'item' else target
+            for position, (kind, target) in self.found_duplicates.items()
+        }
+        return created
+
+    def merge(self, merged, items, languages):
+        """Overwrite the existing doctors with the submissions duplicating them."""
+        doctors = Doctor.objects.in_bulk(list(merged))
+        now = timezone.now()
+        for pk, positions in merged.items():
+            doctor = doctors[pk]
+            for position in positions:
+                for name in self.merge_fields:
+                    setattr(doctor, name, items[position][name])
+            doctor.updated_at = now
+        Doctor.objects.bulk_update(doctors.values(), [*self.merge_fields, 'updated_at'])
+        # a replaced primary language goes, unless a submission lists it;
+        # the other spoken languages are added to, never replaced
+        replaced = Q()
+        for pk, positions in merged.items():
+            doctor = doctors[pk]
+            listed = {language for position in positions for language in languages[position]}
+            if doctor.stored_language not in (None, doctor.language, *listed):
+                replaced |= Q(doctor_id=pk, language=doctor.stored_language)
+        if replaced:
+            SpokenLanguage.objects.filter(replaced).delete()
+        SpokenLanguage.objects.bulk_create(
+            [
+                SpokenLanguage(doctor_id=pk, language=language)
+                for pk, positions in merged.items()
+                for language in dict.fromkeys([doctors[pk].language, *(
+                    language for position in positions for language in languages[position]
+                )])
+            ],
+            ignore_conflicts=True,
+        )
+        DoctorContact.objects.replace_for(doctors.values())
+        return list(doctors.values())
+
 class DoctorSerializer(serializers.ModelSerializer):
     category_name = serializers.SerializerMethodField()
     district_name = serializers.SerializerMethodField()
     language_name = serializers.SerializerMethodField()
+    languages = SpokenLanguagesField(required=False)
     
     category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all())
     district = serializers.PrimaryKeyRelatedField(queryset=District.objects.all())
@@ -25,9 +152,42 @@ class DoctorSerializer(serializers.ModelSerializer):
             'district_name', 
             'consultation_fee', 
             'language',
-            'language_name'
+            'language_name',
+            'languages'
             ]
         read_only_fields = ['id']
+        list_serializer_class = DoctorListSerializer
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            # sparse fieldset, e.g. ?fields=id,name,district
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    def validate(self, attrs):
+        if isinstance(self.parent, DoctorListSerializer):
+            # checked for the whole batch at once
+            return attrs
+        duplicates = Doctor.objects.filter(
+            is_active=True, content_hash=content_hash(attrs['name'], attrs['address'], attrs['district'].pk)
+        )
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        duplicate = duplicates.values_list('pk', flat=True).first()
+        if duplicate is not None:
+            raise serializers.ValidationError(duplicate_message(('doctor', duplicate)))
+        return attrs
+
+    def create(self, validated_data):
+        languages = validated_data.pop('languages', [])
+        doctor = super().create(validated_data)
+        # the primary language is added by the post_save signal
+        SpokenLanguage.objects.bulk_create(
+            [SpokenLanguage(doctor=doctor, language=language) for language in languages],
+            ignore_conflicts=True,
+        )
+        return doctor
         
     def get_category_name(self, obj):
         return obj.category.name
@@ -38,6 +198,68 @@ class DoctorSerializer(serializers.ModelSerializer):
     def get_language_name(self, obj):
         return obj.language_name()
 
+class FeeStatsQuerySerializer(serializers.Serializer):
+    bins = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+class AutocompleteQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+class SparseFieldsQuerySerializer(serializers.Serializer):
+    fields = serializers.ListField(child=serializers.ChoiceField(choices=DoctorSerializer.Meta.fields), required=False)
+    omit = serializers.ListField(child=serializers.ChoiceField(choices=DoctorSerializer.Meta.fields), required=False)
+
+    def to_internal_value(self, data):
+        # comma separated query parameters, e.g. ?fields=id,name
+        return super().to_internal_value({
+            name: [part.strip() for part in data[name].split(',') if part.strip()]
+            for name in ('fields', 'omit') if name in data
+        })
+
+    def validate(self, attrs):
+        fields = attrs.get('fields') or DoctorSerializer.Meta.fields
+        omit = attrs.get('omit', [])
+        attrs['selected'] = [name for name in DoctorSerializer.Meta.fields if name in fields and name not in omit]
+        return attrs
+
+class BulkCreateQuerySerializer(serializers.Serializer):
+    on_duplicate = serializers.ChoiceField(choices=POLICIES, default='reject')
+
+class ListLayoutQuerySerializer(serializers.Serializer):
+    layout = serializers.ChoiceField(choices=['rows', 'dictionary', 'columnar'], default='rows')
+
+class ListPageQuerySerializer(serializers.Serializer):
+    page_size = serializers.IntegerField(min_value=1, max_value=1000, default=50)
+    cursor = serializers.CharField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=[value for name in ORDERINGS for value in (name, '-' + name)], default='name',
+    )
+
+    def validate(self, attrs):
+        if 'cursor' in attrs:
+            try:
+                ordering, attrs['cursor'] = decode_cursor(attrs['cursor'])
+            except ValueError:
+                raise serializers.ValidationError({'cursor': [_("Invalid cursor.")]})
+            if ordering != attrs['ordering']:
+                raise serializers.ValidationError({'cursor': [_("The cursor belongs to another ordering.")]})
+        return attrs
+
+class BatchGetSerializer(serializers.Serializer):
+    def get_fields(self):
+        # built per request so that the cap follows the settings
+        return {
+            'ids': serializers.ListField(
+                child=serializers.IntegerField(min_value=1),
+                allow_empty=False,
+                max_length=settings.DOCTOR_BATCH_GET_MAX_IDS,
+            )
+        }
+
+    def validate_ids(self, value):
+        # keep the requested order, once per id
+        return list(dict.fromkeys(value))
+
 class DistrictSerializer(serializers.ModelSerializer):
     class Meta:
         model = District
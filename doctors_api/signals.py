@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Doctor, DoctorContact, SpokenLanguage, Category, District
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Shared across workers whenever CACHES['default'] points at a shared backend.
+# Per-worker snapshots compare against them to know when they are stale.
+DIRECTORY_VERSION_KEY = 'doctors_api:directory_version'
+REFERENCE_VERSION_KEY = 'doctors_api:reference_version'
+
+def versions_shared():
+    """Whether the versions are kept in a cache every worker reads, rather than in this process."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+def snapshot_max_age():
+    """
+    Seconds a per-worker snapshot is served before it is reloaded whatever
+    the versions say, or None when they are shared. In a per-process cache
+    only this worker's own writes move the versions, the other workers'
+    are picked up when the snapshot expires.
+    """
+    return None if versions_shared() else settings.DOCTOR_SNAPSHOT_MAX_AGE
+
+def is_expired(snapshot):
+    """Whether a snapshot, loaded at ``snapshot.loaded_at`` (time.monotonic()), outlived snapshot_max_age()."""
+    max_age = snapshot_max_age()
+    return max_age is not None and time.monotonic() - snapshot.loaded_at >= max_age
+
+def is_current(snapshot, version):
+    """Whether ``snapshot`` may still be served at ``version``."""
+    return snapshot is not None and snapshot.version == version and not is_expired(snapshot)
+
+def get_version(key):
+    return cache.get(key, 0)
+
+def bump_version(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # evicted between add() and incr(), any new value invalidates the snapshots
+        cache.set(key, 1, timeout=None)
+        return 1
+
+# the ids of the doctors each directory version changed, so that the
+# snapshots can patch the rows that moved instead of reloading all of them
+CHANGES_TIMEOUT = 24 * 60 * 60
+MAX_CHANGED_VERSIONS = 100
+
+def changes_key(version):
+    return f'{DIRECTORY_VERSION_KEY}:{version}:changes'
+
+def directory_version():
+    return get_version(DIRECTORY_VERSION_KEY)
+
+def bump_directory_version(pks=None):
+    """Move the directory version, recording the ids of the changed doctors when they are known."""
+    version = bump_version(DIRECTORY_VERSION_KEY)
+    if pks is None:
+        # a record left from before the version was evicted and restarted
+        cache.delete(changes_key(version))
+    else:
+        cache.set(changes_key(version), list(pks), timeout=CHANGES_TIMEOUT)
+    return version
+
+def directory_changes(since, version):
+    """
+    The ids of the doctors changed after directory version ``since`` up to
+    ``version``, or None when some of those versions did not record theirs.
+    """
+    if not since < version <= since + MAX_CHANGED_VERSIONS:
+        return None
+    keys = [changes_key(number) for number in range(since + 1, version + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) < len(keys):
+        return None
+    return {pk for pks in changes.values() for pk in pks}
+
+def reference_version():
+    return get_version(REFERENCE_VERSION_KEY)
+
+def bump_reference_version():
+    return bump_version(REFERENCE_VERSION_KEY)
+
+@receiver([post_save, post_delete], sender=Doctor)
+def doctor_changed(sender, instance, **kwargs):
+    # bump after commit, otherwise another worker could rebuild from the
+    # pre-commit rows and label them with the new version
+    transaction.on_commit(lambda: bump_directory_version([instance.pk]))
+
+@receiver(post_save, sender=Doctor)
+def sync_contacts(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'contact_details' not in update_fields:
+        return
+    if created:
+        DoctorContact.objects.create_for([instance])
+    else:
+        DoctorContact.objects.replace_for([instance])
+
+@receiver(post_save, sender=Doctor)
+def add_primary_language(sender, instance, created, update_fields=None, **kwargs):
+    if not created and update_fields is not None and 'language' not in update_fields:
+        return
+    if getattr(instance, 'stored_language', None) == instance.language:
+        return
+    # the previous primary language is kept, a save does not say whether the
+    # doctor stopped speaking it; the admin's spoken language inline removes it
+    SpokenLanguage.objects.bulk_create(
+        [SpokenLanguage(doctor=instance, language=instance.language)],
+        ignore_conflicts=True,
+    )
+    instance.stored_language = instance.language
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=District)
+def reference_changed(sender, instance, **kwargs):
+    from .reference import invalidate
+    # this worker reloads right away, the others once the version moves;
+    # category and district names are embedded in every rendered doctor row
+    invalidate()
+    transaction.on_commit(bump_reference_version)
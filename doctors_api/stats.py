@@ -0,0 +1,47 @@
+from decimal import Decimal
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+def cents_to_fee(cents):
+    return str(Decimal(cents).scaleb(-2))
+
+def fee_statistics(cents, bins=10):
+    """
+    Summarise an ascending list of fees in cents for price sliders: the range,
+    nearest-rank percentiles and an equal-width histogram.
+    """
+    if not cents:
+        return {'count': 0, 'min': None, 'max': None, 'percentiles': {}, 'histogram': []}
+
+    count = len(cents)
+    low, high = cents[0], cents[-1]
+    percentiles = {
+        str(p): cents_to_fee(cents[max(0, -(-p * count // 100) - 1)])
+        for p in PERCENTILES
+    }
+
+    # ceiling division keeps the last bucket inclusive of the maximum fee
+    width = max(1, -(-(high - low + 1) // bins))
+    counts = [0] * bins
+    for value in cents:
+        counts[(value - low) // width] += 1
+    histogram = [
+        {
+            'min': cents_to_fee(low + i * width),
+            'max': cents_to_fee(min(high, low + (i + 1) * width - 1)),
+            'count': bucket,
+        }
+        for i, bucket in enumerate(counts)
+        if low + i * width <= high
+    ]
+
+    return {
+        'count': count,
+        'min': cents_to_fee(low),
+        'max': cents_to_fee(high),
+        'percentiles': percentiles,
+        'histogram': histogram,
+    }
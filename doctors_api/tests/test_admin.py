@@ -0,0 +1,149 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from doctors_api.admin import EstimatedCountPaginator
+from doctors_api.models import Doctor, Category, District, SpokenLanguage
+from doctors_api.signals import directory_version
+
+
+class DoctorAdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.url = reverse('admin:doctors_api_doctor_changelist')
+        category = Category.objects.create(name="Cardiologist")
+        district = District.objects.create(name="Central")
+        self.doctors = [
+            Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street, Central",
+                contact_details="Phone: +852 1234 5678",
+                category=category,
+                district=district,
+                language="en",
+                consultation_fee=Decimal("200.00")
+            )
+            for i in range(5)
+        ]
+
+    def test_changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Dr. 4")
+        doctor_queries = [query['sql'] for query in queries if 'FROM "doctors_api_doctor"' in query['sql']]
+        # the bounded count and one joined page, nothing per row
+        self.assertEqual(len(doctor_queries), 2)
+        self.assertIn('LIMIT 10001', doctor_queries[0])
+        self.assertIn('JOIN "doctors_api_category"', doctor_queries[1])
+
+    def test_filters(self):
+        Doctor.objects.filter(pk=self.doctors[0].pk).update(is_active=False)
+        self.doctors[1].spoken_languages.create(language='cantonese')
+        response = self.client.get(self.url, {'is_active__exact': '0'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.doctors[0]])
+        response = self.client.get(self.url, {'language': 'cantonese'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.doctors[1]])
+
+    def test_deactivate_and_restore(self):
+        choices = self.client.get(self.url).context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', [name for name, _ in choices])
+        ids = [str(doctor.pk) for doctor in self.doctors[:3]]
+        version = directory_version()
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'action': 'deactivate', '_selected_action': ids})
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 1)
+        self.assertEqual(Doctor.objects.filter(is_active=False).count(), 3)
+        self.assertEqual(directory_version(), version + 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'action': 'restore', '_selected_action': ids[:2]}, follow=True)
+        self.assertContains(response, "2 doctors were restored.")
+        self.assertEqual(Doctor.objects.filter(is_active=False).count(), 1)
+        self.assertEqual(Doctor.objects.count(), 5)
+
+    def test_duplicate_is_a_form_error(self):
+        doctor = self.doctors[1]
+        data = {
+            'name': " dr. 1", 'address': doctor.address, 'contact_details': "Phone: 1", 'category': doctor.category_id,
+            'district': doctor.district_id, 'language': "en", 'consultation_fee': "300.00", 'is_active': 'on',
+            **self.languages_form(),
+        }
+        response = self.client.post(reverse('admin:doctors_api_doctor_add'), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f"Duplicate of doctor {doctor.pk}")
+        response = self.client.post(reverse('admin:doctors_api_doctor_change', args=[self.doctors[2].pk]), data)
+        self.assertContains(response, f"Duplicate of doctor {doctor.pk}")
+        self.assertEqual(Doctor.objects.count(), 5)
+
+        # an inactive copy may be added, and the doctor itself saved unchanged
+        response = self.client.post(reverse('admin:doctors_api_doctor_add'), {**data, 'is_active': ''})
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(reverse('admin:doctors_api_doctor_change', args=[doctor.pk]), data)
+        self.assertEqual(response.status_code, 302)
+
+    def languages_form(self, rows=(), extra=()):
+        """The spoken language inline's POST data: ``rows`` are (SpokenLanguage, delete) pairs."""
+        data = {
+            'spoken_languages-TOTAL_FORMS': len(rows) + len(extra),
+            'spoken_languages-INITIAL_FORMS': len(rows),
+        }
+        for i, (spoken, delete) in enumerate(rows):
+            data.update({
+                f'spoken_languages-{i}-id': spoken.pk,
+                f'spoken_languages-{i}-doctor': spoken.doctor_id,
+                f'spoken_languages-{i}-language': spoken.language,
+                f'spoken_languages-{i}-DELETE': 'on' if delete else '',
+            })
+        for i, language in enumerate(extra, len(rows)):
+            data[f'spoken_languages-{i}-language'] = language
+        return data
+
+    def test_primary_language_change(self):
+        doctor = self.doctors[0]
+        data = {
+            'name': doctor.name, 'address': doctor.address, 'contact_details': doctor.contact_details,
+            'category': doctor.category_id, 'district': doctor.district_id, 'language': "mandarin",
+            'consultation_fee': "200.00", 'is_active': 'on',
+        }
+        url = reverse('admin:doctors_api_doctor_change', args=[doctor.pk])
+        english = doctor.spoken_languages.get()
+
+        # the previous primary language is kept, and the new one listed in the inline too
+        response = self.client.post(url, {**data, **self.languages_form([(english, False)], ["mandarin"])})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(doctor.spoken_languages.values_list('language', flat=True)), ["en", "mandarin"])
+
+        # until its row is deleted; the primary language stays even when deleted
+        rows = [(spoken, True) for spoken in doctor.spoken_languages.all()]
+        response = self.client.post(url, {**data, **self.languages_form(rows, ["cantonese"])})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(sorted(doctor.spoken_languages.values_list('language', flat=True)), ["cantonese", "mandarin"])
+        self.assertEqual(SpokenLanguage.objects.filter(language="en").count(), 4)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name="Cardiologist")
+        district = District.objects.create(name="Central")
+        Doctor.objects.bulk_create(
+            Doctor(name=f"Dr. {i}", address="Central", contact_details="", category=category,
+                   district=district, language="en", consultation_fee=Decimal("100"))
+            for i in range(30)
+        )
+        self.paginator_class = type('Paginator', (EstimatedCountPaginator,), {'exact_count_limit': 10})
+
+    def test_exact_below_limit(self):
+        self.assertEqual(self.paginator_class(Doctor.objects.filter(name__in=["Dr. 1", "Dr. 2"]), 5).count, 2)
+
+    def test_filtered_cut_at_limit(self):
+        self.assertEqual(self.paginator_class(Doctor.objects.filter(is_active=True), 5).count, 11)
+
+    def test_unfiltered_estimated(self):
+        # no statistics yet, the count stays bounded
+        self.assertEqual(self.paginator_class(Doctor.objects.all(), 5).count, 11)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        self.assertEqual(self.paginator_class(Doctor.objects.all(), 5).count, 30)
@@ -0,0 +1,113 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from unittest import mock
+from doctors_api.models import Doctor, Category, District
+from doctors_api import autocomplete
+from doctors_api.autocomplete import AutocompleteIndex, name_keys, normalize_name, get_autocomplete, invalidate
+
+
+class AutocompleteIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = AutocompleteIndex(0, [
+            (1, "Dr. John Smith"),
+            (2, "Dr. Joanna Lee"),
+            (3, "陳大文"),
+            (4, "Dr. José Álvarez"),
+        ])
+
+    def test_normalize(self):
+        self.assertEqual(normalize_name("  Dr.  JOSÉ  O'Brien-Smith "), "dr jose obrien smith")
+        self.assertEqual(normalize_name("ＡＢＣ"), "abc")
+
+    def test_keys(self):
+        self.assertEqual(name_keys("Dr. John Smith"), ["dr john smith", "john smith", "smith"])
+        self.assertEqual(name_keys("陳大文"), ["大文", "文", "陳大文"])
+
+    def test_word_prefixes(self):
+        self.assertEqual(self.index.search("jo"), [(2, "Dr. Joanna Lee"), (1, "Dr. John Smith"), (4, "Dr. José Álvarez")])
+        self.assertEqual(self.index.search("john s"), [(1, "Dr. John Smith")])
+        self.assertEqual(self.index.search("alv"), [(4, "Dr. José Álvarez")])
+        self.assertEqual(self.index.search("ohn"), [])
+
+    def test_cjk(self):
+        self.assertEqual(self.index.search("大文"), [(3, "陳大文")])
+        self.assertEqual(self.index.search("陳"), [(3, "陳大文")])
+
+    def test_limit_and_blank_query(self):
+        self.assertEqual(len(self.index.search("dr", limit=2)), 2)
+        self.assertEqual(self.index.search(" . "), [])
+
+    def test_update(self):
+        self.index.update(1, "Dr. Mary Chan")
+        self.assertEqual(self.index.search("smith"), [])
+        self.assertEqual(self.index.search("chan"), [(1, "Dr. Mary Chan")])
+        self.index.update(1, None)
+        self.assertEqual(self.index.search("mary"), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_patched_copy(self):
+        patched = self.index.patched(1, {1, 2, 5}, [(1, "Dr. Mary Chan"), (5, "Dr. Joe Wong")])
+        self.assertEqual(patched.version, 1)
+        self.assertEqual(patched.search("jo"), [(5, "Dr. Joe Wong"), (4, "Dr. José Álvarez")])
+        self.assertEqual(patched.search("chan"), [(1, "Dr. Mary Chan")])
+        # the published index is left as it was
+        self.assertEqual(self.index.version, 0)
+        self.assertEqual(self.index.search("jo"), [(2, "Dr. Joanna Lee"), (1, "Dr. John Smith"), (4, "Dr. José Álvarez")])
+
+
+class AutocompleteEndpointTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-autocomplete')
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.john = self.create("Dr. John Smith")
+        self.create("陳大文醫生")
+        invalidate()
+
+    def tearDown(self):
+        invalidate()
+
+    def create(self, name):
+        return Doctor.objects.create(
+            name=name,
+            address="123 Medical Street",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def test_matches(self):
+        response = self.client.get(self.url, {'q': 'smi'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'id': self.john.id, 'name': "Dr. John Smith"}])
+        response = self.client.get(self.url, {'q': '大文'})
+        self.assertEqual([doctor['name'] for doctor in response.data], ["陳大文醫生"])
+
+    def test_invalid_parameters(self):
+        for params in [{}, {'q': 'jo', 'limit': 0}, {'q': 'x' * 101}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_patched_on_save(self):
+        index = get_autocomplete()
+        with self.captureOnCommitCallbacks(execute=True):
+            mary = self.create("Dr. Mary Chan")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.john.delete()
+
+        # patched rather than rebuilt, the previous snapshot is left intact
+        with mock.patch.object(autocomplete, 'build_autocomplete') as build:
+            response = self.client.get(self.url, {'q': 'dr'})
+        build.assert_not_called()
+        self.assertEqual(response.data, [{'id': mary.id, 'name': "Dr. Mary Chan"}])
+        self.assertEqual(index.search('dr'), [(self.john.id, "Dr. John Smith")])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.john.restore()
+        self.assertEqual(len(self.client.get(self.url, {'q': 'dr'}).data), 2)
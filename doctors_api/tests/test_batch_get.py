@@ -0,0 +1,64 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+
+
+class BatchGetTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-batch-get')
+        category = Category.objects.create(name="Cardiologist")
+        district = District.objects.create(name="Central")
+        self.doctors = [
+            Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street",
+                contact_details="Phone: +852 1234 5678",
+                category=category,
+                district=district,
+                language="en",
+                consultation_fee=Decimal("200.00")
+            )
+            for i in range(3)
+        ]
+        self.inactive = self.doctors[2]
+        self.inactive.delete()
+        self.unknown = max(doctor.id for doctor in self.doctors) + 100
+
+    def test_get_keeps_requested_order(self):
+        first, second, _ = self.doctors
+        response = self.client.get(self.url, {'ids': f'{second.id}, {first.id},{second.id}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [second.id, first.id])
+        self.assertEqual(response.data['results'][0]['category_name'], "Cardiologist")
+        self.assertEqual(response.data['missing'], [])
+        self.assertEqual(response.data['inactive'], [])
+
+    def test_post_reports_missing_and_inactive(self):
+        ids = [self.unknown, self.doctors[0].id, self.inactive.id]
+        response = self.client.post(self.url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['id'] for doctor in response.data['results']], [self.doctors[0].id])
+        self.assertEqual(response.data['missing'], [self.unknown])
+        self.assertEqual(response.data['inactive'], [self.inactive.id])
+
+    def test_single_joined_query(self):
+        ids = ','.join(str(doctor.id) for doctor in self.doctors)
+        # the joined IN query and the prefetched spoken languages
+        with self.assertNumQueries(2):
+            self.client.get(self.url, {'ids': ids})
+
+    @override_settings(DOCTOR_BATCH_GET_MAX_IDS=2)
+    def test_cap(self):
+        response = self.client.post(self.url, {'ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ids', response.data)
+
+    def test_invalid_ids(self):
+        for ids in ['', 'abc', '0']:
+            response = self.client.get(self.url, {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, ids)
+            self.assertIn('ids', response.data)
@@ -0,0 +1,124 @@
+from io import StringIO
+from pathlib import Path
+import json
+import os
+import tempfile
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONOpenAPIRenderer
+from rest_framework.test import APIClient
+from rest_framework import status
+from doctors_api.management.commands.check_budgets import example_requests
+from doctors_api.schema import SchemaGenerator
+
+ROOT = Path(settings.BASE_DIR)
+SCHEMA_FILE = ROOT / 'openapi.json'
+FIXTURES = ROOT / 'doctors_api' / 'fixtures'
+UPDATE = os.environ.get('UPDATE_OPENAPI') == '1'
+
+ENDPOINTS = (
+    'doctor-list', 'doctor-detail', 'doctor-autocomplete', 'doctor-batch-get', 'doctor-fee-stats',
+    'district-list', 'district-detail', 'category-list', 'category-detail',
+)
+
+
+class SchemaTest(SimpleTestCase):
+    """
+    The schema is compared with openapi.json; after an intended change
+    re-record it with
+
+        UPDATE_OPENAPI=1 python manage.py test doctors_api.tests.test_budgets
+    """
+    def setUp(self):
+        self.schema = SchemaGenerator().get_schema(public=True)
+
+    def test_matches_openapi_json(self):
+        rendered = JSONOpenAPIRenderer().render(self.schema)
+        if UPDATE:
+            SCHEMA_FILE.write_bytes(rendered)
+        self.assertEqual(json.loads(rendered), json.loads(SCHEMA_FILE.read_text()), "re-record openapi.json, see SchemaTest")
+
+    def test_operation_ids_unique(self):
+        ids = [operation['operationId'] for operations in self.schema['paths'].values() for operation in operations.values()]
+        self.assertEqual(len(ids), len(set(ids)), ids)
+
+    def test_query_parameters(self):
+        parameters = {parameter['name']: parameter for parameter in self.schema['paths']['/doctor/']['get']['parameters']}
+        for name in ('search', 'category', 'min_consultation_fee', 'language', 'fields', 'layout', 'ordering', 'page_size', 'cursor'):
+            self.assertIn(name, parameters)
+        self.assertIn('-consultation_fee', parameters['ordering']['schema']['enum'])
+        self.assertEqual(parameters['fields']['explode'], False)
+        fee_stats = {parameter['name'] for parameter in self.schema['paths']['/doctor/fee_stats/']['get']['parameters']}
+        self.assertTrue({'bins', 'district', 'min_consultation_fee'} <= fee_stats)
+
+    def test_example_requests(self):
+        requests = example_requests(self.schema)
+        self.assertIn('/doctor/?page_size=50', requests)
+        self.assertIn('/doctor/1/', requests)
+        self.assertIn('/doctor/batch_get/?ids=1%2C2%2C3', requests)
+        # without examples, the bare path
+        self.assertIn('/district/', requests)
+        # only GET operations are replayed
+        self.assertNotIn('/doctor/bulk_create/', requests)
+
+
+class SchemaViewTest(SimpleTestCase):
+    def test_schema_endpoint(self):
+        response = APIClient().get(reverse('openapi-schema'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+        self.assertIn('/doctor/{id}/', json.loads(response.content)['paths'])
+
+
+class CheckBudgetsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # the examples use the ids of the repository fixtures
+        call_command(
+            'seed_directory', *(str(FIXTURES / name) for name in ('categories.json', 'districts.json', 'doctors.json')),
+            stdout=StringIO(),
+        )
+
+    def check_budgets(self, rows=9, **changes):
+        budgets = {
+            'rows': rows,
+            'samples': 2,
+            'endpoints': {endpoint: {'max_queries': 10, 'max_p95_ms': 10000, 'max_bytes': 100000} for endpoint in ENDPOINTS},
+        }
+        for endpoint, budget in changes.items():
+            if budget is None:
+                del budgets['endpoints'][endpoint.replace('_', '-')]
+            else:
+                budgets['endpoints'][endpoint.replace('_', '-')].update(budget)
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as file:
+            json.dump(budgets, file)
+            file.flush()
+            stdout = StringIO()
+            call_command('check_budgets', budgets=Path(file.name), stdout=stdout)
+            return stdout.getvalue()
+
+    def test_within_budget(self):
+        output = self.check_budgets()
+        self.assertIn("All 9 endpoints within budget at 9 doctors.", output)
+        self.assertIn("/doctor/?search=Cardio&page_size=50", output)
+
+    def test_repository_budgets(self):
+        budgets = json.loads((ROOT / 'budgets.json').read_text())
+        self.assertEqual(sorted(budgets['endpoints']), sorted(ENDPOINTS))
+
+    def test_exceeded_budget(self):
+        with self.assertRaisesMessage(CommandError, "doctor-detail /doctor/1/ max_queries"):
+            self.check_budgets(doctor_detail={'max_queries': 0})
+        with self.assertRaisesMessage(CommandError, "category-list /category/ max_bytes"):
+            self.check_budgets(category_list={'max_bytes': 10})
+
+    def test_missing_budget(self):
+        with self.assertRaisesMessage(CommandError, "doctor-fee-stats has no budget"):
+            self.check_budgets(doctor_fee_stats=None)
+
+    def test_too_few_rows(self):
+        with self.assertRaisesMessage(CommandError, "seed_directory --synthetic 93"):
+            self.check_budgets(rows=100)
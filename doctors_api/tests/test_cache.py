@@ -0,0 +1,128 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.cache import LRUCache, get_row_cache
+from doctors_api.index import invalidate
+import json
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_bytes=6)
+        lru.set_many({'a': b'11', 'b': b'22', 'c': b'33'})
+        lru.get_many(['a'])
+        lru.set_many({'d': b'44'})
+
+        self.assertEqual(lru.get_many(['a', 'b', 'c', 'd']), {'a': b'11', 'c': b'33', 'd': b'44'})
+        self.assertEqual(lru.size, 6)
+
+    def test_replacing_an_entry_keeps_size(self):
+        lru = LRUCache(max_bytes=10)
+        lru.set_many({'a': b'1234'})
+        lru.set_many({'a': b'12'})
+        self.assertEqual(lru.size, 2)
+        self.assertEqual(len(lru), 1)
+
+    def test_skips_values_larger_than_the_cap(self):
+        lru = LRUCache(max_bytes=3)
+        lru.set_many({'a': b'1234'})
+        self.assertEqual(len(lru), 0)
+
+
+@override_settings(DOCTOR_ROW_CACHE_ENABLED=True)
+class RowCacheListTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.doctor1 = Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+        self.doctor2 = Doctor.objects.create(
+            name="Dr. Jane Doe",
+            address="456 Health Avenue, Kowloon",
+            contact_details="Phone: +852 8765 4321",
+            category=self.category,
+            district=self.district,
+            language="cantonese",
+            consultation_fee=Decimal("300.00")
+        )
+        self.clear()
+
+    def tearDown(self):
+        self.clear()
+
+    def clear(self):
+        caches['doctor_rows'].clear()
+        get_row_cache().local.clear()
+        invalidate()
+
+    def test_same_payload_as_serializer(self):
+        for language in ['en', 'zh-hant']:
+            self.client.credentials(HTTP_ACCEPT_LANGUAGE=language)
+            for query in ['', '?language=cantonese', '?search=Cardio']:
+                url = reverse('doctor-list') + query
+                cached = self.client.get(url)
+                with self.settings(DOCTOR_ROW_CACHE_ENABLED=False):
+                    expected = self.client.get(url)
+                self.assertEqual(cached.status_code, status.HTTP_200_OK)
+                self.assertEqual(cached['Content-Type'], 'application/json')
+                self.assertEqual(cached.content, expected.content, (language, query))
+
+    def test_rows_are_rendered_once(self):
+        url = reverse('doctor-list')
+        self.client.get(url)
+        # only the (id, updated_at) lookup is left
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+    @override_settings(DOCTOR_INDEX_ENABLED=True)
+    def test_no_queries_with_index(self):
+        url = reverse('doctor-list') + f'?district={self.district.id}'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+    def test_languages_are_cached_separately(self):
+        url = reverse('doctor-list') + '?language=en'
+        self.client.credentials(HTTP_ACCEPT_LANGUAGE='en')
+        english = json.loads(self.client.get(url).content)
+        self.client.credentials(HTTP_ACCEPT_LANGUAGE='zh-hant')
+        chinese = json.loads(self.client.get(url).content)
+        self.assertEqual(english[0]['language_name'], "English")
+        self.assertNotEqual(chinese[0]['language_name'], "English")
+
+    def test_invalidated_by_changes(self):
+        url = reverse('doctor-list')
+        self.client.get(url)
+
+        self.doctor1.consultation_fee = Decimal("250.00")
+        self.doctor1.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Cardiology"
+            self.category.save()
+
+        rows = {row['id']: row for row in json.loads(self.client.get(url).content)}
+        self.assertEqual(Decimal(rows[self.doctor1.id]['consultation_fee']), Decimal("250.00"))
+        self.assertEqual(rows[self.doctor2.id]['category_name'], "Cardiology")
+
+    def test_invalid_filter_reports_errors(self):
+        response = self.client.get(reverse('doctor-list') + '?district=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_browsable_api_unaffected(self):
+        response = self.client.get(reverse('doctor-list'), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('text/html', response['Content-Type'])
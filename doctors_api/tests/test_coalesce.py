@@ -0,0 +1,133 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.coalesce import SingleFlight
+import json
+import threading
+import time
+
+
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = SingleFlight()
+        self.calls = 0
+
+    def tearDown(self):
+        cache.clear()
+
+    def compute(self):
+        self.calls += 1
+        time.sleep(0.05)
+        return b'result'
+
+    def test_concurrent_callers_share_one_computation(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.do('key', self.compute, ttl=5)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [b'result'] * 8)
+
+    def test_result_is_reused_until_expiry(self):
+        self.flight.do('key', self.compute, ttl=5)
+        self.flight.do('key', self.compute, ttl=5)
+        self.assertEqual(self.calls, 1)
+
+        cache.set('key', (time.time() - 1, b'stale'), timeout=30)
+        self.assertEqual(self.flight.do('key', self.compute, ttl=5), b'result')
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_copy_served_while_another_worker_refreshes(self):
+        cache.set('key', (time.time() - 1, b'stale'), timeout=30)
+        cache.add('key:lock', 1)
+        self.assertEqual(self.flight.do('key', self.compute, ttl=5, grace=30), b'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_waits_for_another_worker_without_a_stale_copy(self):
+        cache.add('key:lock', 1)
+        timer = threading.Timer(0.05, lambda: cache.set('key', (time.time() + 5, b'shared'), timeout=5))
+        timer.start()
+        self.assertEqual(self.flight.do('key', self.compute, ttl=5), b'shared')
+        timer.join()
+        self.assertEqual(self.calls, 0)
+
+    def test_errors_reach_every_waiter(self):
+        def fail():
+            time.sleep(0.05)
+            raise ValueError("boom")
+
+        errors = []
+
+        def call():
+            try:
+                self.flight.do('key', fail, ttl=5)
+            except ValueError as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(errors), 4)
+        self.assertIsNone(cache.get('key:lock'))
+
+
+@override_settings(DOCTOR_LIST_COALESCE_TTL=5)
+class CoalescedDoctorListTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.doctor = Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def tearDown(self):
+        cache.clear()
+
+    def test_identical_requests_share_the_response(self):
+        url = reverse('doctor-list')
+        first = self.client.get(url + f'?district={self.district.id}&language=en')
+        with self.assertNumQueries(0):
+            second = self.client.get(url + f'?language=en&district={self.district.id}&search=')
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(json.loads(second.content)[0]['name'], "Dr. John Smith")
+
+    def test_language_is_part_of_the_key(self):
+        url = reverse('doctor-list')
+        self.client.credentials(HTTP_ACCEPT_LANGUAGE='en')
+        english = json.loads(self.client.get(url).content)
+        self.client.credentials(HTTP_ACCEPT_LANGUAGE='zh-hant')
+        chinese = json.loads(self.client.get(url).content)
+        self.assertNotEqual(english[0]['language_name'], chinese[0]['language_name'])
+
+    def test_writes_start_a_new_key(self):
+        url = reverse('doctor-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        self.assertEqual(json.loads(self.client.get(url).content), [])
+
+    def test_invalid_filter_reports_errors(self):
+        response = self.client.get(reverse('doctor-list') + '?category=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,88 @@
+from unittest import mock
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from decimal import Decimal
+from doctors import compression
+from doctors.compression import negotiate
+from doctors_api.models import Doctor, Category, District
+from doctors_api import reference
+import gzip
+import json
+
+
+def not_called(content):
+    raise AssertionError("compressed per request")
+
+
+class NegotiationTest(SimpleTestCase):
+    def test_accept_encoding(self):
+        self.assertEqual(negotiate("gzip, deflate"), 'gzip')
+        self.assertEqual(negotiate("deflate, *;q=0.5"), 'gzip')
+        self.assertIsNone(negotiate("gzip;q=0, identity"))
+        self.assertIsNone(negotiate(""))
+        self.assertIsNone(negotiate("gzip;q=abc"))
+
+    @mock.patch.object(compression, 'PREFERENCE', ('br', 'gzip'))
+    def test_weights_and_preference(self):
+        self.assertEqual(negotiate("gzip, br"), 'br')
+        self.assertEqual(negotiate("gzip;q=1.0, br;q=0.8"), 'gzip')
+
+
+class CompressionMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        category = Category.objects.create(name="Cardiologist")
+        district = District.objects.create(name="Central")
+        for i in range(20):
+            Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street, Central",
+                contact_details="Phone: +852 1234 5678",
+                category=category,
+                district=district,
+                language="en",
+                consultation_fee=Decimal("200.00")
+            )
+        for i in range(60):
+            Category.objects.create(name=f"Specialty {i:02}")
+        reference.invalidate()
+        cache.clear()
+
+    def tearDown(self):
+        reference.invalidate()
+        cache.clear()
+
+    def test_gzip_negotiated(self):
+        plain = self.client.get(reverse('doctor-list'))
+        compressed = self.client.get(reverse('doctor-list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertEqual(int(compressed['Content-Length']), len(compressed.content))
+        self.assertLess(len(compressed.content), len(plain.content) // 4)
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+
+    def test_small_responses_left_alone(self):
+        doctor = Doctor.objects.first()
+        response = self.client.get(reverse('doctor-detail', args=[doctor.id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_reference_lists_precompressed(self):
+        with mock.patch.dict(compression.ENCODERS, {'gzip': not_called}):
+            response = self.client.get(reverse('category-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 61)
+
+    @override_settings(DOCTOR_LIST_COALESCE_TTL=5)
+    def test_coalesced_lists_precompressed(self):
+        with mock.patch.dict(compression.ENCODERS, {'gzip': not_called}):
+            response = self.client.get(reverse('doctor-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 20)
+
+    @override_settings(RESPONSE_COMPRESSION=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('doctor-list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
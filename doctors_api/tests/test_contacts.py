@@ -0,0 +1,106 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, DoctorContact, Category, District
+from doctors_api.contacts import normalize_contact, parse_contact_details
+
+
+class ContactParsingTest(SimpleTestCase):
+    def test_multi_valued_phones(self):
+        self.assertEqual(
+            parse_contact_details("555-0456, 555-0789"),
+            [('phone', '5550456'), ('phone', '5550789')]
+        )
+
+    def test_labels_and_emails(self):
+        self.assertEqual(
+            parse_contact_details("Phone: +852 1234 5678; Email: Dr.Chan@Example.com"),
+            [('phone', '+85212345678'), ('email', 'dr.chan@example.com')]
+        )
+
+    def test_other_values_and_duplicates(self):
+        self.assertEqual(parse_contact_details("Front  Desk, front desk"), [('other', 'front desk')])
+        self.assertEqual(parse_contact_details(""), [])
+
+    def test_normalize_single_value(self):
+        self.assertEqual(normalize_contact(" +852 1234-5678 "), ('phone', '+85212345678'))
+        self.assertIsNone(normalize_contact("  "))
+
+
+class DoctorContactTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.doctor = Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678, john@example.com",
+            category=self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def contacts(self, doctor):
+        return list(doctor.contacts.values_list('type', 'value'))
+
+    def test_populated_on_create(self):
+        self.assertEqual(
+            self.contacts(self.doctor),
+            [('phone', '+85212345678'), ('email', 'john@example.com')]
+        )
+
+    def test_replaced_on_update(self):
+        self.doctor.contact_details = "555-0456"
+        self.doctor.save()
+        self.assertEqual(self.contacts(self.doctor), [('phone', '5550456')])
+
+    def test_soft_delete_keeps_contacts(self):
+        self.doctor.delete()
+        self.doctor.restore()
+        self.assertEqual(len(self.contacts(self.doctor)), 2)
+
+    def test_populated_by_bulk_create_endpoint(self):
+        data = [
+            {
+                "name": f"Dr. Bulk {i}",
+                "address": "Bulk Address",
+                "contact_details": f"555-010{i}",
+                "category": self.category.id,
+                "district": self.district.id,
+                "language": "en",
+                "consultation_fee": "150.00"
+            }
+            for i in range(2)
+        ]
+        response = self.client.post(reverse('doctor-bulk-create'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(DoctorContact.objects.filter(value__in=['5550100', '5550101']).count(), 2)
+
+    def test_replace_for_many_doctors(self):
+        Doctor.objects.filter(pk=self.doctor.pk).update(contact_details="jane@example.com")
+        self.doctor.refresh_from_db()
+        DoctorContact.objects.replace_for([self.doctor])
+        self.assertEqual(self.contacts(self.doctor), [('email', 'jane@example.com')])
+
+    def test_contact_filter(self):
+        url = reverse('doctor-list')
+        for query in ['+852 1234-5678', 'JOHN@example.com', 'Phone: +85212345678']:
+            response = self.client.get(url, {'contact': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([doctor['name'] for doctor in response.data], ["Dr. John Smith"], query)
+
+        response = self.client.get(url, {'contact': '1234 5678'})
+        self.assertEqual(response.data, [])
+
+    def test_contact_filter_uses_index(self):
+        plan = DoctorContact.objects.filter(value='5550456').explain()
+        self.assertIn('doctor_contact_value_idx', plan)
+
+    def test_response_unchanged(self):
+        response = self.client.get(reverse('doctor-detail', args=[self.doctor.id]))
+        self.assertEqual(response.data['contact_details'], "Phone: +852 1234 5678, john@example.com")
+        self.assertNotIn('contacts', response.data)
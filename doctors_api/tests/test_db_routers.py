@@ -0,0 +1,154 @@
+from unittest import mock
+from django.http import HttpResponse
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from doctors import db_routers
+from doctors.db_routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaPinningMiddleware, use_primary
+from doctors_api import autocomplete, index, reference
+from doctors_api.models import Category, District, Doctor
+import time
+
+
+@override_settings(
+    DATABASE_REPLICAS=['replica1', 'replica2'],
+    DATABASE_REPLICA_MAX_LAG=5,
+    DATABASE_REPLICA_PIN_SECONDS=5,
+    DATABASE_REPLICA_CHECK_INTERVAL=60,
+)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        db_routers._health.clear()
+
+    def tearDown(self):
+        db_routers._health.clear()
+
+    def test_reads_go_to_replicas(self):
+        with mock.patch.object(db_routers, 'replica_lag', return_value=0):
+            reads = {self.router.db_for_read(Doctor) for _ in range(50)}
+        self.assertEqual(reads, {'replica1', 'replica2'})
+
+    def test_writes_and_migrations_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Doctor), 'default')
+        self.assertTrue(self.router.allow_migrate('default', 'doctors_api'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'doctors_api'))
+
+    def test_pinned_reads_go_to_primary(self):
+        with mock.patch.object(db_routers, 'replica_lag', return_value=0), use_primary():
+            self.assertEqual(self.router.db_for_read(Doctor), 'default')
+
+    def test_lagging_replica_is_skipped(self):
+        lag = {'replica1': 30, 'replica2': 1}
+        with mock.patch.object(db_routers, 'replica_lag', side_effect=lag.get) as replica_lag:
+            reads = {self.router.db_for_read(Doctor) for _ in range(20)}
+        self.assertEqual(reads, {'replica2'})
+        # health is cached for the check interval
+        self.assertEqual(replica_lag.call_count, 2)
+
+    def test_falls_back_to_primary(self):
+        with mock.patch.object(db_routers, 'replica_lag', return_value=60):
+            self.assertEqual(self.router.db_for_read(Doctor), 'default')
+
+    def test_sqlite_replicas_report_no_lag(self):
+        self.assertEqual(db_routers.replica_lag('default'), 0)
+
+
+@override_settings(DATABASE_REPLICA_PIN_SECONDS=5)
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.pinned = []
+
+        def view(request):
+            self.pinned.append(db_routers._pinned.get())
+            return HttpResponse(status=self.status)
+
+        self.status = 200
+        self.middleware = ReplicaPinningMiddleware(view)
+
+    def test_write_pins_the_client(self):
+        response = self.middleware(self.factory.post('/doctor/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/doctor/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        self.middleware(request)
+        self.assertEqual(self.pinned, [True, True])
+        self.assertFalse(db_routers._pinned.get())
+
+    def test_reads_are_not_pinned(self):
+        response = self.middleware(self.factory.get('/doctor/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/doctor/')
+        request.COOKIES[PIN_COOKIE] = str(time.time() - 1)
+        self.middleware(request)
+        request.COOKIES[PIN_COOKIE] = 'garbage'
+        self.middleware(request)
+        self.assertEqual(self.pinned, [False, False, False])
+
+    def test_failed_write_does_not_pin(self):
+        self.status = 400
+        response = self.middleware(self.factory.post('/doctor/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class RecordingRouter:
+    """Records whether each read was pinned to the primary, and leaves the routing to Django."""
+    reads = []
+
+    def db_for_read(self, model, **hints):
+        self.reads.append((model.__name__, db_routers._pinned.get()))
+
+
+@override_settings(DATABASE_ROUTERS=['doctors_api.tests.test_db_routers.RecordingRouter'])
+class SnapshotsFromPrimaryTest(TestCase):
+    """The per-worker snapshots are labelled with the version just read, they must not come from a lagging replica."""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="Cardiologist")
+        district = District.objects.create(name="Central")
+        cls.doctor = Doctor.objects.create(
+            name="Dr. John Smith", address="123 Medical Street", contact_details="Phone: +852 1234 5678",
+            category=category, district=district, language="en", consultation_fee=Decimal("200.00"),
+        )
+
+    def setUp(self):
+        RecordingRouter.reads = []
+        cache.clear()
+        for module in (autocomplete, index, reference):
+            module.invalidate()
+        self.addCleanup(cache.clear)
+        for module in (autocomplete, index, reference):
+            self.addCleanup(module.invalidate)
+
+    def assertPinned(self):
+        self.assertTrue(RecordingRouter.reads)
+        self.assertEqual([model for model, pinned in RecordingRouter.reads if not pinned], [])
+
+    def test_index_autocomplete_and_reference_data(self):
+        index.get_index()
+        autocomplete.get_autocomplete()
+        reference.get_reference_data()
+        self.assertPinned()
+
+    def test_patched_snapshots(self):
+        snapshots = index.get_index(), autocomplete.get_autocomplete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        RecordingRouter.reads = []
+        self.assertIsNot(index.get_index(), snapshots[0])
+        self.assertIsNot(autocomplete.get_autocomplete(), snapshots[1])
+        self.assertPinned()
+
+    @override_settings(DOCTOR_LIST_COALESCE_TTL=5)
+    def test_fee_stats_and_coalesced_list(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('doctor-fee-stats')).status_code, 200)
+        self.assertEqual(client.get(reverse('doctor-list')).status_code, 200)
+        self.assertPinned()
@@ -0,0 +1,227 @@
+from collections import Counter
+from pathlib import Path
+from unittest import mock
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from doctors import db_writes
+from doctors.db_writes import is_busy, run_write
+from doctors_api.models import Category, District
+
+ROOT = Path(settings.BASE_DIR)
+
+# one process of the stress test, on the database file given as its first argument:
+# "setup" migrates it, "write" and "read" wait for a line on stdin and then hammer it
+WORKER = """
+import json, sys
+from collections import Counter
+from django.conf import settings
+path, role, number, count = sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+settings.DATABASES['default']['NAME'] = path
+import django
+django.setup()
+from django.core.management import call_command
+from django.test import Client
+from doctors_api.models import Category, District
+
+if role == 'setup':
+    call_command('migrate', verbosity=0)
+    Category.objects.create(name='Cardiologist')
+    District.objects.create(name='Central')
+    sys.exit()
+
+client = Client()
+category, district = Category.objects.get().pk, District.objects.get().pk
+def doctor(name, fee='300.00'):
+    return {
+        'name': name, 'address': '1 Medical Street', 'contact_details': 'Phone: +852 1234 5678',
+        'category': category, 'district': district, 'language': 'en', 'consultation_fee': fee,
+    }
+
+statuses = Counter()
+print('ready', flush=True)
+sys.stdin.readline()
+for i in range(count):
+    if role == 'read':
+        response = client.get('/doctor/', {'page_size': 20})
+    elif i % 3 == 0:
+        response = client.post('/doctor/', doctor(f'Dr. Single {number} {i}'), content_type='application/json')
+    elif i % 3 == 1:
+        data = [doctor(f'Dr. Bulk {number} {i} {j}') for j in range(5)]
+        response = client.post('/doctor/bulk_create/', data, content_type='application/json')
+    else:
+        # only duplicates: the transaction reads the doctor before it updates it
+        data = [doctor(f'Dr. Single {number} {i - 2}', '400.00')]
+        response = client.post('/doctor/bulk_create/?on_duplicate=merge', data, content_type='application/json')
+    statuses[response.status_code] += 1
+print(json.dumps(statuses), flush=True)
+"""
+
+
+class WriteSettingsTest(SimpleTestCase):
+    def test_sqlite_options(self):
+        options = settings.DATABASES['default']['OPTIONS']
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        self.assertIn('journal_mode=WAL', options['init_command'])
+
+    def test_busy_errors(self):
+        self.assertTrue(is_busy(OperationalError('database is locked')))
+        self.assertFalse(is_busy(OperationalError('no such table: doctors_api_doctor')))
+        self.assertFalse(is_busy(ValueError('database is locked')))
+
+
+@override_settings(DATABASE_WRITE_RETRIES=2, DATABASE_WRITE_BACKOFF=0)
+class RunWriteTest(TransactionTestCase):
+    def busy_for(self, attempts):
+        calls = []
+
+        def write():
+            calls.append(connection.in_atomic_block)
+            Category.objects.create(name=f"Category {len(calls)}")
+            if len(calls) <= attempts:
+                raise OperationalError('database is locked')
+            return len(calls)
+
+        return write, calls
+
+    def test_busy_write_retried(self):
+        write, calls = self.busy_for(2)
+        with self.assertLogs('doctors.db_writes', 'WARNING') as logs:
+            self.assertEqual(run_write(write), 3)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(calls, [True, True, True])
+        # the failed attempts were rolled back
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ["Category 3"])
+
+    def test_retries_bounded(self):
+        write, calls = self.busy_for(3)
+        with self.assertRaises(OperationalError), self.assertLogs('doctors.db_writes', 'WARNING'):
+            run_write(write)
+        self.assertEqual(len(calls), 3)
+        self.assertFalse(Category.objects.exists())
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        def write():
+            calls.append(1)
+            raise OperationalError('no such table: doctors_api_doctor')
+
+        with self.assertRaises(OperationalError):
+            run_write(write)
+        self.assertEqual(len(calls), 1)
+
+    def test_nested_write_left_to_enclosing_transaction(self):
+        write, calls = self.busy_for(1)
+        with self.assertRaises(OperationalError), transaction.atomic():
+            run_write(write)
+        self.assertEqual(len(calls), 1)
+
+    def test_write_lock_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'db.sqlite3')
+            connection.settings_dict['NAME'], name = str(path), connection.settings_dict['NAME']
+            try:
+                with mock.patch.object(connection, 'is_in_memory_db', return_value=False):
+                    with db_writes.write_lock():
+                        self.assertTrue(Path(directory, 'db.sqlite3.write-lock').exists())
+            finally:
+                connection.settings_dict['NAME'] = name
+                db_writes._lock_files.clear()
+
+
+class BusyResponseTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.doctor = {
+            'name': "Dr. John Smith",
+            'address': "123 Medical Street, Central",
+            'contact_details': "Phone: +852 1234 5678",
+            'category': Category.objects.create(name="Cardiologist").pk,
+            'district': District.objects.create(name="Central").pk,
+            'language': "en",
+            'consultation_fee': "200.00",
+        }
+
+    def test_busy_database_answers_503(self):
+        busy = OperationalError('database is locked')
+        with mock.patch('doctors_api.views.run_write', side_effect=busy):
+            for url, data in ((reverse('doctor-list'), self.doctor), (reverse('doctor-bulk-create'), [self.doctor])):
+                with self.subTest(url):
+                    response = self.client.post(url, data, format='json')
+                    self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+                    self.assertEqual(response['Retry-After'], '1')
+
+
+class ConcurrentWritesTest(SimpleTestCase):
+    """Several processes writing and reading one database file at once, like gunicorn workers."""
+    writers = 4
+    readers = 2
+    requests = 30
+
+    def spawn(self, path, role, number=0, count=0):
+        env = dict(
+            os.environ, DJANGO_SECRET_KEY='stress', DJANGO_SETTINGS_MODULE='doctors.settings',
+            DJANGO_ALLOWED_HOSTS='testserver', DJANGO_THROTTLE='False', DJANGO_LOG_FILE='',
+        )
+        # a file keeps the pipe from filling up if the console logs a lot
+        log = open(path.with_name(f'{role}{number}.log'), 'w+')
+        self.addCleanup(log.close)
+        process = subprocess.Popen(
+            [sys.executable, '-c', WORKER, str(path), role, str(number), str(count)],
+            cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log, text=True,
+        )
+        process.log = log
+        return process
+
+    def wait(self, process, timeout):
+        output, _ = process.communicate(timeout=timeout)
+        process.log.seek(0)
+        return output, process.log.read()
+
+    def test_no_lock_errors(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, 'db.sqlite3')
+            setup = self.spawn(path, 'setup')
+            _, errors = self.wait(setup, 120)
+            self.assertEqual(setup.returncode, 0, errors)
+
+            processes = [self.spawn(path, 'write', number, self.requests) for number in range(self.writers)]
+            processes += [self.spawn(path, 'read', number, self.requests) for number in range(self.readers)]
+            # start them together, once every process has loaded Django
+            for process in processes:
+                self.assertEqual(process.stdout.readline().strip(), 'ready')
+            for process in processes:
+                process.stdin.write('go\n')
+                process.stdin.flush()
+
+            statuses = {'write': Counter(), 'read': Counter()}
+            for number, process in enumerate(processes):
+                output, errors = self.wait(process, 300)
+                self.assertEqual(process.returncode, 0, errors)
+                self.assertNotIn('database is locked', errors)
+                role = 'write' if number < self.writers else 'read'
+                statuses[role].update({int(code): count for code, count in json.loads(output).items()})
+
+            self.assertEqual(statuses['write'], {201: self.writers * self.requests})
+            self.assertEqual(statuses['read'], {200: self.readers * self.requests})
+            with sqlite3.connect(path) as database:
+                self.assertEqual(database.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+                # a third of the requests create one doctor, a third five and the rest update one
+                self.assertEqual(
+                    database.execute("SELECT COUNT(*) FROM doctors_api_doctor").fetchone()[0],
+                    self.writers * self.requests // 3 * 6,
+                )
+                self.assertEqual(
+                    database.execute("SELECT COUNT(*) FROM doctors_api_doctor WHERE consultation_fee_cents = 40000").fetchone()[0],
+                    self.writers * self.requests // 3,
+                )
@@ -0,0 +1,190 @@
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from unittest import mock
+from doctors_api.models import Doctor, DoctorContact, Category, District, SpokenLanguage
+from doctors_api.serializers import DoctorSerializer
+from doctors_api.duplicates import content_hash, find_duplicates
+from doctors_api.signals import directory_version
+
+
+class ContentHashTest(SimpleTestCase):
+    def test_case_and_spacing_ignored(self):
+        self.assertEqual(
+            content_hash("Dr. John  Smith", "123 Medical Street", 1),
+            content_hash(" dr. JOHN smith", "123 medical street ", 1),
+        )
+        self.assertEqual(content_hash("Ｄｒ. 陳大文", "中環", 1), content_hash("Dr. 陳大文", "中環", 1))
+
+    def test_district_and_address_distinguish(self):
+        hashes = {
+            content_hash("Dr. John Smith", "123 Medical Street", 1),
+            content_hash("Dr. John Smith", "123 Medical Street", 2),
+            content_hash("Dr. John Smith", "124 Medical Street", 1),
+        }
+        self.assertEqual(len(hashes), 3)
+
+    def test_find_duplicates(self):
+        self.assertEqual(
+            find_duplicates(['a', 'b', 'a', 'c', 'c'], {'b': 7}),
+            {1: ('doctor', 7), 2: ('item', 0), 4: ('item', 3)},
+        )
+
+
+class DuplicateDetectionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-bulk-create')
+        self.category = Category.objects.create(name="Cardiologist")
+        self.other_category = Category.objects.create(name="Dermatologist")
+        self.district = District.objects.create(name="Central")
+        self.doctor = Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def item(self, name, **fields):
+        return {
+            "name": name,
+            "address": "123 Medical Street, Central",
+            "contact_details": "Phone: +852 2345 6789",
+            "category": self.category.id,
+            "district": self.district.id,
+            "language": "en",
+            "consultation_fee": "300.00",
+            **fields,
+        }
+
+    def post(self, data, policy=None):
+        url = self.url if policy is None else f'{self.url}?on_duplicate={policy}'
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data, format='json')
+
+    def test_hash_kept_up_to_date(self):
+        self.assertEqual(self.doctor.content_hash, content_hash(self.doctor.name, self.doctor.address, self.district.id))
+        self.doctor.address = "1 New Street"
+        self.doctor.save(update_fields=['address'])
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.content_hash, content_hash(self.doctor.name, "1 New Street", self.district.id))
+
+    def test_unique_among_active_doctors(self):
+        copy = dict(
+            name="dr. john smith", address=self.doctor.address, contact_details="", category=self.category,
+            district=self.district, language="en", consultation_fee=Decimal("100.00"),
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Doctor.objects.bulk_create([Doctor(**copy)])
+        # a soft-deleted listing may be submitted again
+        self.doctor.delete()
+        Doctor.objects.create(**copy)
+
+    def test_reject(self):
+        data = [self.item("Dr. New"), self.item("DR. NEW"), self.item("Dr. John Smith")]
+        response = self.post(data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("Duplicate of item 0", str(response.data[1]['non_field_errors'][0]))
+        self.assertIn(f"Duplicate of doctor {self.doctor.id}", str(response.data[2]['non_field_errors'][0]))
+        self.assertEqual(Doctor.objects.count(), 1)
+
+    def test_one_query_per_batch(self):
+        data = [self.item(f"Dr. New {i}") for i in range(20)] + [self.item("Dr. John Smith")]
+        with CaptureQueriesContext(connection) as queries:
+            self.post(data, 'skip')
+        lookups = [query['sql'] for query in queries if '"content_hash" IN' in query['sql']]
+        self.assertEqual(len(lookups), 1)
+
+    def test_skip(self):
+        versions = directory_version()
+        data = [self.item("Dr. New", languages=['cantonese']), self.item("Dr. John Smith"), self.item("dr. new")]
+        response = self.post(data, 'skip')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        created = Doctor.objects.get(name="Dr. New")
+        self.assertEqual([doctor['id'] for doctor in response.data['created']], [created.id])
+        self.assertEqual(response.data['created'][0]['languages'], ['en', 'cantonese'])
+        self.assertEqual(response.data['merged'], [])
+        self.assertEqual(response.data['duplicates'], [
+            {'index': 1, 'doctor': self.doctor.id},
+            {'index': 2, 'doctor': created.id},
+        ])
+        self.assertEqual(Doctor.objects.count(), 2)
+        self.assertEqual(list(created.contacts.values_list('value', flat=True)), ['+85223456789'])
+        self.assertEqual(directory_version(), versions + 1)
+        # the existing doctor is left alone
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.consultation_fee, Decimal("200.00"))
+
+    def test_merge(self):
+        data = [
+            self.item("Dr. John Smith", category=self.other_category.id, languages=['mandarin']),
+            self.item("Dr. New", consultation_fee="400.00"),
+            self.item("Dr. New", consultation_fee="500.00", languages=['cantonese']),
+        ]
+        response = self.post(data, 'merge')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.category, self.other_category)
+        self.assertEqual(self.doctor.consultation_fee, Decimal("300.00"))
+        self.assertEqual(set(self.doctor.spoken_languages.values_list('language', flat=True)), {'en', 'mandarin'})
+        self.assertEqual(list(self.doctor.contacts.values_list('value', flat=True)), ['+85223456789'])
+        self.assertEqual([doctor['id'] for doctor in response.data['merged']], [self.doctor.id])
+
+        # the later submission of the same new doctor wins
+        created = Doctor.objects.get(name="Dr. New")
+        self.assertEqual(created.consultation_fee, Decimal("500.00"))
+        self.assertEqual(response.data['created'][0]['languages'], ['en', 'cantonese'])
+        self.assertEqual(response.data['duplicates'], [
+            {'index': 0, 'doctor': self.doctor.id},
+            {'index': 2, 'doctor': created.id},
+        ])
+        self.assertEqual(Doctor.objects.count(), 2)
+        self.assertEqual(SpokenLanguage.objects.filter(doctor=created).count(), 2)
+        self.assertEqual(DoctorContact.objects.filter(doctor=created).count(), 1)
+
+    def test_unknown_policy(self):
+        response = self.post([self.item("Dr. New")], 'ignore')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('on_duplicate', response.data)
+
+    def test_create_rejects_duplicate(self):
+        response = self.client.post(reverse('doctor-list'), self.item(" Dr. John  Smith"), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(f"Duplicate of doctor {self.doctor.id}", str(response.data['non_field_errors'][0]))
+
+    def test_listed_concurrently(self):
+        # another request listed the doctor between the duplicate check and the INSERT
+        with mock.patch.object(DoctorSerializer, 'validate', lambda self, attrs: attrs):
+            response = self.client.post(reverse('doctor-list'), self.item("Dr. John Smith"), format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        with mock.patch('doctors_api.serializers.find_duplicates', return_value={}):
+            response = self.post([self.item("Dr. New"), self.item("Dr. John Smith")])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data, {'detail': "Some of the doctors were listed in the meantime, retry the request."})
+        self.assertEqual(Doctor.objects.count(), 1)
+
+    def test_admin_restore_of_relisted_doctor(self):
+        self.doctor.delete()
+        Doctor.objects.create(
+            name=self.doctor.name, address=self.doctor.address, contact_details="", category=self.category,
+            district=self.district, language="en", consultation_fee=Decimal("100.00"),
+        )
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.post(
+            reverse('admin:doctors_api_doctor_changelist'),
+            {'action': 'restore', '_selected_action': [self.doctor.id]},
+            follow=True,
+        )
+        self.assertContains(response, "No doctors were restored")
+        self.doctor.refresh_from_db()
+        self.assertFalse(self.doctor.is_active)
@@ -0,0 +1,105 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.stats import fee_statistics
+
+
+class FeeCentsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.doctor = self.create_doctor("Dr. John Smith", "200.29")
+
+    def tearDown(self):
+        cache.clear()
+
+    def create_doctor(self, name, fee, category=None):
+        return Doctor.objects.create(
+            name=name,
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=category or self.category,
+            district=self.district,
+            language="en",
+            consultation_fee=Decimal(fee)
+        )
+
+    def test_cents_follow_the_fee(self):
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.consultation_fee_cents, 20029)
+
+        self.doctor.consultation_fee = Decimal("0.29")
+        self.doctor.save()
+        self.doctor.refresh_from_db()
+        self.assertEqual(self.doctor.consultation_fee_cents, 29)
+
+    def test_range_filter_boundaries(self):
+        url = reverse('doctor-list')
+        cases = [
+            ('?min_consultation_fee=200.29', 1),
+            ('?min_consultation_fee=200.291', 0),
+            ('?max_consultation_fee=200.29', 1),
+            ('?max_consultation_fee=200.289', 0),
+            ('?min_consultation_fee=200&max_consultation_fee=201', 1),
+        ]
+        for query, expected in cases:
+            response = self.client.get(url + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data), expected, query)
+
+    def test_range_filter_uses_cents_column(self):
+        from doctors_api.views import DoctorFilter
+        queryset = DoctorFilter({'min_consultation_fee': '10'}, queryset=Doctor.objects.all()).qs
+        self.assertIn('"consultation_fee_cents" >= 1000', str(queryset.query))
+
+    def test_fee_stats_endpoint(self):
+        other = Category.objects.create(name="Dermatologist")
+        for i, fee in enumerate(["100.00", "150.00", "300.00"]):
+            self.create_doctor(f"Dr. {i}", fee, category=other)
+
+        url = reverse('doctor-fee-stats')
+        response = self.client.get(url + f'?category={other.id}&bins=2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['min'], "100.00")
+        self.assertEqual(response.data['max'], "300.00")
+        self.assertEqual(response.data['percentiles']['50'], "150.00")
+        self.assertEqual([bucket['count'] for bucket in response.data['histogram']], [2, 1])
+
+        # computed once per directory version
+        with self.assertNumQueries(0):
+            self.client.get(url + f'?bins=2&category={other.id}')
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['count'], 4)
+
+    def test_fee_stats_validation(self):
+        url = reverse('doctor-fee-stats')
+        self.assertEqual(self.client.get(url + '?bins=0').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url + '?district=abc').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FeeStatisticsTest(SimpleTestCase):
+    def test_empty(self):
+        self.assertEqual(fee_statistics([])['count'], 0)
+
+    def test_single_value(self):
+        stats = fee_statistics([5000], bins=4)
+        self.assertEqual(stats['min'], "50.00")
+        self.assertEqual(stats['percentiles']['90'], "50.00")
+        self.assertEqual(stats['histogram'], [{'min': "50.00", 'max': "50.00", 'count': 1}])
+
+    def test_percentiles_and_histogram(self):
+        cents = [i * 100 for i in range(1, 101)]
+        stats = fee_statistics(cents, bins=10)
+        self.assertEqual(stats['percentiles']['10'], "10.00")
+        self.assertEqual(stats['percentiles']['50'], "50.00")
+        self.assertEqual(stats['percentiles']['90'], "90.00")
+        self.assertEqual(len(stats['histogram']), 10)
+        self.assertEqual(sum(bucket['count'] for bucket in stats['histogram']), 100)
+        self.assertEqual(stats['histogram'][-1]['max'], "100.00")
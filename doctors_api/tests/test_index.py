@@ -0,0 +1,306 @@
+from datetime import datetime, timezone
+from unittest import mock
+import random
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.index import DoctorIndex, build_index, get_index, invalidate, set_bits
+from doctors_api.signals import changes_key, directory_version
+
+
+class DoctorIndexTest(TestCase):
+    def setUp(self):
+        self.category1 = Category.objects.create(name="Cardiologist")
+        self.category2 = Category.objects.create(name="Dermatologist")
+        self.district1 = District.objects.create(name="Central")
+        self.district2 = District.objects.create(name="Kowloon")
+
+        self.zoe = Doctor.objects.create(
+            name="Dr. Zoe Williams",
+            address="789 Medical Road",
+            contact_details="Phone: +852 2345 6789",
+            category=self.category1,
+            district=self.district1,
+            language="cantonese",
+            consultation_fee=Decimal("250.00")
+        )
+        self.adam = Doctor.objects.create(
+            name="Dr. Adam Brown",
+            address="456 Health Avenue",
+            contact_details="Phone: +852 8765 4321",
+            category=self.category1,
+            district=self.district2,
+            language="en",
+            consultation_fee=Decimal("300.50")
+        )
+        self.jane = Doctor.objects.create(
+            name="Dr. Jane Doe",
+            address="123 Medical Street",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category2,
+            district=self.district1,
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+        Doctor.objects.create(
+            name="Dr. Inactive",
+            address="Inactive Street",
+            contact_details="Phone: +852 9999 9999",
+            category=self.category1,
+            district=self.district1,
+            language="en",
+            consultation_fee=Decimal("250.00"),
+            is_active=False
+        )
+        self.index = build_index(version=0)
+
+    def test_only_active_doctors_in_name_order(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.filter(), [self.adam.id, self.jane.id, self.zoe.id])
+
+    def test_equality_filters(self):
+        self.assertEqual(self.index.filter(category=self.category1.id), [self.adam.id, self.zoe.id])
+        self.assertEqual(self.index.filter(district=self.district1.id), [self.jane.id, self.zoe.id])
+        self.assertEqual(self.index.filter(language="EN"), [self.adam.id, self.jane.id])
+        self.assertEqual(
+            self.index.filter(category=self.category1.id, district=self.district1.id),
+            [self.zoe.id]
+        )
+        self.assertEqual(self.index.filter(category=self.category2.id, language="cantonese"), [])
+        self.assertEqual(self.index.filter(category=12345), [])
+
+    def test_fee_range(self):
+        self.assertEqual(
+            self.index.filter(min_consultation_fee=Decimal("250"), max_consultation_fee=Decimal("300.50")),
+            [self.adam.id, self.zoe.id]
+        )
+        self.assertEqual(self.index.filter(min_consultation_fee=Decimal("300.01")), [self.adam.id])
+        self.assertEqual(self.index.filter(max_consultation_fee=Decimal("249.99")), [self.jane.id])
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.index, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.index.extra = 1
+
+    def test_empty_directory(self):
+        index = DoctorIndex(0, [])
+        self.assertEqual(index.filter(), [])
+        self.assertEqual(index.filter(language="en"), [])
+
+    def test_patched_after_change(self):
+        invalidate()
+        first = get_index()
+        self.assertIs(get_index(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jane.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.adam.name = "Dr. Zuri Adams"
+            self.adam.district = self.district1
+            self.adam.save()
+
+        with mock.patch('doctors_api.index.build_index') as build:
+            second = get_index()
+        build.assert_not_called()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.filter(), [self.zoe.id, self.adam.id])
+        self.assertEqual(second.filter(district=self.district1.id), [self.zoe.id, self.adam.id])
+        # the published snapshot is left as it was
+        self.assertEqual(first.filter(), [self.adam.id, self.jane.id, self.zoe.id])
+
+    def test_rebuilt_when_changes_unknown(self):
+        invalidate()
+        first = get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jane.delete()
+        cache.delete(changes_key(directory_version()))
+
+        second = get_index()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.filter(), [self.adam.id, self.zoe.id])
+
+    @override_settings(DOCTOR_SNAPSHOT_MAX_AGE=60)
+    def test_rebuilt_when_expired(self):
+        # another worker's delete, the per-process cache never hears of it
+        invalidate()
+        first = get_index()
+        Doctor.objects.filter(pk=self.jane.pk).update(is_active=False)
+        self.assertIs(get_index(), first)
+
+        with mock.patch('time.monotonic', return_value=first.loaded_at + 60):
+            second = get_index()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.filter(), [self.adam.id, self.zoe.id])
+
+    def test_not_expired_with_shared_versions(self):
+        invalidate()
+        first = get_index()
+        with mock.patch('doctors_api.signals.versions_shared', return_value=True), \
+                mock.patch('time.monotonic', return_value=first.loaded_at + 24 * 60 * 60):
+            self.assertIs(get_index(), first)
+
+
+class RealisticIndexTest(SimpleTestCase):
+    """A directory of 100,000 random doctors, checked against filtering them one by one."""
+    size = 100000
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(1)
+        updated_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        cls.doctors = {}
+        for pk in range(1, cls.size + 1):
+            languages = {rng.choice(["en", "cantonese", "mandarin"])} | ({"en"} if rng.random() < 0.2 else set())
+            cls.doctors[pk] = (
+                (pk, f"Dr. {rng.randrange(5000):04}", rng.randrange(1, 161), rng.randrange(1, 15), rng.randrange(20000, 500001, 5000), updated_at),
+                languages,
+            )
+        cls.index = cls.build(cls.doctors)
+
+    @staticmethod
+    def build(doctors):
+        rows = sorted((row for row, _ in doctors.values()), key=lambda row: (row[1], row[0]))
+        languages = [(pk, language) for pk, (_, spoken) in doctors.items() for language in spoken]
+        return DoctorIndex(0, rows, languages)
+
+    def expected(self, doctors, category=None, district=None, language=None, min_consultation_fee=None, max_consultation_fee=None):
+        return [
+            row[0] for row, spoken in sorted(doctors.values(), key=lambda doctor: (doctor[0][1], doctor[0][0]))
+            if (category is None or row[2] == category)
+            and (district is None or row[3] == district)
+            and (language is None or spoken & set(language.split(',')))
+            and (min_consultation_fee is None or row[4] >= min_consultation_fee * 100)
+            and (max_consultation_fee is None or row[4] <= max_consultation_fee * 100)
+        ]
+
+    FILTERS = [
+        {},
+        {'category': 7},
+        {'category': 7, 'district': 3},
+        {'district': 3, 'language': 'cantonese'},
+        {'language': 'en'},
+        {'language': 'mandarin,cantonese', 'category': 99},
+        {'min_consultation_fee': Decimal(200), 'max_consultation_fee': Decimal(400)},
+        {'min_consultation_fee': Decimal("1234.5")},
+        {'max_consultation_fee': Decimal(675), 'district': 14},
+        {'min_consultation_fee': Decimal(5000), 'max_consultation_fee': Decimal(5000), 'language': 'en'},
+        {'min_consultation_fee': Decimal(401), 'max_consultation_fee': Decimal(449)},
+    ]
+
+    def test_filters(self):
+        for filters in self.FILTERS:
+            with self.subTest(**filters):
+                self.assertEqual(self.index.filter(**filters), self.expected(self.doctors, **filters))
+
+    def test_patched_like_rebuilt(self):
+        rng = random.Random(2)
+        doctors = dict(self.doctors)
+        changed = set(rng.sample(range(1, self.size + 1), 60))
+        rows = []
+        for i, pk in enumerate(sorted(changed)):
+            row, spoken = doctors[pk]
+            if i % 3 == 0:
+                del doctors[pk]
+                continue
+            row = (pk, f"Dr. {rng.randrange(5000):04}", row[2], rng.randrange(1, 16), rng.randrange(20000, 600001, 5000), row[5])
+            doctors[pk] = (row, {"mandarin"})
+            rows.append(row)
+        # and new doctors, with categories and fees the directory had none of
+        for pk in range(self.size + 1, self.size + 6):
+            row = (pk, f"Dr. {pk}", 161, 1, 123400, self.doctors[1][0][5])
+            doctors[pk] = (row, {"en"})
+            rows.append(row)
+            changed.add(pk)
+
+        patched = self.index.patched(1, changed, rows, [(row[0], language) for row in rows for language in doctors[row[0]][1]])
+        self.assertEqual(len(patched), len(doctors))
+        rebuilt = self.build(doctors)
+        for filters in [*self.FILTERS, {'category': 161}, {'district': 15}, {'min_consultation_fee': Decimal(1234)}]:
+            with self.subTest(**filters):
+                self.assertEqual(patched.filter(**filters), rebuilt.filter(**filters))
+        self.assertEqual(self.index.filter(), self.expected(self.doctors))
+
+    def test_set_bits(self):
+        for positions in ([], [0], [5, 9, 4000], list(range(0, 20000, 3)), list(range(1000))):
+            with self.subTest(count=len(positions)):
+                self.assertEqual(set_bits(sum(1 << position for position in positions)), positions)
+
+
+@override_settings(DOCTOR_INDEX_ENABLED=True)
+class IndexedDoctorListTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        for i, language in enumerate(["en", "cantonese", "mandarin", "en"]):
+            Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street",
+                contact_details="Phone: +852 1234 5678",
+                category=self.category,
+                district=self.district,
+                language=language,
+                consultation_fee=Decimal(100 * (i + 1))
+            )
+        invalidate()
+
+    def tearDown(self):
+        invalidate()
+
+    def test_matches_database_filtering(self):
+        queries = [
+            '',
+            '?language=en',
+            f'?category={self.category.id}&min_consultation_fee=200',
+            f'?district={self.district.id}&max_consultation_fee=250',
+        ]
+        for query in queries:
+            url = reverse('doctor-list') + query
+            indexed = self.client.get(url)
+            with self.settings(DOCTOR_INDEX_ENABLED=False):
+                expected = self.client.get(url)
+            self.assertEqual(indexed.status_code, status.HTTP_200_OK)
+            self.assertEqual(indexed.data, expected.data, query)
+
+    def test_only_primary_key_lookups_per_list(self):
+        get_index()
+        # the rows by primary key and their prefetched spoken languages
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('doctor-list') + '?language=cantonese')
+        self.assertEqual([doctor['name'] for doctor in response.data], ["Dr. 1"])
+
+    def test_one_query_for_many_matches(self):
+        Doctor.objects.bulk_create(
+            Doctor(
+                name=f"Dr. Bulk {i}", address=f"{i} Bulk Street", contact_details="", category=self.category,
+                district=self.district, language="en", consultation_fee=Decimal(100), content_hash=f"bulk-{i}",
+            )
+            for i in range(1200)
+        )
+        invalidate()
+        get_index()
+        # the rows and their spoken languages, not split into batches of 999 ids
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('doctor-list') + f'?category={self.category.id}&fields=id,languages')
+        self.assertEqual(len(response.data), 1204)
+
+    def test_unfiltered_list_skips_index(self):
+        with mock.patch('doctors_api.views.get_index') as index:
+            response = self.client.get(reverse('doctor-list') + '?fields=id,name')
+        index.assert_not_called()
+        self.assertEqual(len(response.data), 4)
+
+    def test_search_falls_back_to_database(self):
+        response = self.client.get(reverse('doctor-list') + '?search=Cardio&language=mandarin')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([doctor['name'] for doctor in response.data], ["Dr. 2"])
+
+    def test_invalid_filter_reports_errors(self):
+        response = self.client.get(reverse('doctor-list') + '?category=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category', response.data)
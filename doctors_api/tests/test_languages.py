@@ -0,0 +1,141 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, SpokenLanguage, Category, District
+from doctors_api.index import invalidate
+
+
+class SpokenLanguageTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name="Cardiologist")
+        self.district = District.objects.create(name="Central")
+        self.bilingual = self.create_doctor("Dr. Bilingual", "cantonese")
+        SpokenLanguage.objects.create(doctor=self.bilingual, language="en")
+        self.english = self.create_doctor("Dr. English", "en")
+        self.mandarin = self.create_doctor("Dr. Mandarin", "mandarin")
+        invalidate()
+
+    def tearDown(self):
+        invalidate()
+
+    def create_doctor(self, name, language):
+        return Doctor.objects.create(
+            name=name,
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=self.category,
+            district=self.district,
+            language=language,
+            consultation_fee=Decimal("200.00")
+        )
+
+    def names(self, query):
+        response = self.client.get(reverse('doctor-list') + query)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [doctor['name'] for doctor in response.data]
+
+    def test_primary_language_is_spoken(self):
+        self.assertEqual(
+            list(self.english.spoken_languages.values_list('language', flat=True)),
+            ["en"]
+        )
+        self.english.language = "cantonese"
+        self.english.save(update_fields=['language'])
+        self.assertEqual(list(self.english.spoken_languages.values_list('language', flat=True)), ["en", "cantonese"])
+
+    def test_previous_primary_language_kept(self):
+        doctor = Doctor.objects.get(pk=self.bilingual.pk)
+        doctor.language = "mandarin"
+        doctor.save()
+        self.assertEqual(sorted(doctor.spoken_languages.values_list('language', flat=True)), ["cantonese", "en", "mandarin"])
+        self.assertEqual(self.names('?language=cantonese'), [doctor.name])
+
+        # already spoken, nothing is added
+        doctor.language = "en"
+        doctor.save()
+        self.assertEqual(doctor.spoken_languages.count(), 3)
+
+    def test_unchanged_language_not_inserted(self):
+        doctor = Doctor.objects.get(pk=self.english.pk)
+        doctor.consultation_fee = Decimal("300.00")
+        # the UPDATE and the contacts
+        with self.assertNumQueries(3):
+            doctor.save()
+
+    def test_merge_replaces_primary_language(self):
+        data = {
+            "name": self.english.name,
+            "address": self.english.address,
+            "contact_details": "Phone: +852 1234 5678",
+            "category": self.category.id,
+            "district": self.district.id,
+            "language": "mandarin",
+            "consultation_fee": "200.00",
+        }
+        url = reverse('doctor-bulk-create') + '?on_duplicate=merge'
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, [data], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(list(self.english.spoken_languages.values_list('language', flat=True)), ["mandarin"])
+
+        # listed again, the previous primary language stays
+        data.update(language="cantonese", languages=["mandarin"])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, [data], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(sorted(self.english.spoken_languages.values_list('language', flat=True)), ["cantonese", "mandarin"])
+
+    def test_filter_single_language(self):
+        self.assertEqual(self.names('?language=en'), ["Dr. Bilingual", "Dr. English"])
+        self.assertEqual(self.names('?language=Cantonese'), ["Dr. Bilingual"])
+
+    def test_filter_several_languages_without_duplicates(self):
+        self.assertEqual(
+            self.names('?language=en,cantonese'),
+            ["Dr. Bilingual", "Dr. English"]
+        )
+        self.assertEqual(
+            self.names('?language=en, mandarin'),
+            ["Dr. Bilingual", "Dr. English", "Dr. Mandarin"]
+        )
+
+    @override_settings(DOCTOR_INDEX_ENABLED=True)
+    def test_index_matches_database(self):
+        for query in ['?language=en', '?language=en,cantonese', '?language=mandarin,unknown', '?language=']:
+            with self.settings(DOCTOR_INDEX_ENABLED=False):
+                expected = self.names(query)
+            self.assertEqual(self.names(query), expected, query)
+
+    def test_languages_in_response(self):
+        response = self.client.get(reverse('doctor-detail', args=[self.bilingual.id]))
+        self.assertEqual(response.data['language'], "cantonese")
+        self.assertEqual(response.data['languages'], ["cantonese", "en"])
+
+    def test_list_prefetches_languages(self):
+        # doctors (with category and district joined) and one query for all their languages
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('doctor-list'))
+        self.assertEqual(len(response.data), 3)
+
+    def test_create_with_languages(self):
+        data = {
+            "name": "Dr. New Doctor",
+            "address": "New Address",
+            "contact_details": "New Contact",
+            "category": self.category.id,
+            "district": self.district.id,
+            "language": "mandarin",
+            "languages": ["en", "mandarin"],
+            "consultation_fee": "350.00"
+        }
+        response = self.client.post(reverse('doctor-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(sorted(response.data['languages']), ["en", "mandarin"])
+
+        data["languages"] = ["klingon"]
+        response = self.client.post(reverse('doctor-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('languages', response.data)
@@ -0,0 +1,96 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api import index, reference
+import json
+
+
+class ListLayoutTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.cardiologist = Category.objects.create(name="Cardiologist")
+        self.dentist = Category.objects.create(name="Dentist")
+        self.central = District.objects.create(name="Central")
+        self.doctors = [
+            Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street, Central",
+                contact_details="Phone: +852 1234 5678",
+                category=self.cardiologist if i % 2 else self.dentist,
+                district=self.central,
+                language="en",
+                consultation_fee=Decimal("200.00")
+            )
+            for i in range(4)
+        ]
+        reference.invalidate()
+        self.addCleanup(reference.invalidate)
+
+    def get(self, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return json.loads(response.content), [query['sql'] for query in queries]
+
+    def test_rows_by_default(self):
+        data, _ = self.get({})
+        self.assertEqual(data[0]['category_name'], "Dentist")
+        self.assertEqual(data, self.get({'layout': 'rows'})[0])
+
+    def test_dictionary(self):
+        rows, _ = self.get({})
+        data, queries = self.get({'layout': 'dictionary'})
+        self.assertEqual(data['categories'], {str(self.cardiologist.id): "Cardiologist", str(self.dentist.id): "Dentist"})
+        self.assertEqual(data['districts'], {str(self.central.id): "Central"})
+        self.assertEqual(
+            data['results'],
+            [{name: value for name, value in row.items() if name not in ('category_name', 'district_name')} for row in rows]
+        )
+        # names come from the reference snapshot, no join
+        self.assertFalse([sql for sql in queries if 'JOIN' in sql])
+        self.assertLess(len(json.dumps(data)), len(json.dumps(rows)))
+
+    def test_columnar(self):
+        rows, _ = self.get({})
+        data, _ = self.get({'layout': 'columnar'})
+        self.assertEqual(data['categories'], {str(self.cardiologist.id): "Cardiologist", str(self.dentist.id): "Dentist"})
+        columns = data['columns']
+        self.assertEqual(list(columns), ['id', 'name', 'category', 'address', 'contact_details', 'district',
+                                         'consultation_fee', 'language', 'language_name', 'languages'])
+        self.assertEqual(columns['id'], [row['id'] for row in rows])
+        self.assertEqual(columns['category'], [row['category'] for row in rows])
+
+    def test_with_sparse_fields(self):
+        data, _ = self.get({'layout': 'columnar', 'fields': 'id,category_name'})
+        self.assertEqual(set(data), {'categories', 'columns'})
+        self.assertEqual(list(data['columns']), ['id', 'category'])
+
+        data, _ = self.get({'layout': 'dictionary', 'fields': 'id,name'})
+        self.assertEqual(data, {'results': [{'id': doctor.id, 'name': doctor.name} for doctor in self.doctors]})
+
+    def test_filters_still_apply(self):
+        data, _ = self.get({'layout': 'columnar', 'category': self.dentist.id})
+        self.assertEqual(data['categories'], {str(self.dentist.id): "Dentist"})
+        self.assertEqual(len(data['columns']['id']), 2)
+
+    def test_unknown_layout(self):
+        response = self.client.get(self.url, {'layout': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('layout', response.data)
+
+    @override_settings(DOCTOR_INDEX_ENABLED=True, DOCTOR_ROW_CACHE_ENABLED=True, DOCTOR_LIST_COALESCE_TTL=5)
+    def test_index_row_cache_and_coalescing(self):
+        index.invalidate()
+        self.addCleanup(index.invalidate)
+        self.addCleanup(cache.clear)
+        expected, _ = self.get({'layout': 'columnar'})
+        self.assertEqual(expected['columns']['id'], [doctor.id for doctor in self.doctors])
+        self.assertEqual(self.get({'layout': 'columnar'})[0], expected)
+        self.assertIsInstance(self.get({})[0], list)
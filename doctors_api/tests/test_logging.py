@@ -0,0 +1,127 @@
+from unittest import mock
+from pathlib import Path
+import json
+import logging
+import multiprocessing
+import tempfile
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from doctors import log
+from doctors_api.models import Category
+
+
+def record(level=logging.INFO, msg="hello %s", args=("world",), **extra):
+    result = logging.LogRecord('doctors.test', level, __file__, 1, msg, args, None)
+    result.__dict__.update(extra)
+    return result
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def write_records(filename, count):
+    handler = log.LockedRotatingFileHandler(filename, maxBytes=2000, backupCount=1000, delay=True)
+    for i in range(count):
+        handler.emit(record(msg="line %d", args=(i,)))
+    handler.close()
+
+
+class StructuredLoggingTest(SimpleTestCase):
+    def test_json_records(self):
+        formatter = log.JSONFormatter()
+        data = json.loads(formatter.format(record(request_id='abc', status=200, queries=3)))
+        self.assertEqual(data['message'], "hello world")
+        self.assertEqual(data['level'], "INFO")
+        self.assertEqual((data['request_id'], data['status'], data['queries']), ('abc', 200, 3))
+        self.assertNotIn('duration_ms', data)
+
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            failed = record(level=logging.ERROR)
+            failed.exc_info = __import__('sys').exc_info()
+        self.assertIn('ZeroDivisionError', json.loads(formatter.format(failed))['exception'])
+
+    def test_sampling_keeps_warnings(self):
+        sampling = log.SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(record()))
+        self.assertTrue(sampling.filter(record(level=logging.WARNING)))
+        self.assertTrue(log.SamplingFilter(rate=1).filter(record()))
+
+    def test_queue_handler_writes_from_listener_thread(self):
+        target = ListHandler()
+        handler = log.QueueHandler([target])
+        handler.emit(record())
+        first = handler.listener
+        # a forked worker starts its own queue and listener
+        with mock.patch('os.getpid', return_value=-1):
+            handler.emit(record(msg="after fork", args=()))
+        self.assertIsNot(handler.listener, first)
+        first.stop()
+        with mock.patch('os.getpid', return_value=-1):
+            handler.stop()
+
+        self.assertEqual([r.msg for r in target.records], ["hello world", "after fork"])
+        self.assertIsNone(target.records[0].args)
+
+    def test_processes_share_rotating_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = str(Path(directory) / 'general.log')
+            context = multiprocessing.get_context('fork')
+            processes = [context.Process(target=write_records, args=(filename, 200)) for _ in range(4)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+
+            files = list(Path(directory).glob('general.log*'))
+            lines = [line for path in files if not path.name.endswith('.lock') for line in path.read_text().splitlines()]
+            self.assertGreater(len(files), 2)
+            self.assertEqual(len(lines), 800)
+            self.assertTrue(all(line.startswith('line ') for line in lines))
+
+    def test_timed_handler_follows_rollover_of_another_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = str(Path(directory) / 'general.log')
+            handler = log.LockedTimedRotatingFileHandler(filename, when='midnight')
+            handler.emit(record())
+            Path(filename).rename(filename + '.old')
+            handler.emit(record(msg="new file", args=()))
+            handler.close()
+            self.assertEqual(Path(filename).read_text(), "new file\n")
+
+
+class RequestLogMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Category.objects.create(name="Cardiologist")
+
+    def test_request_record(self):
+        with self.assertLogs('doctors.request', 'INFO') as logs:
+            response = self.client.get(reverse('doctor-list'), HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+        entry = logs.records[0]
+        self.assertEqual((entry.method, entry.path, entry.status), ('GET', '/doctor/', 200))
+        self.assertEqual(entry.queries, 1)
+        self.assertGreater(entry.duration_ms, 0)
+
+    def test_invalid_request_id_replaced(self):
+        response = self.client.get(reverse('doctor-list'), HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_records_tagged_with_request_id(self):
+        context = log.RequestContextFilter()
+        token = log.request_id.set('req-2')
+        try:
+            entry = record()
+            context.filter(entry)
+        finally:
+            log.request_id.reset(token)
+        self.assertEqual(entry.request_id, 'req-2')
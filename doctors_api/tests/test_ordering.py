@@ -0,0 +1,182 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.ordering import ORDERINGS, decode_cursor, encode_cursor
+from doctors_api import index
+import json
+
+# sqlite_stat1 of a directory with 120,000 doctors, as written by ANALYZE
+PRODUCTION_STATISTICS = [
+    ('doctors_api_doctor', 'doctor_name_idx', '120010 170'),
+    ('doctors_api_doctor', 'doctor_inactive_name_idx', '2514 4'),
+    ('doctors_api_doctor', 'doctor_active_fee_idx', '117496 1175'),
+    ('doctors_api_doctor', 'doctor_active_updated_idx', '117496 1'),
+    ('doctors_api_doctor', 'unique_active_doctor', '117496 1'),
+    ('doctors_api_doctor', 'doctors_api_doctor_district_id_c91dfd2d', '120010 8573'),
+    ('doctors_api_doctor', 'doctors_api_doctor_category_id_debad1d2', '120010 751'),
+    ('doctors_api_category', 'category_name_idx', '160 1'),
+    ('doctors_api_district', 'district_name_idx', '14 1'),
+]
+
+
+class ListOrderingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        # names out of id order, and a name shared by two rows
+        self.categories = [Category.objects.create(name=name) for name in ("Dermatologist", "Cardiologist", "Cardiologist")]
+        self.districts = [District.objects.create(name=name) for name in ("Wan Chai", "Central", "Kowloon")]
+        now = timezone.now()
+        self.doctors = []
+        for i, (name, fee) in enumerate([
+            ("Dr. Chan", "300"), ("Dr. Au", "200"), ("Dr. Chan", "200"), ("Dr. Wong", "500"),
+            ("Dr. Lee", "300"), ("Dr. Au", "100"), ("Dr. Ho", "200"),
+        ]):
+            doctor = Doctor.objects.create(
+                name=name,
+                address=f"{i} Medical Street",
+                contact_details="Phone: +852 1234 5678",
+                category=self.categories[i % 3],
+                district=self.districts[i % 3],
+                language="en",
+                consultation_fee=Decimal(fee),
+            )
+            self.doctors.append(doctor)
+        # a few share their update time
+        for i, doctor in enumerate(self.doctors):
+            Doctor.objects.filter(pk=doctor.pk).update(updated_at=now - timedelta(minutes=i // 2))
+            doctor.refresh_from_db()
+        self.doctors[6].delete()
+        self.active = self.doctors[:6]
+
+    def expected(self, ordering):
+        keys = {
+            'name': lambda doctor: (doctor.name, doctor.pk),
+            'consultation_fee': lambda doctor: (doctor.consultation_fee, doctor.pk),
+            'updated_at': lambda doctor: (doctor.updated_at, doctor.pk),
+            'district_name': lambda doctor: (doctor.district.name, doctor.district_id, doctor.pk),
+            'category_name': lambda doctor: (doctor.category.name, doctor.category_id, doctor.pk),
+        }
+        key = keys[ordering.lstrip('-')]
+        return [doctor.pk for doctor in sorted(self.active, key=key, reverse=ordering.startswith('-'))]
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        data = json.loads(response.content)
+        if isinstance(data, dict):
+            data = data['results']
+        return [doctor['id'] for doctor in data]
+
+    def test_orderings(self):
+        for name in ORDERINGS:
+            for ordering in (name, '-' + name):
+                with self.subTest(ordering):
+                    self.assertEqual(self.ids(self.client.get(self.url, {'ordering': ordering})), self.expected(ordering))
+
+    def test_keyset_pages(self):
+        for name in ORDERINGS:
+            for ordering in (name, '-' + name):
+                with self.subTest(ordering):
+                    ids = []
+                    response = self.client.get(self.url, {'ordering': ordering, 'page_size': 2})
+                    while True:
+                        page = self.ids(response)
+                        self.assertLessEqual(len(page), 2)
+                        ids.extend(page)
+                        if response.data['next'] is None:
+                            break
+                        response = self.client.get(response.data['next'])
+                    self.assertEqual(ids, self.expected(ordering))
+
+    def test_default_page_ordering_and_filters(self):
+        response = self.client.get(self.url, {'page_size': 10, 'min_consultation_fee': 200})
+        fees = {doctor.pk: doctor.consultation_fee for doctor in self.active}
+        self.assertEqual(self.ids(response), [pk for pk in self.expected('name') if fees[pk] >= 200])
+        self.assertIsNone(response.data['next'])
+
+    def test_page_with_layout(self):
+        response = self.client.get(self.url, {'ordering': '-consultation_fee', 'page_size': 3, 'layout': 'columnar', 'fields': 'id,district_name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['columns']['id'], self.expected('-consultation_fee')[:3])
+        self.assertIn('districts', response.data)
+        self.assertIn('cursor=', response.data['next'])
+
+    def test_invalid_parameters(self):
+        for params in (
+            {'ordering': 'address'},
+            {'page_size': 0},
+            {'cursor': 'not a cursor'},
+            {'cursor': encode_cursor('name', ["Dr. Au", 1]), 'ordering': 'consultation_fee'},
+            {'cursor': encode_cursor('name', ["Dr. Au"])},
+            {'cursor': encode_cursor('name', ["x", "y"])},
+            {'cursor': encode_cursor('name', ["x", True])},
+            {'cursor': encode_cursor('name', [1, 1])},
+            {'cursor': encode_cursor('name', ["x", 2 ** 63])},
+            {'cursor': encode_cursor('consultation_fee', ["abc", 1]), 'ordering': 'consultation_fee'},
+            {'cursor': encode_cursor('consultation_fee', [1.5, 1]), 'ordering': 'consultation_fee'},
+            {'cursor': encode_cursor('updated_at', ["notadate", 1]), 'ordering': 'updated_at'},
+            {'cursor': encode_cursor('updated_at', [1, 1]), 'ordering': 'updated_at'},
+            {'cursor': encode_cursor('updated_at', ["2024-01-01T00:00:00", 1]), 'ordering': 'updated_at'},
+            {'cursor': encode_cursor('updated_at', ["0001-01-01T00:00:00+14:00", 1]), 'ordering': 'updated_at'},
+            {'cursor': encode_cursor('district_name', ["Central", "1", 1]), 'ordering': 'district_name'},
+        ):
+            with self.subTest(params):
+                self.assertEqual(self.client.get(self.url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cursor_round_trip(self):
+        updated_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor('-updated_at', (updated_at, 12))), ('-updated_at', [updated_at, 12]))
+        self.assertEqual(decode_cursor(encode_cursor('district_name', ("中西區", 3, 12))), ('district_name', ["中西區", 3, 12]))
+
+    @override_settings(DOCTOR_INDEX_ENABLED=True, DOCTOR_ROW_CACHE_ENABLED=True, DOCTOR_LIST_COALESCE_TTL=5)
+    def test_index_row_cache_and_coalescing(self):
+        index.invalidate()
+        cache.clear()
+        for ordering in ('-consultation_fee', 'district_name'):
+            self.assertEqual(self.ids(self.client.get(self.url, {'ordering': ordering})), self.expected(ordering))
+        response = self.client.get(self.url, {'ordering': 'updated_at', 'page_size': 4})
+        self.assertEqual(self.ids(response), self.expected('updated_at')[:4])
+
+    def test_index_backed_with_production_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("DELETE FROM sqlite_stat1")
+            cursor.executemany("INSERT INTO sqlite_stat1 (tbl, idx, stat) VALUES (%s, %s, %s)", PRODUCTION_STATISTICS)
+            # reload the statistics
+            cursor.execute("ANALYZE sqlite_schema")
+        self.addCleanup(self.drop_statistics)
+
+        for name in ORDERINGS:
+            for ordering in (name, '-' + name):
+                response = self.client.get(self.url, {'ordering': ordering, 'page_size': 2})
+                for url, params in ((self.url, {'ordering': ordering, 'page_size': 2}), (response.data['next'], None)):
+                    with self.subTest(ordering, url=url):
+                        plan = self.page_query_plan(url, params)
+                        self.assertFalse([step for step in plan if 'TEMP B-TREE' in step], plan)
+
+    def drop_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM sqlite_stat1")
+            cursor.execute("ANALYZE sqlite_schema")
+
+    def page_query_plan(self, url, params):
+        """The plan of the query selecting the keys of the page."""
+        queries = []
+
+        def record(execute, sql, sql_params, many, context):
+            queries.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.client.get(url, params)
+        sql, sql_params = next(query for query in queries if query[0].startswith('SELECT') and 'LIMIT' in query[0])
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, sql_params)
+            return [row[3] for row in cursor.fetchall()]
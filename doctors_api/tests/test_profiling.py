@@ -0,0 +1,94 @@
+from io import StringIO
+from pathlib import Path
+import pstats
+import tempfile
+import threading
+import time
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from decimal import Decimal
+from doctors.profiling import StackSampler, check_token, make_token
+from doctors_api.models import Doctor, Category, District
+
+
+def wait_a_little():
+    time.sleep(0.05)
+
+
+class StackSamplerTest(SimpleTestCase):
+    def test_collapsed_stacks(self):
+        with StackSampler(threading.get_ident()) as sampler:
+            wait_a_little()
+        lines = sampler.collapsed().decode().splitlines()
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(stack.endswith(f'{__name__}.wait_a_little'))
+        self.assertIn(f'{__name__}.StackSamplerTest.test_collapsed_stacks;', stack)
+        self.assertGreater(int(count), 5)
+
+    def test_tokens(self):
+        self.assertEqual(check_token(make_token('alice')), 'alice')
+        self.assertIsNone(check_token('alice'))
+        with override_settings(PROFILING_TOKEN_MAX_AGE=-1):
+            self.assertIsNone(check_token(make_token('alice')))
+
+    def test_profile_token_command(self):
+        stdout = StringIO()
+        call_command('profile_token', 'alice', stdout=stdout, stderr=StringIO())
+        self.assertEqual(check_token(stdout.getvalue().strip()), 'alice')
+
+
+@override_settings(PROFILING=True)
+class ProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.token = make_token('alice')
+        Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=Category.objects.create(name="Cardiologist"),
+            district=District.objects.create(name="Central"),
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def test_sampled_profile_returned(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE=self.token)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertEqual(response['X-Profile-Status'], '200')
+        for line in response.content.decode().splitlines():
+            self.assertRegex(line, r'^\S.* \d+$')
+
+    def test_cprofile_with_query_parameters(self):
+        response = self.client.get(self.url, {'profile': self.token, 'profile_mode': 'cprofile', 'fields': 'id'})
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        with tempfile.NamedTemporaryFile() as file:
+            file.write(response.content)
+            file.flush()
+            functions = {name for _, _, name in pstats.Stats(file.name).stats}
+        self.assertIn('list', functions)
+
+    def test_invalid_token_ignored(self):
+        response = self.client.get(self.url, {'profile': 'forged', 'fields': 'id'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(len(response.json()), 1)
+
+    @override_settings(PROFILING=False)
+    def test_disabled(self):
+        response = self.client.get(self.url, HTTP_X_PROFILE=self.token)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_sampling_into_the_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(PROFILING_SAMPLE_RATE=1, PROFILING_DIR=directory.name, PROFILING_KEEP=2):
+            client = APIClient()
+            for _ in range(3):
+                response = client.get(self.url)
+                self.assertEqual(response['Content-Type'], 'application/json')
+        profiles = sorted(Path(directory.name).iterdir())
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(all(path.suffix == '.collapsed' and '-doctor-' in path.name for path in profiles))
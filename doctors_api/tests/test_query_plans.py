@@ -0,0 +1,189 @@
+from itertools import combinations
+from pathlib import Path
+import json
+import os
+import unittest
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District, SpokenLanguage
+from doctors_api import autocomplete, index, reference
+from doctors_api.ordering import ORDERINGS
+
+GOLDEN_FILE = Path(__file__).resolve().parent / 'query_plans.json'
+UPDATE = os.environ.get('UPDATE_QUERY_PLANS') == '1'
+
+# a value for every DoctorFilter parameter, the ids are filled in by setUp
+FILTERS = {
+    'min_consultation_fee': '150',
+    'max_consultation_fee': '400',
+    'category': None,
+    'district': None,
+    'language': 'en,cantonese',
+    'contact': '+852 1234 5678',
+}
+
+class QueryRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+def explain(sql, params):
+    """The plan of a SELECT as indented lines, one per step."""
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        rows = cursor.fetchall()
+    depths = {0: -1}
+    lines = []
+    for step, parent, _, detail in rows:
+        depths[step] = depths.get(parent, -1) + 1
+        lines.append('  ' * depths[step] + detail)
+    return lines
+
+def costly_steps(plans):
+    """Full scans and temporary sorts, the steps that grow with the table."""
+    return sorted({
+        line.strip() for plan in plans for line in plan
+        if line.strip().startswith('SCAN ') or 'TEMP B-TREE' in line
+    })
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "the recorded plans are SQLite's")
+class QueryPlanTest(TestCase):
+    """
+    Query count and query plan regression tests for the API endpoints.
+
+    Every case is requested in every language. Its number of queries and the
+    SQLite plans (EXPLAIN QUERY PLAN) of its SELECTs are compared with
+    query_plans.json: more queries, or a table scan or temporary sort that the
+    recorded plans do not have, fail the test. After an intended change,
+    re-record the file with
+
+        UPDATE_QUERY_PLANS=1 python manage.py test doctors_api.tests.test_query_plans
+    """
+    recorded = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.golden = {} if UPDATE or not GOLDEN_FILE.exists() else json.loads(GOLDEN_FILE.read_text())
+        cardiologist = Category.objects.create(name="Cardiologist")
+        dermatologist = Category.objects.create(name="Dermatologist")
+        central = District.objects.create(name="Central")
+        kowloon = District.objects.create(name="Kowloon")
+        cls.doctors = []
+        for i, (category, district, language) in enumerate([
+            (cardiologist, central, 'en'),
+            (dermatologist, kowloon, 'cantonese'),
+            (cardiologist, kowloon, 'mandarin'),
+        ]):
+            cls.doctors.append(Doctor.objects.create(
+                name=f"Dr. {i}",
+                address=f"{i} Medical Street",
+                contact_details=f"Phone: +852 1234 567{i}, doctor{i}@example.com",
+                category=category,
+                district=district,
+                language=language,
+                consultation_fee=Decimal(200 + 100 * i),
+            ))
+        SpokenLanguage.objects.create(doctor=cls.doctors[0], language='cantonese')
+        cls.filters = {**FILTERS, 'category': cardiologist.id, 'district': kowloon.id}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if UPDATE and cls.recorded:
+            GOLDEN_FILE.write_text(json.dumps(dict(sorted(cls.recorded.items())), indent=1, ensure_ascii=False) + '\n')
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def reset(self):
+        # every case starts from cold per-worker snapshots and caches
+        for module in (autocomplete, index, reference):
+            module.invalidate()
+        cache.clear()
+
+    def record(self, method, url, data=None):
+        """Request ``url`` in every language and return its query count and plans."""
+        results = []
+        for language, _ in settings.LANGUAGES:
+            self.reset()
+            recorder = QueryRecorder()
+            # writes are rolled back, every language starts from the same rows
+            with transaction.atomic():
+                with connection.execute_wrapper(recorder):
+                    if method == 'get':
+                        response = self.client.get(url, data, HTTP_ACCEPT_LANGUAGE=language)
+                    else:
+                        response = self.client.post(url, data, format='json', HTTP_ACCEPT_LANGUAGE=language)
+                self.assertLess(response.status_code, 300, response.content)
+                plans = [explain(sql, params) for sql, params in recorder.queries if sql.startswith('SELECT')]
+                transaction.set_rollback(True)
+            results.append({'queries': len(recorder.queries), 'plans': plans})
+        for result in results[1:]:
+            self.assertEqual(result, results[0], "the queries differ between languages")
+        self.reset()
+        return results[0]
+
+    def check(self, case, method, url, data=None):
+        with self.subTest(case):
+            result = self.record(method, url, data)
+            if UPDATE:
+                self.recorded[case] = result
+                return
+            expected = self.golden.get(case)
+            self.assertIsNotNone(expected, f"{case} is not recorded, see QueryPlanTest")
+            self.assertLessEqual(
+                result['queries'], expected['queries'],
+                f"{case} runs {result['queries']} queries instead of {expected['queries']}"
+            )
+            new_steps = set(costly_steps(result['plans'])) - set(costly_steps(expected['plans']))
+            self.assertFalse(new_steps, f"{case} has new scans or sorts:\n" + json.dumps(result['plans'], indent=1))
+
+    def test_doctor_list(self):
+        url = reverse('doctor-list')
+        self.check('doctor-list', 'get', url)
+        for size in range(1, len(FILTERS) + 1):
+            for names in combinations(FILTERS, size):
+                self.check('doctor-list ' + ','.join(names), 'get', url, {name: self.filters[name] for name in names})
+        self.check('doctor-list search', 'get', url, {'search': 'Cardio'})
+        self.check('doctor-list fields', 'get', url, {'fields': 'id,name,district_name'})
+        self.check('doctor-list layout', 'get', url, {'layout': 'columnar'})
+        for name in ORDERINGS:
+            for ordering in (name, '-' + name):
+                self.check(f'doctor-list ordering={ordering}', 'get', url, {'ordering': ordering})
+                self.check(f'doctor-list page ordering={ordering}', 'get', url, {'ordering': ordering, 'page_size': 2})
+                next_page = self.client.get(url, {'ordering': ordering, 'page_size': 2}).data['next']
+                self.check(f'doctor-list next page ordering={ordering}', 'get', next_page)
+
+    def test_doctor_endpoints(self):
+        doctor = self.doctors[0]
+        self.check('doctor-detail', 'get', reverse('doctor-detail', args=[doctor.id]))
+        self.check('doctor-fee-stats', 'get', reverse('doctor-fee-stats'), {'category': self.filters['category']})
+        self.check('doctor-autocomplete', 'get', reverse('doctor-autocomplete'), {'q': 'dr'})
+        self.check('doctor-batch-get', 'get', reverse('doctor-batch-get'), {'ids': ','.join(str(d.id) for d in self.doctors)})
+        self.check('doctor-bulk-create', 'post', reverse('doctor-bulk-create'), [
+            {
+                'name': f"Dr. New {i}",
+                'address': "1 New Street",
+                'contact_details': "Phone: +852 2345 6789",
+                'category': doctor.category_id,
+                'district': doctor.district_id,
+                'language': 'en',
+                'consultation_fee': '500.00',
+                'languages': ['cantonese'],
+            }
+            for i in range(2)
+        ])
+
+    def test_reference_endpoints(self):
+        for basename, model in (('category', Category), ('district', District)):
+            self.check(f'{basename}-list', 'get', reverse(f'{basename}-list'))
+            self.check(f'{basename}-detail', 'get', reverse(f'{basename}-detail', args=[model.objects.first().id]))
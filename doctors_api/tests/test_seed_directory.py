@@ -0,0 +1,106 @@
+from io import StringIO
+from pathlib import Path
+import gzip
+import json
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase
+from doctors_api.management.commands.seed_directory import iter_json_array
+from doctors_api.models import Doctor, Category, District, DoctorContact, SpokenLanguage
+from doctors_api.signals import directory_version, reference_version
+
+FIXTURES = Path(__file__).resolve().parent.parent / 'fixtures'
+
+
+class JSONArrayReaderTest(SimpleTestCase):
+    def test_objects_split_across_chunks(self):
+        objects = [{'pk': i, 'fields': {'name': f"Doctor {i}", 'note': "a, [b] \"c\""}} for i in range(20)]
+        text = json.dumps(objects, indent=2)
+        for chunk_size in (1, 7, 64, len(text)):
+            self.assertEqual(list(iter_json_array(StringIO(text), chunk_size)), objects)
+
+    def test_empty_and_invalid(self):
+        self.assertEqual(list(iter_json_array(StringIO(" [ ] "))), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('{"pk": 1}')))
+        with self.assertRaises(ValueError):
+            list(iter_json_array(StringIO('[{"pk": 1}, {"pk": '), 4))
+
+
+class SeedDirectoryTest(TestCase):
+    def seed(self, *args, **options):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('seed_directory', *args, stdout=StringIO(), **options)
+
+    def test_repository_fixtures(self):
+        self.seed(*(str(FIXTURES / name) for name in ('categories.json', 'districts.json', 'doctors.json')), batch_size=50)
+        self.assertEqual(Category.objects.count(), 160)
+        self.assertEqual(District.objects.count(), 14)
+        doctor = Doctor.objects.get(pk=1)
+        self.assertEqual(doctor.name, "Alice Chan")
+        self.assertEqual(doctor.consultation_fee_cents, 350000)
+        self.assertEqual(Doctor.objects.count(), 10)
+        # the rows the post_save signals add for a saved doctor
+        self.assertEqual(SpokenLanguage.objects.count(), 10)
+        self.assertEqual(list(doctor.contacts.values_list('value', flat=True)), ["5550123"])
+
+    def test_ndjson_and_reseeding(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'directory.ndjson.gz'
+
+        def write(doctor_name):
+            objects = [
+                {'model': 'doctors_api.category', 'pk': 7, 'fields': {'name': "Dentist"}},
+                {'model': 'doctors_api.district', 'pk': 3, 'fields': {'name': "Central"}},
+                {'model': 'doctors_api.doctor', 'pk': 5, 'fields': {
+                    'name': doctor_name, 'address': "1 Main Street", 'contact_details': "Phone: 2345 6789",
+                    'category': 7, 'district': 3, 'language': 'cantonese', 'consultation_fee': "450.50",
+                }},
+            ]
+            with gzip.open(path, 'wt') as file:
+                file.writelines(json.dumps(obj) + '\n' for obj in objects)
+
+        write("Dr. Chan")
+        versions = directory_version(), reference_version()
+        self.seed(str(path))
+        self.assertEqual((directory_version(), reference_version()), (versions[0] + 1, versions[1] + 1))
+
+        # existing primary keys are updated, not duplicated
+        write("Dr. Wong")
+        self.seed(str(path))
+        self.assertEqual(list(Doctor.objects.values_list('pk', 'name')), [(5, "Dr. Wong")])
+        self.assertEqual(DoctorContact.objects.count(), 1)
+        self.assertEqual(list(SpokenLanguage.objects.values_list('language', flat=True)), ['cantonese'])
+
+    def test_synthetic(self):
+        self.seed(str(FIXTURES / 'categories.json'), str(FIXTURES / 'districts.json'), synthetic=300, seed=1, batch_size=64)
+        self.assertEqual(Doctor.objects.count(), 300)
+        first = list(Doctor.objects.order_by('pk').values_list('name', 'consultation_fee'))
+
+        doctor = Doctor.objects.order_by('pk').first()
+        self.assertIn(doctor.language, doctor.spoken_languages.values_list('language', flat=True))
+        self.assertTrue(doctor.contacts.exists())
+
+        # reproducible with the same seed, appended after the existing doctors
+        self.seed(synthetic=300, seed=1)
+        second = list(Doctor.objects.order_by('pk').values_list('name', 'consultation_fee'))[300:]
+        self.assertEqual(second, first)
+
+    def test_synthetic_needs_reference_data(self):
+        with self.assertRaisesMessage(CommandError, "need categories and districts"):
+            self.seed(synthetic=10)
+
+    def test_foreign_keys_checked(self):
+        with self.assertRaises(CommandError):
+            self.seed(str(FIXTURES / 'doctors.json'))
+        self.assertFalse(Doctor.objects.exists())
+
+    def test_unsupported_model(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'users.json'
+        path.write_text(json.dumps([{'model': 'auth.group', 'pk': 1, 'fields': {'name': "staff"}}]))
+        with self.assertRaisesMessage(CommandError, "cannot seed auth.Group objects"):
+            self.seed(str(path))
@@ -0,0 +1,56 @@
+from importlib import import_module
+from pathlib import Path
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.test import SimpleTestCase
+
+ROOT = Path(settings.BASE_DIR)
+
+# load the application and its URL configuration, like a worker does
+CODE = "import doctors.wsgi; from django.urls import get_resolver; get_resolver().url_patterns"
+
+# only needed by the admin, sessions and static files
+UNUSED_BY_API = (
+    'django.contrib.auth.hashers',
+    'django.contrib.auth.forms',
+    'django.contrib.contenttypes.models',
+    'django.contrib.sessions.backends.base',
+    'django.contrib.staticfiles.finders',
+    'django.db.migrations',
+)
+
+
+def imported_modules(settings_module):
+    """The modules imported by the application, from python -X importtime."""
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module, DJANGO_SECRET_KEY='importtime')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CODE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return [
+        line.rsplit('|', 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith('import time:') and 'cumulative' not in line
+    ]
+
+
+class ApiSettingsTest(SimpleTestCase):
+    def test_profile_drops_unused_apps(self):
+        api = import_module('doctors.settings_api')
+        self.assertEqual(api.INSTALLED_APPS, ['rest_framework', 'django_filters', 'doctors_api'])
+        self.assertEqual(api.ROOT_URLCONF, 'doctors.urls_api')
+        self.assertIn('django.middleware.locale.LocaleMiddleware', api.MIDDLEWARE)
+        self.assertNotIn('django.contrib.sessions.middleware.SessionMiddleware', api.MIDDLEWARE)
+
+    def test_log_file_opened_lazily(self):
+        self.assertTrue(settings.LOGGING['handlers']['file']['delay'])
+
+    def test_import_time_regression(self):
+        full = imported_modules('doctors.settings')
+        api = imported_modules('doctors.settings_api')
+        self.assertLess(len(api), len(full))
+        for module in UNUSED_BY_API:
+            self.assertIn(module, full)
+            self.assertNotIn(module, api)
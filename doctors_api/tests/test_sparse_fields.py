@@ -0,0 +1,86 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from doctors_api.models import Doctor, Category, District
+from doctors_api.index import invalidate
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse('doctor-list')
+        self.doctor = Doctor.objects.create(
+            name="Dr. John Smith",
+            address="123 Medical Street, Central",
+            contact_details="Phone: +852 1234 5678",
+            category=Category.objects.create(name="Cardiologist"),
+            district=District.objects.create(name="Central"),
+            language="en",
+            consultation_fee=Decimal("200.00")
+        )
+
+    def get(self, url, params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query['sql'] for query in queries]
+
+    def test_fields_narrow_output_and_select_list(self):
+        response, queries = self.get(self.url, {'fields': 'id,name,district'})
+        self.assertEqual(response.data, [{'id': self.doctor.id, 'name': "Dr. John Smith", 'district': self.doctor.district_id}])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0])
+        self.assertNotIn('address', queries[0])
+
+    def test_names_join_only_their_table(self):
+        response, queries = self.get(self.url, {'fields': 'id,category_name'})
+        self.assertEqual(response.data, [{'id': self.doctor.id, 'category_name': "Cardiologist"}])
+        self.assertIn('doctors_api_category', queries[0])
+        self.assertNotIn('doctors_api_district', queries[0])
+
+    def test_omit(self):
+        response, queries = self.get(self.url, {'omit': 'address, contact_details,languages'})
+        self.assertEqual(
+            list(response.data[0]),
+            ['id', 'name', 'category', 'category_name', 'district', 'district_name',
+             'consultation_fee', 'language', 'language_name']
+        )
+        # no spoken languages prefetch
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('contact_details', queries[0])
+
+    def test_fields_and_omit_combined(self):
+        response, _ = self.get(self.url, {'fields': 'id,name,languages', 'omit': 'name'})
+        self.assertEqual(response.data, [{'id': self.doctor.id, 'languages': ['en']}])
+
+    def test_retrieve_and_batch_get(self):
+        response, _ = self.get(reverse('doctor-detail', args=[self.doctor.id]), {'fields': 'name,language_name'})
+        self.assertEqual(response.data, {'name': "Dr. John Smith", 'language_name': "English"})
+
+        response, queries = self.get(reverse('doctor-batch-get'), {'ids': self.doctor.id, 'fields': 'name'})
+        self.assertEqual(response.data['results'], [{'name': "Dr. John Smith"}])
+        self.assertEqual(len(queries), 1)
+
+    def test_unknown_field(self):
+        response = self.client.get(self.url, {'fields': 'id,password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+    def test_filters_still_apply(self):
+        response, _ = self.get(self.url, {'fields': 'id', 'search': 'Cardio', 'min_consultation_fee': '150'})
+        self.assertEqual(response.data, [{'id': self.doctor.id}])
+
+    @override_settings(DOCTOR_INDEX_ENABLED=True, DOCTOR_ROW_CACHE_ENABLED=True)
+    def test_index_and_row_cache(self):
+        invalidate()
+        self.addCleanup(invalidate)
+        self.client.get(self.url, {'language': 'en'})
+        response, queries = self.get(self.url, {'fields': 'id,name', 'language': 'en'})
+        self.assertEqual(response.json(), [{'id': self.doctor.id, 'name': "Dr. John Smith"}])
+        # the rows by primary key, answered by the index without a join
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('JOIN', queries[0])
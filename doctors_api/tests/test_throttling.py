@@ -0,0 +1,78 @@
+from unittest import mock
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from doctors_api.models import Category
+from doctors_api.throttling import parse_rate
+from doctors_api import reference
+
+RATES = {'read': '4/min', 'list': '3/min', 'search': '2/min', 'write': '1/min'}
+
+
+class ParseRateTest(SimpleTestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('60/min'), (60, 60))
+        self.assertEqual(parse_rate('10/s'), (10, 1))
+        self.assertEqual(parse_rate('1000/hour'), (1000, 3600))
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES=RATES, THROTTLE_API_KEYS={'partner': '2'})
+class TokenBucketThrottleTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.now = 1_000_000.0
+        patcher = mock.patch('doctors_api.throttling.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        caches['throttle'].clear()
+        self.addCleanup(caches['throttle'].clear)
+        reference.invalidate()
+        self.addCleanup(reference.invalidate)
+
+    def statuses(self, url, count, **kwargs):
+        return [self.client.get(url, **kwargs).status_code for _ in range(count)]
+
+    def test_burst_then_refill(self):
+        url = reverse('doctor-list')
+        responses = [self.client.get(url) for _ in range(4)]
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200, 429])
+        self.assertEqual([response['RateLimit-Remaining'] for response in responses], ['2', '1', '0', '0'])
+        self.assertEqual(responses[0]['RateLimit-Policy'], '3;w=60')
+        self.assertEqual(responses[0]['RateLimit-Limit'], '3')
+        self.assertEqual(responses[2]['RateLimit-Reset'], '60')
+        self.assertEqual(responses[3]['Retry-After'], '20')
+
+        # one token drips in every 20 seconds
+        self.now += 20
+        self.assertEqual(self.statuses(url, 2), [200, 429])
+        self.now += 60
+        self.assertEqual(self.statuses(url, 4), [200, 200, 200, 429])
+
+    def test_scopes_have_separate_buckets(self):
+        self.assertEqual(self.statuses(reverse('doctor-list'), 3), [200] * 3)
+        self.assertEqual(self.statuses(reverse('doctor-list'), 1, data={'search': 'Cardio'}), [200])
+        self.assertEqual(self.statuses(reverse('doctor-autocomplete'), 2, data={'q': 'jo'}), [200, 429])
+        Category.objects.create(name="Cardiologist")
+        self.assertEqual(self.statuses(reverse('category-list'), 5), [200] * 4 + [429])
+
+        response = self.client.post(reverse('doctor-bulk-create'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(reverse('doctor-bulk-create'), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_clients_have_separate_buckets(self):
+        url = reverse('doctor-list')
+        self.assertEqual(self.statuses(url, 4), [200] * 3 + [429])
+        self.assertEqual(self.statuses(url, 1, REMOTE_ADDR='10.0.0.2'), [200])
+        # unknown keys are throttled by IP address
+        self.assertEqual(self.statuses(url, 1, HTTP_X_API_KEY='guess'), [429])
+        # a known key has its own bucket, twice the size
+        self.assertEqual(self.statuses(url, 7, HTTP_X_API_KEY='partner'), [200] * 6 + [429])
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('doctor-list'))
+        self.assertNotIn('RateLimit-Limit', response)
+        self.assertEqual(self.statuses(reverse('doctor-list'), 5), [200] * 5)
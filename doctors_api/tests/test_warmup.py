@@ -0,0 +1,50 @@
+from unittest import mock
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import trans_real
+from rest_framework.test import APIClient
+from rest_framework import status
+from doctors_api.models import Category, District
+from doctors_api import reference, warmup
+
+
+class WarmUpTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Category.objects.create(name="Cardiologist")
+        District.objects.create(name="Central")
+
+    def tearDown(self):
+        reference.invalidate()
+
+    def test_prepare_loads_every_catalog(self):
+        with mock.patch.object(trans_real, '_translations', {}):
+            warmup.prepare()
+            self.assertEqual(set(trans_real._translations), {'en', 'zh-hant', 'zh-hans'})
+
+    @override_settings(LOCALE_PATHS=[])
+    def test_missing_catalogs_are_reported(self):
+        with self.assertLogs('doctors_api.warmup', 'WARNING') as logs:
+            warmup.load_translations()
+        self.assertEqual(len(logs.records), 3)
+
+    def test_warm_worker_loads_reference_data(self):
+        warmup.warm_worker()
+        with self.assertNumQueries(0):
+            categories = self.client.get(reverse('category-list'))
+            districts = self.client.get(reverse('district-list'))
+        self.assertEqual([category['name'] for category in categories.data], ["Cardiologist"])
+        self.assertEqual([district['name'] for district in districts.data], ["Central"])
+
+    def test_reference_data_reloaded_after_change(self):
+        warmup.warm_worker()
+        Category.objects.create(name="Allergist")
+        response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([category['name'] for category in response.data], ["Allergist", "Cardiologist"])
+
+    def test_database_errors_do_not_stop_the_worker(self):
+        with mock.patch.object(warmup, 'get_reference_data', side_effect=DatabaseError), \
+                self.assertLogs('doctors_api.warmup', 'ERROR'):
+            warmup.warm_worker()
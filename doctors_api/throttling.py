@@ -0,0 +1,116 @@
+from math import ceil, floor
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+import logging
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+# list requests with these parameters fall back to LIKE scans, they count as searches
+SEARCH_PARAMS = frozenset(['search', 'contact'])
+
+def parse_rate(rate):
+    """Split "60/min" into ``(60, 60)``: the requests per period and the period in seconds."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0]]
+
+class RateLimit:
+    """The outcome of one throttle check, sent back in the RateLimit headers."""
+    __slots__ = ('scope', 'limit', 'period', 'remaining', 'reset')
+
+    def __init__(self, scope, limit, period, remaining, reset):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+        self.remaining = remaining
+        self.reset = reset
+
+    def headers(self):
+        return {
+            'RateLimit-Policy': f'{self.limit};w={self.period}',
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+        }
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per client and scope, as GCRA: the only state is the time at
+    which the bucket will be full again, one cache read and, when the request
+    is let through, one write.
+
+    A bucket holds ``limit`` tokens and refills at ``limit`` per period, for
+    the rates in ``THROTTLE_RATES``, e.g. ``{"list": "60/min"}``. Clients are
+    told apart by their API key when it is one of ``THROTTLE_API_KEYS``
+    (which also scales their rates), otherwise by IP address.
+    """
+    cache = caches['throttle']
+
+    def get_scope(self, request, view):
+        action = getattr(view, 'action', None)
+        scope = getattr(view, 'throttle_scopes', {}).get(action)
+        if scope is None:
+            scope = 'read' if request.method in SAFE_METHODS else 'write'
+        if scope == 'list' and not SEARCH_PARAMS.isdisjoint(request.query_params):
+            scope = 'search'
+        return scope
+
+    def get_client(self, request):
+        """Return the bucket key of the client and the factor its rates are scaled by."""
+        api_key = request.headers.get('X-API-Key')
+        if api_key and api_key in settings.THROTTLE_API_KEYS:
+            digest = hashlib.sha1(api_key.encode()).hexdigest()
+            return f'key:{digest}', float(settings.THROTTLE_API_KEYS[api_key])
+        return f'ip:{self.get_ident(request)}', 1
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = self.get_scope(request, view)
+        rate = settings.THROTTLE_RATES.get(scope)
+        if not rate:
+            return True
+
+        client, factor = self.get_client(request)
+        count, period = parse_rate(rate)
+        limit = max(1, int(count * factor))
+        interval = period / limit
+        key = f'throttle:{scope}:{client}'
+
+        now = time.time()
+        # the bucket is full again at ``full_at``, every request moves it ``interval`` later
+        full_at = max(self.cache.get(key, now), now) + interval
+        allowed = full_at - now <= period
+        if allowed:
+            self.cache.set(key, full_at, timeout=ceil(full_at - now))
+        else:
+            full_at -= interval
+            # the next token drips in once the bucket is one interval below the limit
+            self.wait_seconds = full_at - now - period + interval
+
+        request.rate_limit = RateLimit(
+            scope, limit, period,
+            remaining=max(0, floor((period - (full_at - now)) / interval)),
+            reset=ceil(full_at - now),
+        )
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
+
+class RateLimitHeadersMixin:
+    """Adds the RateLimit headers of the throttle check to the view's responses."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            for header, value in rate_limit.headers().items():
+                response[header] = value
+        return response
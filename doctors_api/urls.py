@@ -1,5 +1,8 @@
 from django.urls import path, include
+from rest_framework.renderers import JSONOpenAPIRenderer
 from rest_framework.routers import DefaultRouter
+from rest_framework.schemas import get_schema_view
+from .schema import SchemaGenerator
 from .views import DoctorViewSet, DistrictViewSet, CategoryViewSet
 
 # urlpatterns = [
@@ -14,4 +17,5 @@ router.register(r'category', CategoryViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('schema/', get_schema_view(generator_class=SchemaGenerator, renderer_classes=[JSONOpenAPIRenderer]), name='openapi-schema'),
 ]
\ No newline at end of file
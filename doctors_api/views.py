@@ -1,20 +1,60 @@
+from math import ceil, floor
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, OperationalError
+from django.db.models import Exists, OuterRef
+from django.http import HttpResponse
 from rest_framework import viewsets, filters, status
-from django_filters.rest_framework import DjangoFilterBackend, FilterSet, NumberFilter, CharFilter
-from .models import Doctor, District, Category
-from .serializers import DoctorSerializer, DistrictSerializer, CategorySerializer
-from django.utils.translation import gettext as _
+from django_filters.rest_framework import DjangoFilterBackend, FilterSet, NumberFilter, CharFilter, ChoiceFilter
+from .models import Doctor, DoctorContact, SpokenLanguage, District, Category, parse_language_codes
+from .contacts import normalize_contact
+from .serializers import DoctorSerializer, DistrictSerializer, CategorySerializer, FeeStatsQuerySerializer, BatchGetSerializer, BulkCreateQuerySerializer, SparseFieldsQuerySerializer, ListLayoutQuerySerializer, ListPageQuerySerializer, AutocompleteQuerySerializer
+from .index import get_index
+from .autocomplete import get_autocomplete
+from .reference import get_reference_data
+from .cache import get_row_cache, updated_stamp
+from .coalesce import SingleFlight, request_key
+from .ordering import ORDERINGS, after_row, encode_cursor, order_doctors
+from .signals import snapshot_max_age
+from .schema import AutoSchema, autocomplete_schema, batch_get_request_schema, batch_get_schema, bulk_create_request_schema, bulk_create_schema, doctor_list_schema, fee_stats_schema
+from .stats import fee_statistics
+from .throttling import RateLimitHeadersMixin
+from django.utils.translation import gettext_lazy, get_language
 from rest_framework import mixins
 from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from doctors.compression import SHARED_PRECOMPRESSORS, Precompressed
+from doctors.db_routers import use_primary
+from doctors.db_writes import is_busy, run_write
 import logging
 
 logger = logging.getLogger(__name__)
+
+def renders_compact_json(request):
+    """Whether the negotiated response is plain JSON, which views may render themselves."""
+    return request.accepted_renderer.format == 'json' and 'indent' not in request.accepted_media_type
+
+class FeeFilter(NumberFilter):
+    """Compares a fee in dollars against the indexed integer cents column."""
+    def filter(self, qs, value):
+        if value is not None:
+            value = ceil(value * 100) if self.lookup_expr == 'gte' else floor(value * 100)
+        return super().filter(qs, value)
+
 class DoctorFilter(FilterSet):
-    min_consultation_fee = NumberFilter(field_name="consultation_fee", lookup_expr='gte')
-    max_consultation_fee = NumberFilter(field_name="consultation_fee", lookup_expr='lte')
+    min_consultation_fee = FeeFilter(field_name="consultation_fee_cents", lookup_expr='gte')
+    max_consultation_fee = FeeFilter(field_name="consultation_fee_cents", lookup_expr='lte')
     category = NumberFilter(field_name="category__id")
     district = NumberFilter(field_name="district__id")
-    language = CharFilter(field_name="language", lookup_expr='iexact')
+    language = CharFilter(method='filter_language')
+    contact = CharFilter(method='filter_contact')
+    ordering = ChoiceFilter(
+        choices=[(value, value) for name in ORDERINGS for value in (name, '-' + name)],
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Doctor
@@ -23,10 +63,91 @@ class DoctorFilter(FilterSet):
             'max_consultation_fee', 
             'category', 
             'district', 
-            'language'
+            'language',
+            'contact',
+            'ordering'
             ]
-        
+
+    def filter_language(self, queryset, name, value):
+        # any of the comma separated languages, as a semi-join so doctors are never duplicated
+        codes = parse_language_codes(value)
+        if not codes:
+            return queryset
+        return queryset.filter(
+            Exists(SpokenLanguage.objects.filter(doctor=OuterRef('pk'), language__in=codes))
+        )
+
+    def filter_ordering(self, queryset, name, value):
+        return order_doctors(queryset, value) if value else queryset
+
+    def filter_contact(self, queryset, name, value):
+        # exact match on the normalized value, e.g. "+852 1234-5678" finds "Phone: +85212345678"
+        contact = normalize_contact(value)
+        if contact is None:
+            return queryset
+        return queryset.filter(
+            Exists(DoctorContact.objects.filter(doctor=OuterRef('pk'), value=contact[1]))
+        )
+
+# query parameters the in-memory index can answer on its own
+INDEXED_FILTERS = frozenset([
+    'min_consultation_fee',
+    'max_consultation_fee',
+    'category',
+    'district',
+    'language',
+])
+
+# query parameters selecting the serialized fields rather than the doctors
+SPARSE_FIELDS_PARAMS = frozenset(['fields', 'omit'])
+
+# query parameter selecting the shape of the doctor list
+LAYOUT_PARAM = 'layout'
+
+# query parameters asking for one page of the doctor list
+PAGE_PARAMS = frozenset(['page_size', 'cursor'])
+
+# the compact list layouts replace each name field by a side table of the
+# referenced ids, "name field": ("id field", "side table")
+SIDE_TABLES = {
+    'category_name': ('category', 'categories'),
+    'district_name': ('district', 'districts'),
+}
+
+# the model columns each DoctorSerializer field reads, "relation__column"
+# ones need the join, "languages" the spoken languages prefetch
+FIELD_COLUMNS = {
+    'id': ['id'],
+    'name': ['name'],
+    'category': ['category'],
+    'category_name': ['category__name'],
+    'address': ['address'],
+    'contact_details': ['contact_details'],
+    'district': ['district'],
+    'district_name': ['district__name'],
+    'consultation_fee': ['consultation_fee'],
+    'language': ['language'],
+    'language_name': ['language'],
+    'languages': [],
+}
+
+# coalesces identical concurrent doctor-list requests of this worker
+list_flight = SingleFlight()
+
+class DatabaseBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = gettext_lazy("The directory is busy, retry the request.")
+    default_code = 'database_busy'
+    # seconds, sent as Retry-After
+    wait = 1
+
+class ListingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = gettext_lazy("Some of the doctors were listed in the meantime, retry the request.")
+    default_code = 'listing_conflict'
+
 class DoctorViewSet(
+    RateLimitHeadersMixin,
     mixins.ListModelMixin, 
     mixins.RetrieveModelMixin,
     mixins.CreateModelMixin,
@@ -37,27 +158,369 @@ class DoctorViewSet(
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_class = DoctorFilter
     search_fields = ['category__name', 'district__name', 'language']
-    
+    # token bucket scope of each action, see THROTTLE_RATES
+    throttle_scopes = {
+        'list': 'list',
+        'batch_get': 'list',
+        'fee_stats': 'search',
+        'autocomplete': 'search',
+        'create': 'write',
+        'bulk_create': 'write',
+    }
+    # the examples are replayed by manage.py check_budgets, ids 1 exist in the fixtures
+    schema = AutoSchema(
+        query_serializers={
+            'list': [SparseFieldsQuerySerializer, ListLayoutQuerySerializer, ListPageQuerySerializer],
+            'retrieve': [SparseFieldsQuerySerializer],
+            ('batch_get', 'GET'): [BatchGetSerializer, SparseFieldsQuerySerializer],
+            'batch_get': [SparseFieldsQuerySerializer],
+            'fee_stats': [FeeStatsQuerySerializer],
+            'autocomplete': [AutocompleteQuerySerializer],
+            'bulk_create': [BulkCreateQuerySerializer],
+        },
+        filtered_actions=['fee_stats'],
+        requests={
+            'batch_get': batch_get_request_schema,
+            'bulk_create': bulk_create_request_schema,
+        },
+        responses={
+            'list': doctor_list_schema,
+            'fee_stats': fee_stats_schema,
+            'autocomplete': autocomplete_schema,
+            'batch_get': batch_get_schema,
+            'bulk_create': bulk_create_schema,
+        },
+        examples={
+            'list': {
+                'first_page': {'page_size': 50},
+                'page_by_fee': {'ordering': '-consultation_fee', 'page_size': 50},
+                'category_in_district': {'category': 1, 'district': 1},
+                'fee_range_and_language': {'min_consultation_fee': 200, 'max_consultation_fee': 400, 'language': 'cantonese', 'page_size': 50},
+                'search': {'search': 'Cardio', 'page_size': 50},
+                'columnar': {'layout': 'columnar', 'fields': ['id', 'name', 'district_name'], 'page_size': 200},
+            },
+            'retrieve': {'first': {'id': 1}},
+            ('batch_get', 'GET'): {'three': {'ids': [1, 2, 3]}},
+            'fee_stats': {'district': {'district': 1}},
+            'autocomplete': {'prefix': {'q': 'cha'}},
+        },
+    )
+
+    def get_queryset(self):
+        return self.project(super().get_queryset())
+
+    def perform_create(self, serializer):
+        self.write(serializer)
+
+    def write(self, serializer):
+        """
+        Save in one write transaction, retried while other workers hold the
+        database. There is no update endpoint, so this covers every save.
+        """
+        try:
+            return run_write(serializer.save)
+        except IntegrityError:
+            # a concurrent request listed one of the doctors after the duplicate
+            # check, the unique_active_doctor constraint caught it
+            raise ListingConflict()
+        except OperationalError as error:
+            if not is_busy(error):
+                raise
+            raise DatabaseBusy()
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def requested_fields(self):
+        """The fields selected with ``fields=`` / ``omit=``, or None for all of them."""
+        if not hasattr(self, '_requested_fields'):
+            fields = None
+            if self.action in ('list', 'retrieve', 'batch_get') and not SPARSE_FIELDS_PARAMS.isdisjoint(self.request.query_params):
+                params = SparseFieldsQuerySerializer(data=self.request.query_params)
+                params.is_valid(raise_exception=True)
+                fields = params.validated_data['selected']
+            if self.requested_layout() != 'rows':
+                # the names come from the side tables, the rows carry the ids
+                fields = fields or DoctorSerializer.Meta.fields
+                ids = {SIDE_TABLES[name][0] for name in fields if name in SIDE_TABLES}
+                fields = [name for name in DoctorSerializer.Meta.fields if (name in fields or name in ids) and name not in SIDE_TABLES]
+            self._requested_fields = fields
+        return self._requested_fields
+
+    def requested_layout(self):
+        """The doctor list layout selected with ``layout=``, "rows" by default."""
+        if not hasattr(self, '_requested_layout'):
+            self._requested_layout = 'rows'
+            if self.action == 'list' and LAYOUT_PARAM in self.request.query_params:
+                params = ListLayoutQuerySerializer(data=self.request.query_params)
+                params.is_valid(raise_exception=True)
+                self._requested_layout = params.validated_data['layout']
+        return self._requested_layout
+
+    def apply_layout(self, data):
+        """
+        Reshape the serialized doctors for the requested layout: "dictionary"
+        gives ``{"categories": {id: name}, "districts": {id: name}, "results": [...]}``,
+        "columnar" the same side tables and ``"columns": {field: [values]}``.
+        """
+        layout = self.requested_layout()
+        if layout == 'rows':
+            return data
+        fields = self.requested_fields()
+        reference = get_reference_data()
+        body = {}
+        for id_field, table in SIDE_TABLES.values():
+            if id_field in fields:
+                names = reference.names[table]
+                body[table] = {pk: names.get(pk) for pk in sorted({row[id_field] for row in data})}
+        if layout == 'columnar':
+            body['columns'] = {name: [row[name] for row in data] for name in fields}
+        else:
+            body['results'] = data
+        return body
+
+    def project(self, queryset, extra_columns=()):
+        """Load only the columns, joins and prefetches the requested fields need."""
+        fields = self.requested_fields()
+        if fields is None:
+            return queryset.select_related('category', 'district').prefetch_related('spoken_languages')
+
+        columns = ['id', *extra_columns] + [column for name in fields for column in FIELD_COLUMNS[name]]
+        related = sorted({column.split('__')[0] for column in columns if '__' in column})
+        if related:
+            queryset = queryset.select_related(*related)
+        if 'languages' in fields:
+            queryset = queryset.prefetch_related('spoken_languages')
+        return queryset.only(*columns)
+
+    def list(self, request, *args, **kwargs):
+        if not renders_compact_json(request):
+            return self.list_response(request)
+
+        content_type = request.accepted_renderer.media_type
+        if settings.DOCTOR_LIST_COALESCE_TTL:
+            # shared responses are compressed once, not per request
+            content = list_flight.do(
+                request_key('doctor_list', request, get_language()),
+                lambda: Precompressed(self.render_shared(request), SHARED_PRECOMPRESSORS),
+                ttl=settings.DOCTOR_LIST_COALESCE_TTL,
+                grace=settings.DOCTOR_LIST_COALESCE_GRACE,
+            )
+            return content.response(content_type)
+        if settings.DOCTOR_ROW_CACHE_ENABLED:
+            return HttpResponse(self.render_list(request), content_type=content_type)
+        return self.list_response(request)
+
+    def list_response(self, request):
+        if not PAGE_PARAMS.isdisjoint(request.query_params):
+            return self.page_response(request)
+        rows = self.lookup_index(request)
+        if rows is None:
+            queryset = self.filter_queryset(self.get_queryset())
+        else:
+            queryset = self.fetch_doctors([pk for pk, _ in rows])
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(self.apply_layout(serializer.data))
+
+    def page_response(self, request):
+        """
+        One page of the doctors, sorted by ``ordering`` (name by default),
+        with the URL of the ``next`` page or None on the last one. The pages
+        continue after the last row of the previous one instead of counting
+        an offset, so deep pages cost the same as the first.
+        """
+        params = ListPageQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page_size = params.validated_data['page_size']
+        ordering = params.validated_data['ordering']
+        queryset = self.filter_queryset(self.get_queryset())
+        if 'ordering' not in request.query_params:
+            queryset = order_doctors(queryset, ordering)
+        cursor = params.validated_data.get('cursor')
+        if cursor is not None:
+            queryset = queryset.filter(after_row(ordering, cursor))
+
+        # the keys of the page first, walking the ordering's index, then its doctors by id
+        rows = list(queryset.prefetch_related(None).values_list(*ORDERINGS[ordering.lstrip('-')])[:page_size + 1])
+        data = self.get_serializer(self.fetch_doctors([row[-1] for row in rows[:page_size]]), many=True).data
+        next_url = None
+        if len(rows) > page_size:
+            next_url = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(ordering, rows[page_size - 1]))
+
+        body = self.apply_layout(data)
+        if isinstance(body, list):
+            body = {'results': body}
+        return Response({'next': next_url, **body})
+
+    def render_shared(self, request):
+        """
+        Render the list for every client. It is cached under the directory
+        version, so it is read from the primary: a lagging replica would
+        serve the previous version's rows under the new one.
+        """
+        with use_primary():
+            return self.render_list(request)
+
+    def render_list(self, request):
+        """Return the rendered JSON body of the list response."""
+        if settings.DOCTOR_ROW_CACHE_ENABLED and self.requested_fields() is None and PAGE_PARAMS.isdisjoint(request.query_params):
+            # the cached rows hold every field
+            return self.render_from_row_cache(request)
+        return JSONRenderer().render(self.list_response(request).data)
+
+    def lookup_index(self, request):
+        """
+        Resolve the DoctorFilter parameters against the in-memory index.
+        Returns the matching ``(id, updated_stamp)`` pairs in list order, or
+        None when the request needs the regular filter backends (search,
+        invalid input, ...) or filters nothing the index could narrow down.
+        """
+        params = request.query_params
+        if (
+            not settings.DOCTOR_INDEX_ENABLED
+            or INDEXED_FILTERS.isdisjoint(params)
+            or not (INDEXED_FILTERS | SPARSE_FIELDS_PARAMS | {LAYOUT_PARAM}).issuperset(params)
+        ):
+            return None
+
+        filterset = self.filterset_class(request.query_params, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            # let DjangoFilterBackend report the errors
+            return None
+        data = filterset.form.cleaned_data
+        return get_index().rows(**{name: data[name] for name in INDEXED_FILTERS})
+
+    def fetch_doctors(self, ids):
+        # one query, in_bulk() would split the ids into batches of 999 with a
+        # prefetch each. Returned in the order of ids, the database need not sort them.
+        doctors = {doctor.pk: doctor for doctor in self.get_queryset().order_by().filter(pk__in=ids)}
+        return [doctors[pk] for pk in ids if pk in doctors]
+
+    def render_from_row_cache(self, request):
+        """Stitch the list response together from cached, pre-rendered rows."""
+        rows = self.lookup_index(request)
+        if rows is None:
+            queryset = self.filter_queryset(self.get_queryset()).values_list('id', 'updated_at')
+            rows = [(pk, updated_stamp(updated_at)) for pk, updated_at in queryset]
+        return get_row_cache().join(rows, get_language(), self.render_rows)
+
+    def render_rows(self, ids):
+        renderer = JSONRenderer()
+        doctors = self.fetch_doctors(ids)
+        data = self.get_serializer(doctors, many=True).data
+        return {doctor.id: renderer.render(row) for doctor, row in zip(doctors, data)}
+
+    @action(detail=False, methods=['get'])
+    def fee_stats(self, request):
+        """Fee range, percentiles and histogram of the filtered doctors, for price sliders."""
+        params = FeeStatsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        def compute():
+            # from the primary, like the other snapshots of the directory version
+            with use_primary():
+                queryset = self.filter_queryset(self.get_queryset())
+                cents = queryset.order_by('consultation_fee_cents').values_list('consultation_fee_cents', flat=True)
+                return fee_statistics(list(cents), params.validated_data['bins'])
+
+        # the key carries the directory version, so the statistics are
+        # computed once per change and filter combination. A per-process
+        # cache misses the other workers' changes, they expire like the snapshots.
+        timeout = snapshot_max_age() or 24 * 60 * 60
+        stats = cache.get_or_set(request_key('doctor_fee_stats', request, ''), compute, timeout=timeout)
+        return Response(stats)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Doctors whose name has a word starting with ``q``, for search-as-you-type."""
+        params = AutocompleteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        matches = get_autocomplete().search(params.validated_data['q'], params.validated_data['limit'])
+        return Response([{'id': pk, 'name': name} for pk, name in matches])
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch_get(self, request):
+        """
+        Retrieve many doctors at once, ``GET ?ids=1,2,3`` or ``POST {"ids": [1, 2, 3]}``.
+        Doctors come back in the requested order, unknown and inactive ids are listed separately.
+        """
+        if request.method == 'GET':
+            data = {'ids': [part.strip() for part in request.query_params.get('ids', '').split(',') if part.strip()]}
+        else:
+            data = request.data
+        params = BatchGetSerializer(data=data)
+        params.is_valid(raise_exception=True)
+        ids = params.validated_data['ids']
+
+        # inactive doctors are fetched too, to tell them apart from unknown ids.
+        # Returned in the order of ids, the database need not sort them.
+        doctors = self.project(Doctor.objects.order_by(), extra_columns=['is_active']).in_bulk(ids)
+        found = [doctors[pk] for pk in ids if pk in doctors and doctors[pk].is_active]
+        return Response({
+            'results': self.get_serializer(found, many=True).data,
+            'missing': [pk for pk in ids if pk not in doctors],
+            'inactive': [pk for pk in ids if pk in doctors and not doctors[pk].is_active],
+        })
+
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        serializer = self.get_serializer(data=request.data, many=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        """
+        Create many doctors at once. ``?on_duplicate=`` decides what happens to
+        doctors that are already listed, or submitted twice: "reject" (default)
+        fails with an error per duplicate, "skip" and "merge" create the others
+        and respond with ``created``, ``merged`` and the ``duplicates``.
+        """
+        params = BulkCreateQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        policy = params.validated_data['on_duplicate']
+        context = {**self.get_serializer_context(), 'on_duplicate': policy}
+        serializer = self.get_serializer(data=request.data, many=True, context=context)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        created = self.write(serializer)
+
+        created = self.get_serializer(self.fetch_doctors([doctor.pk for doctor in created]), many=True).data
+        if policy == 'reject':
+            return Response(created, status=status.HTTP_201_CREATED)
+        return Response({
+            'created': created,
+            'merged': self.get_serializer(self.fetch_doctors([doctor.pk for doctor in serializer.merged]), many=True).data,
+            'duplicates': [{'index': position, 'doctor': pk} for position, pk in sorted(serializer.duplicates.items())],
+        }, status=status.HTTP_201_CREATED)
+
+class ReferenceListMixin(mixins.ListModelMixin):
+    """Lists the per-worker snapshot of the reference data instead of querying it."""
+    reference_attribute = None
+
+    def list(self, request, *args, **kwargs):
+        reference = get_reference_data()
+        response = Response(getattr(reference, self.reference_attribute))
+        if renders_compact_json(request):
+            # renders to the same bytes, so the compression middleware can reuse their compressed variants
+            response.precompressed = reference.bodies[self.reference_attribute]
+        return response
 
 class DistrictViewSet(
-    mixins.ListModelMixin, 
+    RateLimitHeadersMixin,
+    ReferenceListMixin, 
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
     ):
     queryset = District.objects.all()
     serializer_class = DistrictSerializer
+    reference_attribute = 'districts'
+    schema = AutoSchema(examples={'retrieve': {'first': {'id': 1}}})
 
 class CategoryViewSet(
-    mixins.ListModelMixin, 
+    RateLimitHeadersMixin,
+    ReferenceListMixin, 
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet
     ):
     queryset = Category.objects.all()
-    serializer_class = CategorySerializer
\ No newline at end of file
+    serializer_class = CategorySerializer
+    reference_attribute = 'categories'
+    schema = AutoSchema(examples={'retrieve': {'first': {'id': 1}}})
\ No newline at end of file
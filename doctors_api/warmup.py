@@ -0,0 +1,66 @@
+from pathlib import Path
+import time
+from django.conf import settings
+from django.db import DatabaseError
+from django.urls import resolve, reverse
+from django.utils import translation
+from .serializers import DoctorSerializer, DistrictSerializer, CategorySerializer, FeeStatsQuerySerializer, AutocompleteQuerySerializer
+from .views import DoctorFilter
+from .models import Doctor
+from .index import get_index
+from .autocomplete import get_autocomplete
+from .reference import get_reference_data
+import logging
+
+logger = logging.getLogger(__name__)
+
+# url names resolved once so that the resolver caches are populated
+URL_NAMES = ('doctor-list', 'category-list', 'district-list')
+
+def load_translations():
+    """Load the gettext catalogs of every configured language."""
+    for code, _name in settings.LANGUAGES:
+        locale = translation.to_locale(code)
+        if not any((Path(path) / locale / 'LC_MESSAGES' / 'django.mo').exists() for path in settings.LOCALE_PATHS):
+            logger.warning("No compiled translations for %s, run 'make compilemessages'", code)
+        with translation.override(code):
+            translation.gettext('Doctor')
+
+def resolve_urls():
+    for name in URL_NAMES:
+        resolve(reverse(name))
+
+def build_serializers():
+    """Construct the serializer and filter fields once, importing everything they need."""
+    for serializer_class in (DoctorSerializer, DistrictSerializer, CategorySerializer, FeeStatsQuerySerializer, AutocompleteQuerySerializer):
+        serializer_class().fields
+    DoctorFilter(queryset=Doctor.objects.none()).form
+
+def prepare():
+    """
+    Warm up the lazily initialised state that otherwise lands on the first
+    requests of every worker. Does not touch the database, so it can run in
+    the gunicorn master (``preload_app``) and be inherited by every forked
+    worker.
+    """
+    started = time.perf_counter()
+    load_translations()
+    resolve_urls()
+    build_serializers()
+    logger.info("Prepared process in %.1f ms", (time.perf_counter() - started) * 1000)
+
+def warm_worker():
+    """
+    Load the database-backed snapshots. Runs in each worker after the fork,
+    so that no connection is shared between processes.
+    """
+    started = time.perf_counter()
+    try:
+        get_reference_data()
+        get_autocomplete()
+        if settings.DOCTOR_INDEX_ENABLED:
+            get_index()
+    except DatabaseError:
+        # e.g. migrations have not run yet, the first requests load it instead
+        logger.exception("Could not warm up the worker")
+    logger.info("Warmed up worker in %.1f ms", (time.perf_counter() - started) * 1000)
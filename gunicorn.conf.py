@@ -0,0 +1,85 @@
+import os
+
+# Gunicorn configuration of the Docker image, gunicorn -c gunicorn.conf.py.
+# Every setting can be overridden from the GUNICORN_* environment variables.
+# python benchmarks/workers.py compares the throughput and memory of the
+# worker classes.
+
+def env(name, default, cast=str):
+    value = os.environ.get(name)
+    if value is None or value == '':
+        return default
+    if cast is bool:
+        return value.lower() in ('1', 'true', 'yes', 'on')
+    return cast(value)
+
+def cpu_count():
+    # the CPUs this process may run on, e.g. limited by docker --cpuset-cpus
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+WORKER_CLASSES = {
+    'sync': 'sync',
+    'gthread': 'gthread',
+    'uvicorn': 'uvicorn_worker.UvicornWorker',
+}
+
+# overrides DJANGO_WARM_UP, which docker-compose may load from .env
+os.environ['DJANGO_WARM_UP'] = str(env('GUNICORN_WARM_UP', True, bool))
+
+# sync (default), gthread (GUNICORN_THREADS threads per worker) or uvicorn
+# (the ASGI application, needs pip install uvicorn-worker)
+mode = env('GUNICORN_WORKER_CLASS', 'sync')
+worker_class = WORKER_CLASSES.get(mode, mode)
+wsgi_app = 'doctors.asgi:application' if mode == 'uvicorn' else 'doctors.wsgi:application'
+threads = env('GUNICORN_THREADS', 4, int) if mode == 'gthread' else 1
+# sync workers block a whole process per request. Every worker holds its own
+# snapshots, see "Gunicorn workers" in the README for their memory.
+workers = env('GUNICORN_WORKERS', 2 * cpu_count() + 1 if mode == 'sync' else cpu_count(), int)
+
+bind = env('GUNICORN_BIND', '0.0.0.0:8000')
+# load the application once in the master, where DoctorsApiConfig.ready()
+# prepares translations, URL resolvers and serializers that the forked
+# workers share copy-on-write
+preload_app = env('GUNICORN_PRELOAD', True, bool)
+# recycle workers after a random number of requests in that range, so they
+# restart one at a time
+max_requests = env('GUNICORN_MAX_REQUESTS', 1000, int)
+max_requests_jitter = env('GUNICORN_MAX_REQUESTS_JITTER', 100, int)
+# seconds an idle client connection is kept open, by gthread and uvicorn
+# workers (sync workers close it after every response). It must be longer than
+# the idle timeout of the load balancer in front, commonly 60 s, so the load
+# balancer closes the connection first and never sends a request on a socket
+# the worker is closing.
+keepalive = env('GUNICORN_KEEPALIVE', 75, int)
+timeout = env('GUNICORN_TIMEOUT', 30, int)
+graceful_timeout = env('GUNICORN_GRACEFUL_TIMEOUT', 30, int)
+
+# the workers' heartbeat files, in memory rather than on the container's overlay filesystem
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+def when_ready(server):
+    # runs in the master once it listens. Without a shared default cache the
+    # workers only see each other's writes when their snapshots expire.
+    if server.num_workers < 2:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'doctors.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from doctors_api.signals import versions_shared
+    if not versions_shared():
+        server.log.warning(
+            "%d workers share a per-process DJANGO_CACHE_URL: the snapshots and fee statistics "
+            "of each worker may lag the others' writes by up to DJANGO_SNAPSHOT_MAX_AGE (%ss)",
+            server.num_workers, settings.DOCTOR_SNAPSHOT_MAX_AGE,
+        )
+
+def post_worker_init(worker):
+    # runs in the worker after the fork, once the application is loaded: it
+    # loads its database-backed snapshots before it accepts requests
+    from doctors_api.warmup import warm_worker
+    warm_worker()